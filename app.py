@@ -1,16 +1,48 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from routes import badges, contests, docs, heatmap, legacy, profile, rating, stats, summary, topics
+from routes import badges, contests, docs, heatmap, legacy, metrics, profile, rating, stats, summary, topics
 from config import Config
+from core import upstream
 from core.middleware import CacheRateLimitMiddleware
+from services import contest_catalogue, invalid_handles, prewarm, rating_watcher, request_keys
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream.startup()
+    await contest_catalogue.startup()
+    prewarm.scheduler.start()
+    rating_watcher.watcher.start()
+    invalid_handles.invalid_filter.start()
+    try:
+        yield
+    finally:
+        await invalid_handles.invalid_filter.stop()
+        await rating_watcher.watcher.stop()
+        await prewarm.scheduler.stop()
+        await contest_catalogue.shutdown()
+        await upstream.shutdown()
+
 
 app = FastAPI(
     title=Config.TITLE,
     description=Config.DESCRIPTION,
     version=Config.VERSION,
+    lifespan=lifespan,
 )
 
+# the last middleware added is the outermost: CORS wraps the cache so HIT,
+# STALE and 304 answers carry the CORS headers too
+app.add_middleware(
+    CacheRateLimitMiddleware,
+    platform="codeforces",
+    canonicalize=request_keys.canonical_request,
+    prewarm=prewarm.scheduler,
+    invalid_filter=invalid_handles.invalid_filter,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=Config.CORS_ALLOW_ORIGINS,
@@ -18,9 +50,9 @@ app.add_middleware(
     allow_methods=Config.CORS_ALLOW_METHODS,
     allow_headers=Config.CORS_ALLOW_HEADERS,
 )
-app.add_middleware(CacheRateLimitMiddleware, platform="codeforces")
 
 app.include_router(docs.router)
+app.include_router(metrics.router)
 app.include_router(profile.router)
 app.include_router(stats.router)
 app.include_router(contests.router)
@@ -30,6 +62,7 @@ app.include_router(topics.router)
 app.include_router(badges.router)
 app.include_router(summary.router)
 app.include_router(legacy.router)
+request_keys.ROUTE_SEGMENTS.update(request_keys.route_segments(app.routes))
 
 if __name__ == '__main__':
     uvicorn.run("app:app", 
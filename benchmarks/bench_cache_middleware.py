@@ -0,0 +1,186 @@
+"""Cache middleware overhead: the old ``BaseHTTPMiddleware`` data path vs raw ASGI.
+
+``buffered`` reproduces the previous implementation: ``call_next``, collect the
+body with ``body += chunk`` and copy it into a new ``Response``. ``streaming``
+is the current ``CacheRateLimitMiddleware``. Both wrap the same FastAPI route,
+which streams ``--kb`` KiB in ``--chunks`` chunks, and store entries in an
+in-memory dict instead of Redis. Misses empty the store before every request.
+
+Reports time to first body byte and total latency (p50/p99), then the Python
+heap peak per request with tracemalloc in a separate pass.
+
+    python benchmarks/bench_cache_middleware.py [--requests 300] [--kb 256] [--chunks 64]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware  # noqa: E402
+from core.middleware import CacheRateLimitMiddleware  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+
+_store: dict = {}
+
+
+class BufferedCacheMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next) -> Response:
+        key = request.url.path
+        accept_encoding = request.headers.get("accept-encoding", "")
+        cached = _store.get(key)
+        if cached is not None:
+            return CacheRateLimitMiddleware._from_cache(cached, "HIT", accept_encoding)
+        response = await call_next(request)
+        body = b""
+        async for chunk in response.body_iterator:
+            body += chunk
+        headers = dict(response.headers)
+        headers.pop("content-length", None)
+        headers["X-Cache"] = "MISS"
+        if response.status_code == 200:
+            entry = await CacheRateLimitMiddleware._store(key, 200, headers, response.media_type, body)
+            _store[key] = entry
+            return CacheRateLimitMiddleware._from_cache(entry, "MISS", accept_encoding)
+        return Response(content=body, status_code=response.status_code, headers=headers)
+
+
+def _app(kb: int, chunks: int) -> FastAPI:
+    chunk = b"x" * (kb * 1024 // chunks)
+    app = FastAPI()
+
+    @app.get("/{handle}/rating")
+    async def rating(handle: str) -> StreamingResponse:
+        async def body():
+            for _ in range(chunks):
+                yield chunk
+
+        return StreamingResponse(body(), media_type="application/json")
+
+    return app
+
+
+def _scope() -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/tourist/rating",
+        "raw_path": b"/tourist/rating",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+
+async def _request(wrapped) -> tuple[float, float]:
+    started = time.perf_counter()
+    first_byte = None
+    requested = False
+    done = asyncio.Event()
+
+    async def receive() -> dict:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal first_byte
+        if message["type"] == "http.response.body" and first_byte is None:
+            first_byte = time.perf_counter()
+
+    await wrapped(_scope(), receive, send)
+    finished = time.perf_counter()
+    done.set()
+    return (first_byte - started) * 1000, (finished - started) * 1000
+
+
+def _percentiles(samples: list[float]) -> str:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f"p50={statistics.median(samples):7.3f}ms p99={p99:7.3f}ms"
+
+
+async def _run(label: str, wrapped, requests: int, miss: bool) -> None:
+    await _request(wrapped)  # warm up and fill the store
+    ttfb, total = [], []
+    for _ in range(requests):
+        if miss:
+            _store.clear()
+        first, whole = await _request(wrapped)
+        ttfb.append(first)
+        total.append(whole)
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(max(1, requests // 10)):
+        if miss:
+            _store.clear()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        await _request(wrapped)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+    print(
+        f"{label:<16} ttfb {_percentiles(ttfb)}  total {_percentiles(total)}  "
+        f"heap peak={statistics.median(peaks) / 1024:8.1f} KiB"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--kb", type=int, default=256)
+    parser.add_argument("--chunks", type=int, default=64)
+    args = parser.parse_args()
+
+    async def get_entry(key, local=True):
+        return _store.get(key)
+
+    async def set_entry(key, entry, ttl, index=None):
+        _store[key] = entry
+
+    async def allow(*args, **kwargs):
+        return RateLimitResult(True)
+
+    async def missing(key):
+        return None
+
+    app = _app(args.kb, args.chunks)
+    buffered = BufferedCacheMiddleware(app)
+    streaming = CacheRateLimitMiddleware(app, platform="codeforces")
+    print(f"body={args.kb} KiB in {args.chunks} chunks, {args.requests} requests")
+    with mock.patch.object(middleware, "get_entry", get_entry), \
+            mock.patch.object(middleware, "set_entry", set_entry), \
+            mock.patch.object(middleware, "get_json", missing), \
+            mock.patch.object(middleware, "cache_enabled", return_value=True), \
+            mock.patch.object(middleware, "check_rate_limits", allow):
+        for miss in (True, False):
+            outcome = "miss" if miss else "hit"
+            _store.clear()
+            await _run(f"buffered {outcome}", buffered, args.requests, miss)
+            _store.clear()
+            await _run(f"streaming {outcome}", streaming, args.requests, miss)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
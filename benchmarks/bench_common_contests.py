@@ -0,0 +1,80 @@
+"""Wall time of get_common_contests for 2, 10 and 50 handles.
+
+Participation lookups are simulated with a fixed upstream latency. The legacy
+column replays the previous implementation: one handle at a time, each behind
+a fixed rate-limit sleep (2 s in the old code; lower it with --legacy-sleep to
+keep the run short). "disjoint" adds a handle with no shared contests first in
+the list to show the early exit.
+
+    python benchmarks/bench_common_contests.py [--latency 0.25] [--legacy-sleep 2]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import contests  # noqa: E402
+
+
+def _participation(handles: list[str], disjoint: bool) -> dict[str, set[int]]:
+    rng = random.Random(7)
+    shared = set(rng.sample(range(1, 2000), 40))
+    data = {handle: shared | set(rng.sample(range(1, 2000), 400)) for handle in handles}
+    if disjoint:
+        data[handles[0]] = {100_000 + i for i in range(50)}
+    return data
+
+
+async def _legacy(handles: list[str], lookup, sleep: float) -> set[int]:
+    all_contests = []
+    for handle in handles:
+        await asyncio.sleep(sleep)
+        found = await lookup(handle)
+        if not found:
+            return set()
+        all_contests.append(found)
+    return all_contests[0].intersection(*all_contests[1:])
+
+
+async def _run(size: int, latency: float, legacy_sleep: float, disjoint: bool) -> None:
+    handles = [f"user{i}" for i in range(size)]
+    data = _participation(handles, disjoint)
+
+    async def lookup(handle: str) -> set[int]:
+        # the disjoint handle answers last, so only the early exit can save time
+        await asyncio.sleep(latency * (3 if disjoint and handle == handles[0] else 1))
+        return data[handle]
+
+    with mock.patch.object(contests, "get_contests_participated_by_user", lookup):
+        started = time.perf_counter()
+        fanned = await contests.get_common_contests(handles)
+        fan_out = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected = await _legacy(handles, lookup, legacy_sleep)
+    legacy = time.perf_counter() - started
+    assert fanned == expected
+
+    label = f"{size} handles{' (disjoint)' if disjoint else ''}"
+    print(f"{label:<22} legacy={legacy:7.2f}s  fan-out={fan_out:6.3f}s  common={len(fanned)}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.25)
+    parser.add_argument("--legacy-sleep", type=float, default=2.0)
+    args = parser.parse_args()
+
+    for size in (2, 10, 50):
+        await _run(size, args.latency, args.legacy_sleep, disjoint=False)
+    await _run(50, args.latency, args.legacy_sleep, disjoint=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
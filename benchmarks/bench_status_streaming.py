@@ -0,0 +1,138 @@
+"""Peak memory and wall time: buffered ``response.json()`` vs streamed decoding.
+
+Serves a synthetic ``user.status`` body from a local aiohttp server in a child
+process and builds a ``SubmissionSnapshot`` from it both ways, measuring the
+client's Python heap peak with tracemalloc.
+
+    python benchmarks/bench_status_streaming.py [--submissions 50000]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import upstream  # noqa: E402
+from services.submissions import SubmissionSnapshot  # noqa: E402
+
+
+def _payload(count: int) -> bytes:
+    rows = [
+        {
+            "id": 10_000_000 - i,
+            "contestId": 1 + i % 1900,
+            "creationTimeSeconds": 1_700_000_000 - i * 1800,
+            "relativeTimeSeconds": 2147483647,
+            "problem": {
+                "contestId": 1 + i % 1900,
+                "index": "ABCDEF"[i % 6],
+                "name": f"Problem {i % 9000}",
+                "type": "PROGRAMMING",
+                "rating": 800 + (i % 25) * 100,
+                "tags": ["math", "greedy", "dp", "graphs"][: 1 + i % 4],
+            },
+            "author": {
+                "contestId": 1 + i % 1900,
+                "members": [{"handle": "tourist"}],
+                "participantType": "CONTESTANT",
+                "ghost": False,
+                "startTimeSeconds": 1_700_000_000,
+            },
+            "programmingLanguage": "GNU C++20 (64)",
+            "verdict": "OK" if i % 3 else "WRONG_ANSWER",
+            "testset": "TESTS",
+            "passedTestCount": 42,
+            "timeConsumedMillis": 46,
+            "memoryConsumedBytes": 3_481_600,
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"status": "OK", "result": rows}).encode("utf-8")
+
+
+def _serve(count: int, port: int) -> None:
+    body = _payload(count)
+
+    async def handle(_request: web.Request) -> web.Response:
+        return web.Response(body=body, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/api/user.status", handle)
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for(port: int) -> None:
+    for _ in range(200):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def _buffered() -> SubmissionSnapshot:
+    data = await upstream.fetch_json("user.status", {"handle": "tourist"})
+    return SubmissionSnapshot.from_submissions(data["result"])
+
+
+async def _streamed() -> SubmissionSnapshot:
+    snapshot = SubmissionSnapshot()
+    await upstream.stream_result(
+        "user.status",
+        {"handle": "tourist"},
+        lambda submission: snapshot.ingest(submission, 0),
+    )
+    return snapshot
+
+
+async def _measure(label: str, build) -> SubmissionSnapshot:
+    tracemalloc.start()
+    started = time.perf_counter()
+    snapshot = await build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<9} peak={peak / 2**20:8.2f} MiB  time={elapsed * 1000:8.1f} ms  solved={snapshot.solved_count}")
+    return snapshot
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--submissions", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"body={len(_payload(args.submissions)) / 2**20:.1f} MiB, {args.submissions} submissions")
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, args=(args.submissions, port), daemon=True)
+    server.start()
+    upstream.API_BASE = f"http://127.0.0.1:{port}/api"
+    upstream.settings.budget_rate_per_second = 0
+    try:
+        await _wait_for(port)
+        buffered = await _measure("buffered", _buffered)
+        streamed = await _measure("streamed", _streamed)
+        assert buffered.daily == streamed.daily and buffered.solved == streamed.solved
+    finally:
+        await upstream.shutdown()
+        server.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
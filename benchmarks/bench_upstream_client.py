@@ -0,0 +1,94 @@
+"""Per-miss latency: one ClientSession per call vs the shared pooled session.
+
+By default both variants hit a local aiohttp server, which only measures the
+TCP connect that pooling saves. Pass ``--url`` (e.g.
+``https://codeforces.com/api/user.info?handles=tourist``) to include the TLS
+handshake against the real upstream.
+
+    python benchmarks/bench_upstream_client.py [--calls 200] [--url URL]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import upstream  # noqa: E402
+
+
+PAYLOAD = b'{"status":"OK","result":[{"handle":"tourist","rating":3800}]}'
+
+
+async def _local_server() -> tuple[web.AppRunner, str]:
+    async def handle(_request: web.Request) -> web.Response:
+        return web.Response(body=PAYLOAD, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/api/user.info", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/user.info?handles=tourist"
+
+
+async def _fresh_session(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            await response.json()
+
+
+async def _pooled_session(url: str) -> None:
+    async with upstream.get_session().get(url) as response:
+        await response.json()
+
+
+async def _measure(call, url: str, calls: int) -> list[float]:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await call(url)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _report(label: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<16} mean={statistics.mean(samples):7.3f}ms "
+        f"p50={statistics.median(samples):7.3f}ms p99={p99:7.3f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    runner = None
+    url = args.url
+    if url is None:
+        runner, url = await _local_server()
+    try:
+        # warm the pool once so the pooled numbers reflect steady state
+        await _pooled_session(url)
+        _report("fresh session", await _measure(_fresh_session, url, args.calls))
+        _report("pooled session", await _measure(_pooled_session, url, args.calls))
+    finally:
+        await upstream.shutdown()
+        if runner is not None:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
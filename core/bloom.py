@@ -0,0 +1,36 @@
+"""Bloom filter: set membership in fixed memory with no false negatives.
+
+``BloomFilter(capacity, error_rate)`` picks the bit count and number of hashes
+that keep the false-positive rate at ``error_rate`` once ``capacity`` keys are
+in; adding more keys than that raises the rate. Keys cannot be removed, so
+owners rebuild the filter to forget them.
+"""
+
+import hashlib
+import math
+from typing import List
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        # double hashing: hash i is first + i * second
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for index in self._indexes(key):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
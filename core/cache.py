@@ -1,17 +1,25 @@
 import json
-from base64 import b64decode, b64encode
 from typing import Any
 
 from redis import asyncio as redis
 
+from core.cache_backend import CacheBackend, MemoryBackend, RedisBackend
+from core.cache_entry import MAGIC, CacheEntry
 from core.config import cache_rate_limit_settings as settings
+from core.l1_cache import L1Cache
 
 
 _client: redis.Redis | None = None
+_binary_client: redis.Redis | None = None
+_backend: CacheBackend | None = None
 
-
-def redis_enabled() -> bool:
-    return bool(settings.redis_url)
+# Tier 1: per-process LRU of decoded values; tier 2: the backend (Redis, or an
+# in-memory store when REDIS_URL is unset). A tier-1 hit does no I/O.
+l1 = L1Cache(settings.l1_cache_max_bytes, settings.l1_cache_max_ttl_seconds)
+l2_stats = {"hits": 0, "misses": 0, "errors": 0}
+# request-key canonicalization: lookups, lookups whose key changed, cache hits
+# hits served only because the key was canonicalized, and 304s sent for hits
+key_stats = {"lookups": 0, "canonicalized": 0, "hits": 0, "canonical_hits": 0, "not_modified": 0}
 
 
 def get_redis() -> redis.Redis | None:
@@ -23,35 +31,161 @@ def get_redis() -> redis.Redis | None:
     return _client
 
 
+def get_binary_redis() -> redis.Redis | None:
+    """Client that returns raw ``bytes``, for values that are not text."""
+    global _binary_client
+    if not settings.redis_url:
+        return None
+    if _binary_client is None:
+        _binary_client = redis.from_url(settings.redis_url, decode_responses=False)
+    return _binary_client
+
+
+def get_backend() -> CacheBackend | None:
+    """The configured cache and rate-limit backend; ``None`` when caching is off."""
+    global _backend
+    if _backend is None:
+        kind = settings.cache_backend.lower() or ("redis" if settings.redis_url else "memory")
+        if kind == "redis" and settings.redis_url:
+            _backend = RedisBackend(get_binary_redis)
+        elif kind == "memory":
+            _backend = MemoryBackend()
+    return _backend
+
+
+def cache_enabled() -> bool:
+    return get_backend() is not None
+
+
 async def get_json(key: str) -> dict[str, Any] | None:
-    client = get_redis()
-    if client is None:
+    """Read ``key`` from the in-process tier, falling back to the backend.
+
+    The returned dict may be shared with other callers; do not mutate it.
+    """
+    backend = get_backend()
+    if backend is None:
         return None
+    cached = l1.get(key)
+    if cached is not None:
+        return cached
     try:
-        value = await client.get(key)
+        # one round trip for the value and its remaining lifetime
+        value, ttl = await backend.get(key)
     except Exception:
+        l2_stats["errors"] += 1
         return None
     if not value:
+        l2_stats["misses"] += 1
         return None
     try:
-        return json.loads(value)
+        decoded = json.loads(value)
     except ValueError:
+        l2_stats["errors"] += 1
         return None
+    l2_stats["hits"] += 1
+    if ttl > 0:
+        l1.set(key, decoded, len(value), ttl)
+    return decoded
 
 
 async def set_json(key: str, value: dict[str, Any], ttl_seconds: int) -> None:
-    client = get_redis()
-    if client is None:
+    backend = get_backend()
+    if backend is None:
         return
+    encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    l1.set(key, value, len(encoded), ttl_seconds)
     try:
-        await client.setex(key, ttl_seconds, json.dumps(value, separators=(",", ":")))
+        await backend.set(key, encoded, ttl_seconds)
     except Exception:
+        l2_stats["errors"] += 1
         return
 
 
-def encode_body(body: bytes) -> str:
-    return b64encode(body).decode("ascii")
+async def get_entry(key: str, local: bool = True) -> CacheEntry | None:
+    """Read a cached response from the in-process tier, falling back to the backend.
+
+    ``local=False`` skips the in-process tier, to see what another instance
+    just wrote. Entries still in the old JSON/base64 format are decoded and
+    rewritten in the binary layout with their remaining TTL.
+    """
+    backend = get_backend()
+    if backend is None:
+        return None
+    cached = l1.get(key) if local else None
+    if cached is not None:
+        return cached
+    try:
+        value, ttl = await backend.get(key)
+    except Exception:
+        l2_stats["errors"] += 1
+        return None
+    if not value:
+        l2_stats["misses"] += 1
+        return None
+    entry = CacheEntry.unpack(value)
+    if entry is None:
+        l2_stats["errors"] += 1
+        return None
+    l2_stats["hits"] += 1
+    if ttl > 0:
+        if value[:2] != MAGIC:
+            value = entry.pack()
+            try:
+                await backend.set(key, value, ttl)
+            except Exception:
+                l2_stats["errors"] += 1
+        l1.set(key, entry, len(value), ttl)
+    return entry
+
+
+def index_key(platform: str, handle: str) -> str:
+    """Hash of the response keys cached for ``handle`` (field: key, value: route)."""
+    return f"cache-index:{platform}:{handle.lower()}"
+
+
+async def set_entry(
+    key: str, entry: CacheEntry, ttl_seconds: int, index: tuple[str, str, str] | None = None
+) -> None:
+    """Store ``entry``; ``index`` is ``(platform, handle, route)`` to make it invalidatable by handle."""
+    backend = get_backend()
+    if backend is None:
+        return
+    packed = entry.pack()
+    l1.set(key, entry, len(packed), ttl_seconds)
+    if index is not None:
+        platform, handle, route = index
+        index = (index_key(platform, handle), route)
+    try:
+        await backend.set(key, packed, ttl_seconds, index)
+    except Exception:
+        l2_stats["errors"] += 1
+        return
 
 
-def decode_body(body: str) -> bytes:
-    return b64decode(body.encode("ascii"))
+async def invalidate_handles(platform: str, handles: list[str], routes: set[str] | None = None) -> int:
+    """Delete cached responses of ``handles`` (only ``routes`` when given); returns how many.
+
+    Entries also leave this process's L1; other processes drop theirs within
+    ``l1_cache_max_ttl_seconds``.
+    """
+    backend = get_backend()
+    if backend is None or not handles:
+        return 0
+    try:
+        removed = await backend.invalidate([index_key(platform, handle) for handle in handles], routes)
+    except Exception:
+        l2_stats["errors"] += 1
+        return 0
+    for key in removed:
+        l1.delete(key)
+    return len(removed)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    backend = get_backend()
+    return {
+        "l1": l1.stats(),
+        "l2": dict(l2_stats),
+        "keys": dict(key_stats),
+        "backend": backend.stats() if backend is not None else {},
+    }
@@ -0,0 +1,337 @@
+"""Storage behind the response cache and the rate limits.
+
+``CACHE_BACKEND`` selects it: ``redis`` (shared by every worker), ``memory``
+(this process only) or ``off``. When unset, Redis is used if ``REDIS_URL`` is
+configured and memory otherwise, so single-node deployments and local
+benchmarks still cache and rate-limit.
+
+Both backends store opaque bytes with a TTL, keep a per-handle index of cached
+keys for invalidation, keep sets whose members expire one by one and evaluate a
+list of rate limits in one call.
+``MemoryBackend`` caps values at ``MEMORY_BACKEND_MAX_BYTES`` (least recently
+used first out) and counters at ``MEMORY_BACKEND_MAX_COUNTERS``. Its methods
+never await, so each one is atomic with respect to other coroutines.
+"""
+
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable, Collection
+from typing import Any
+
+from core.config import cache_rate_limit_settings as settings
+
+# (index, allowed, retry_after, remaining, reset_in) of the limit that decided
+RateLimitOutcome = tuple[int, bool, int, int, int]
+INDEX_TTL_SECONDS = 7 * 86400
+
+
+class CacheBackend(ABC):
+    name = ""
+
+    @abstractmethod
+    async def get(self, key: str) -> tuple[bytes | None, float]:
+        """The value of ``key`` and its remaining lifetime in seconds (0 when unknown)."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_seconds: float, index: tuple[str, str] | None = None) -> None:
+        """Store ``value``; ``index`` is ``(index_key, route)`` to record ``key`` under."""
+
+    @abstractmethod
+    async def invalidate(self, index_keys: list[str], routes: Collection[str] | None = None) -> list[str]:
+        """Delete the keys recorded under ``index_keys`` (only ``routes`` when given); returns them."""
+
+    @abstractmethod
+    async def add_member(self, key: str, member: str, ttl_seconds: float) -> None:
+        """Add ``member`` to the set ``key`` for ``ttl_seconds`` (renewed if already there)."""
+
+    @abstractmethod
+    async def members(self, key: str) -> list[str]:
+        """The unexpired members of the set ``key``."""
+
+    @abstractmethod
+    async def check_rate_limits(
+        self, limits: list[tuple[str, int, int]], backoff_base: int, backoff_max: int
+    ) -> RateLimitOutcome:
+        """Count a request against ``(key, limit, window_seconds)`` limits in order.
+
+        A limit in backoff denies without counting; going over a limit sets a
+        backoff of ``backoff_base`` doubled per consecutive violation, capped at
+        ``backoff_max``. The first denial ends the check.
+        """
+
+    def stats(self) -> dict[str, int]:
+        return {}
+
+
+# KEYS: backoff, violations, counter per limit
+# ARGV: backoff base, backoff max, then limit and window per limit
+# returns {index, allowed, retry_after, remaining, counter ttl} of the deciding limit
+RATE_LIMIT_SCRIPT = """
+local base = tonumber(ARGV[1])
+local max_backoff = tonumber(ARGV[2])
+local result
+for i = 1, #KEYS / 3 do
+    local backoff_key, violations_key, counter_key = KEYS[3 * i - 2], KEYS[3 * i - 1], KEYS[3 * i]
+    local limit = tonumber(ARGV[2 * i + 1])
+    local window = tonumber(ARGV[2 * i + 2])
+
+    local retry_after = redis.call('ttl', backoff_key)
+    if retry_after > 0 then
+        return {i, 0, retry_after, 0, 0}
+    end
+
+    local count = redis.call('incr', counter_key)
+    if count == 1 then
+        redis.call('expire', counter_key, window)
+    end
+    local ttl = redis.call('ttl', counter_key)
+    if count > limit then
+        local violations = redis.call('incr', violations_key)
+        redis.call('expire', violations_key, max_backoff)
+        local backoff = math.floor(math.min(base * 2 ^ (violations - 1), max_backoff))
+        redis.call('setex', backoff_key, backoff, '1')
+        return {i, 0, backoff, 0, 0}
+    end
+    redis.call('del', violations_key)
+    result = {i, 1, 0, limit - count, ttl}
+end
+return result
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Fixed-window counters and values in Redis; errors propagate to the caller."""
+
+    name = "redis"
+
+    def __init__(self, client: Callable[[], Any]) -> None:
+        self._client = client
+        self._script = None
+
+    async def get(self, key):
+        async with self._client().pipeline(transaction=False) as pipe:
+            value, ttl_ms = await pipe.get(key).pttl(key).execute()
+        return value, ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else 0
+
+    async def set(self, key, value, ttl_seconds, index=None):
+        client = self._client()
+        ttl_ms = max(1, int(ttl_seconds * 1000))
+        if index is None:
+            await client.set(key, value, px=ttl_ms)
+            return
+        index_key, route = index
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(key, value, px=ttl_ms)
+            pipe.hset(index_key, key, route)
+            # fields outliving their entry are harmless; deleting a missing key is a no-op
+            pipe.expire(index_key, max(int(ttl_seconds), INDEX_TTL_SECONDS))
+            await pipe.execute()
+
+    async def invalidate(self, index_keys, routes=None):
+        client = self._client()
+        async with client.pipeline(transaction=False) as pipe:
+            for index_key in index_keys:
+                pipe.hgetall(index_key)
+            indexes = await pipe.execute()
+        doomed: dict[str, list[bytes]] = {}
+        for index_key, index in zip(index_keys, indexes):
+            keys = [key for key, route in index.items() if routes is None or route.decode() in routes]
+            if keys:
+                doomed[index_key] = keys
+        if not doomed:
+            return []
+        async with client.pipeline(transaction=False) as pipe:
+            for index_key, keys in doomed.items():
+                pipe.delete(*keys)
+                pipe.hdel(index_key, *keys)
+            await pipe.execute()
+        return [key.decode() for keys in doomed.values() for key in keys]
+
+    async def add_member(self, key, member, ttl_seconds):
+        # a sorted set scored by expiry; the set itself lives as long as its newest member
+        async with self._client().pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {member: time.time() + ttl_seconds})
+            pipe.expire(key, max(1, math.ceil(ttl_seconds)))
+            await pipe.execute()
+
+    async def members(self, key):
+        now = time.time()
+        async with self._client().pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zrangebyscore(key, now, "+inf")
+            _, members = await pipe.execute()
+        return [member.decode() for member in members]
+
+    async def check_rate_limits(self, limits, backoff_base, backoff_max):
+        client = self._client()
+        if self._script is None:
+            self._script = client.register_script(RATE_LIMIT_SCRIPT)
+        keys: list[str] = []
+        args: list[int] = [backoff_base, backoff_max]
+        for key, limit, window_seconds in limits:
+            keys += [f"backoff:{key}", f"violations:{key}", f"rl:{key}"]
+            args += [limit, window_seconds]
+        index, allowed, retry_after, remaining, ttl = await self._script(keys=keys, args=args, client=client)
+        return int(index), bool(allowed), int(retry_after), int(remaining), int(ttl)
+
+
+class _TTLStore:
+    """LRU of ``key -> value`` with per-key expiry and a total cost cap."""
+
+    def __init__(self, capacity: int, clock: Callable[[], float]) -> None:
+        self.capacity = capacity
+        self.clock = clock
+        self.used = 0
+        self.evictions = 0
+        # key -> (value, expires_at, cost)
+        self._items: OrderedDict[str, tuple[Any, float, int]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """``(value, seconds left)`` for a live key."""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        left = item[1] - self.clock()
+        if left <= 0:
+            self.delete(key)
+            return None
+        self._items.move_to_end(key)
+        return item[0], left
+
+    def put(self, key: str, value: Any, ttl_seconds: float, cost: int = 1) -> None:
+        self.delete(key)
+        if cost > self.capacity or ttl_seconds <= 0:
+            return
+        self._items[key] = (value, self.clock() + ttl_seconds, cost)
+        self.used += cost
+        while self.used > self.capacity:
+            _, (_, _, evicted) = self._items.popitem(last=False)
+            self.used -= evicted
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.used -= item[2]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process values and sliding-window counters.
+
+    A limit's count is the current fixed window plus the previous window
+    weighted by how much of it still overlaps the trailing ``window_seconds``,
+    so a burst straddling a window boundary cannot get twice the limit through.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_bytes: int = settings.memory_backend_max_bytes,
+        max_counters: int = settings.memory_backend_max_counters,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.clock = clock
+        self._values = _TTLStore(max_bytes, clock)
+        self._counters = _TTLStore(max_counters, clock)
+
+    async def get(self, key):
+        item = self._values.get(key)
+        if item is None or not isinstance(item[0], bytes):
+            return None, 0
+        return item
+
+    async def set(self, key, value, ttl_seconds, index=None):
+        self._values.put(key, bytes(value), ttl_seconds, len(key) + len(value))
+        if index is None:
+            return
+        index_key, route = index
+        current = self._values.get(index_key)
+        fields = dict(current[0]) if current is not None else {}
+        fields[key] = route
+        cost = len(index_key) + sum(len(field) + len(value) for field, value in fields.items())
+        self._values.put(index_key, fields, max(ttl_seconds, INDEX_TTL_SECONDS), cost)
+
+    async def invalidate(self, index_keys, routes=None):
+        removed = []
+        for index_key in index_keys:
+            current = self._values.get(index_key)
+            if current is None:
+                continue
+            fields = current[0]
+            doomed = [key for key, route in fields.items() if routes is None or route in routes]
+            for key in doomed:
+                self._values.delete(key)
+            kept = {key: route for key, route in fields.items() if key not in doomed}
+            if kept:
+                cost = len(index_key) + sum(len(field) + len(value) for field, value in kept.items())
+                self._values.put(index_key, kept, current[1], cost)
+            else:
+                self._values.delete(index_key)
+            removed += doomed
+        return removed
+
+    async def add_member(self, key, member, ttl_seconds):
+        now = self.clock()
+        current = self._values.get(key)
+        expiries = {m: at for m, at in current[0].items() if at > now} if current is not None else {}
+        expiries[member] = now + ttl_seconds
+        cost = len(key) + sum(len(m) + 8 for m in expiries)
+        self._values.put(key, expiries, max(expiries.values()) - now, cost)
+
+    async def members(self, key):
+        current = self._values.get(key)
+        if current is None or not isinstance(current[0], dict):
+            return []
+        now = self.clock()
+        return [member for member, at in current[0].items() if at > now]
+
+    def _count(self, key: str, window: int) -> tuple[float, float]:
+        """Count a hit on ``key``; returns the sliding-window estimate and seconds until the window rolls."""
+        now = self.clock()
+        start = now - now % window
+        current = self._counters.get(key)
+        if current is None:
+            state = [start, 0, 0]
+        else:
+            state = current[0]
+            if state[0] != start:
+                previous = state[1] if start - state[0] == window else 0
+                state = [start, 0, previous]
+        state[1] += 1
+        # keep the state until it stops counting as the previous window
+        self._counters.put(key, state, start + 2 * window - now)
+        elapsed = now - start
+        return state[2] * (1 - elapsed / window) + state[1], window - elapsed
+
+    async def check_rate_limits(self, limits, backoff_base, backoff_max):
+        result: RateLimitOutcome = (0, True, 0, 0, 0)
+        for index, (key, limit, window_seconds) in enumerate(limits, start=1):
+            backoff = self._counters.get(f"backoff:{key}")
+            if backoff is not None:
+                return index, False, max(1, math.ceil(backoff[1])), 0, 0
+
+            count, reset_in = self._count(f"rl:{key}", window_seconds)
+            if count > limit:
+                previous = self._counters.get(f"violations:{key}")
+                violations = (previous[0] if previous is not None else 0) + 1
+                self._counters.put(f"violations:{key}", violations, backoff_max)
+                retry_after = int(min(backoff_base * 2 ** (violations - 1), backoff_max))
+                self._counters.put(f"backoff:{key}", True, retry_after)
+                return index, False, retry_after, 0, 0
+            self._counters.delete(f"violations:{key}")
+            result = (index, True, 0, int(limit - count), math.ceil(reset_in))
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "bytes": self._values.used,
+            "keys": len(self._values),
+            "evictions": self._values.evictions,
+            "counters": len(self._counters),
+        }
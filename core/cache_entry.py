@@ -0,0 +1,272 @@
+"""Binary layout for cached HTTP responses.
+
+An entry is a fixed header followed by the media type, the Cache-Control
+value, the ETag and one or more encodings of the body::
+
+    magic "CE" | version u8 | status u16 | stored_at f64 | fresh_for u32
+    | media_type_len u16 | cache_control_len u16 | variant_count u8 | etag_len u8
+    | media_type | cache_control | etag
+    | variant_count x (encoding_len u8 | body_len u32 | encoding | body)
+
+Integers are big-endian. A ``stored_at`` of 0 means "unknown" (entries
+migrated from the old format), which callers treat as fresh until the backend
+expires them. ``unpack`` also accepts version 2 entries (no ETag), version 1
+entries (a single raw body) and the previous JSON document with a base64 body;
+their ETag is computed on decode.
+
+The ETag is a strong validator over the uncompressed body, computed once when
+the entry is built. Compressed variants are sent with the encoding appended
+(``"<hash>-gzip"``) so each representation has its own tag.
+
+Bodies are compressed once when the entry is built: gzip always and brotli
+when the ``brotli`` package is installed. Only the compressed variants are
+kept; the identity body is rebuilt from gzip for the rare client that
+accepts neither.
+"""
+
+import gzip
+import hashlib
+import json
+import struct
+from base64 import b64decode
+from typing import Dict, Optional, Tuple
+
+from core.config import cache_rate_limit_settings as settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+MAGIC = b"CE"
+VERSION = 3
+_HEADER = struct.Struct(">2sBHdIHHBB")
+_HEADER_V2 = struct.Struct(">2sBHdIHHB")
+_HEADER_V1 = struct.Struct(">2sBHdIHH")
+_VARIANT = struct.Struct(">BI")
+
+IDENTITY = "identity"
+# preferred first when the client accepts several with the same q-value
+ENCODINGS = ("br", "gzip")
+_COMPRESSIBLE = ("text/", "json", "xml", "javascript", "svg")
+
+
+def compressible(media_type: str) -> bool:
+    media_type = media_type.lower()
+    return any(marker in media_type for marker in _COMPRESSIBLE)
+
+
+def encode_variants(body: bytes, media_type: str) -> Dict[str, bytes]:
+    """Compressed variants of ``body``, or just the identity body when not worth it.
+
+    ``body`` may be a ``bytearray``; it is only copied when kept uncompressed.
+    """
+    if len(body) < settings.cache_compress_min_bytes or not compressible(media_type):
+        return {IDENTITY: bytes(body)}
+    variants = {}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=settings.cache_brotli_quality)
+    variants["gzip"] = gzip.compress(body, compresslevel=settings.cache_gzip_level, mtime=0)
+    if len(variants["gzip"]) >= len(body):
+        return {IDENTITY: bytes(body)}
+    return variants
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse ``Accept-Encoding`` into ``{coding: q}``."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ("status_code", "media_type", "cache_control", "stored_at", "fresh_for", "variants", "etag")
+
+    def __init__(
+        self,
+        status_code: int,
+        media_type: str,
+        cache_control: str,
+        variants: Dict[str, bytes],
+        stored_at: Optional[float] = None,
+        fresh_for: int = 0,
+        etag: Optional[str] = None,
+    ) -> None:
+        self.status_code = status_code
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.variants = variants
+        self.stored_at = stored_at
+        self.fresh_for = fresh_for
+        self.etag = etag if etag is not None else make_etag(self.body)
+
+    @classmethod
+    def build(
+        cls,
+        status_code: int,
+        media_type: str,
+        cache_control: str,
+        body: bytes,
+        stored_at: Optional[float] = None,
+        fresh_for: int = 0,
+    ) -> "CacheEntry":
+        return cls(
+            status_code,
+            media_type,
+            cache_control,
+            encode_variants(body, media_type),
+            stored_at,
+            fresh_for,
+            make_etag(body),
+        )
+
+    @property
+    def body(self) -> bytes:
+        """The uncompressed body."""
+        if IDENTITY in self.variants:
+            return self.variants[IDENTITY]
+        return gzip.decompress(self.variants["gzip"])
+
+    def encoding_for(self, accept_encoding: str) -> Optional[str]:
+        """The stored encoding to send for ``Accept-Encoding``; ``None`` for the identity body."""
+        if IDENTITY in self.variants or not accept_encoding:
+            return None
+        accepted = accepted_encodings(accept_encoding)
+        best = None
+        best_q = 0.0
+        for coding in ENCODINGS:
+            q = accepted.get(coding, accepted.get("*", 0.0))
+            if coding in self.variants and q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """Pick the stored variant for ``Accept-Encoding``; returns (content-encoding, bytes)."""
+        encoding = self.encoding_for(accept_encoding)
+        if encoding is not None:
+            return encoding, self.variants[encoding]
+        return None, self.body
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """ETag of the representation sent with ``encoding``."""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """Whether ``If-None-Match`` names any representation of this body (weak comparison)."""
+        if if_none_match.strip() == "*":
+            return True
+        base = self.etag[1:-1]
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            opaque = tag.strip('"')
+            if opaque == base or opaque.startswith(base + "-"):
+                return True
+        return False
+
+    def pack(self) -> bytes:
+        media_type = self.media_type.encode("latin-1")
+        cache_control = self.cache_control.encode("latin-1")
+        etag = self.etag.encode("ascii")
+        parts = [
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                self.status_code,
+                self.stored_at or 0.0,
+                self.fresh_for,
+                len(media_type),
+                len(cache_control),
+                len(self.variants),
+                len(etag),
+            ),
+            media_type,
+            cache_control,
+            etag,
+        ]
+        for coding, body in self.variants.items():
+            name = coding.encode("ascii")
+            parts += (_VARIANT.pack(len(name), len(body)), name, body)
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional["CacheEntry"]:
+        """Decode ``data``; ``None`` if it is not a layout we understand."""
+        if data[:2] == MAGIC:
+            try:
+                return cls._unpack_binary(data)
+            except (IndexError, struct.error, UnicodeDecodeError):
+                return None
+        if data[:1] == b"{":
+            return cls._from_legacy(data)
+        return None
+
+    @classmethod
+    def _unpack_binary(cls, data: bytes) -> Optional["CacheEntry"]:
+        version = data[2]
+        etag_len = 0
+        if version == 1:
+            _, _, status_code, stored_at, fresh_for, media_len, cc_len = _HEADER_V1.unpack_from(data)
+            start, count = _HEADER_V1.size, 0
+        elif version == 2:
+            _, _, status_code, stored_at, fresh_for, media_len, cc_len, count = _HEADER_V2.unpack_from(data)
+            start = _HEADER_V2.size
+        elif version == VERSION:
+            _, _, status_code, stored_at, fresh_for, media_len, cc_len, count, etag_len = _HEADER.unpack_from(data)
+            start = _HEADER.size
+        else:
+            return None
+        media_type = data[start:start + media_len].decode("latin-1")
+        start += media_len
+        cache_control = data[start:start + cc_len].decode("latin-1")
+        start += cc_len
+        # older versions get theirs computed from the body
+        etag = data[start:start + etag_len].decode("ascii") if etag_len else None
+        start += etag_len
+        if version == 1:
+            variants = {IDENTITY: data[start:]}
+        else:
+            variants = {}
+            for _ in range(count):
+                name_len, body_len = _VARIANT.unpack_from(data, start)
+                start += _VARIANT.size
+                coding = data[start:start + name_len].decode("ascii")
+                start += name_len
+                variants[coding] = data[start:start + body_len]
+                start += body_len
+        return cls(status_code, media_type, cache_control, variants, stored_at or None, fresh_for, etag)
+
+    @classmethod
+    def _from_legacy(cls, data: bytes) -> Optional["CacheEntry"]:
+        try:
+            document = json.loads(data)
+            headers = {name.lower(): value for name, value in (document.get("headers") or {}).items()}
+            return cls(
+                int(document["status_code"]),
+                headers.get("content-type") or document.get("media_type") or "application/json",
+                headers.get("cache-control") or "",
+                {IDENTITY: b64decode(document["body"])},
+                document.get("stored_at"),
+                int(document.get("fresh_for") or 0),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
@@ -3,7 +3,18 @@ import os
 
 class CacheRateLimitSettings:
     redis_url = os.getenv("REDIS_URL")
+    cache_backend = os.getenv("CACHE_BACKEND", "")
+    memory_backend_max_bytes = int(os.getenv("MEMORY_BACKEND_MAX_BYTES", str(128 * 1024 * 1024)))
+    memory_backend_max_counters = int(os.getenv("MEMORY_BACKEND_MAX_COUNTERS", "100000"))
     cache_ttl_seconds = int(os.getenv("API_CACHE_TTL_SECONDS", "3600"))
+    cache_stale_while_revalidate_seconds = int(os.getenv("API_CACHE_STALE_WHILE_REVALIDATE_SECONDS", "3600"))
+    cache_stale_if_error_seconds = int(os.getenv("API_CACHE_STALE_IF_ERROR_SECONDS", "86400"))
+    cache_refresh_timeout_seconds = float(os.getenv("API_CACHE_REFRESH_TIMEOUT_SECONDS", "10"))
+    cache_compress_min_bytes = int(os.getenv("API_CACHE_COMPRESS_MIN_BYTES", "1024"))
+    cache_gzip_level = int(os.getenv("API_CACHE_GZIP_LEVEL", "6"))
+    cache_brotli_quality = int(os.getenv("API_CACHE_BROTLI_QUALITY", "5"))
+    fill_lease_ttl_seconds = float(os.getenv("FILL_LEASE_TTL_SECONDS", "30"))
+    fill_lease_wait_seconds = float(os.getenv("FILL_LEASE_WAIT_SECONDS", "5"))
     invalid_user_cache_ttl_seconds = int(os.getenv("INVALID_USER_CACHE_TTL_SECONDS", "300"))
     rate_limit_ip_requests = int(os.getenv("RATE_LIMIT_IP_REQUESTS", "60"))
     rate_limit_handle_requests = int(os.getenv("RATE_LIMIT_HANDLE_REQUESTS", "30"))
@@ -13,6 +24,90 @@ class CacheRateLimitSettings:
     invalid_rate_limit_window_seconds = int(os.getenv("INVALID_RATE_LIMIT_WINDOW_SECONDS", "600"))
     rate_limit_backoff_base_seconds = int(os.getenv("RATE_LIMIT_BACKOFF_BASE_SECONDS", "5"))
     rate_limit_backoff_max_seconds = int(os.getenv("RATE_LIMIT_BACKOFF_MAX_SECONDS", "300"))
+    l1_cache_max_bytes = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    l1_cache_max_ttl_seconds = float(os.getenv("L1_CACHE_MAX_TTL_SECONDS", "300"))
 
 
 cache_rate_limit_settings = CacheRateLimitSettings()
+
+
+class UpstreamSettings:
+    pool_limit = int(os.getenv("UPSTREAM_POOL_LIMIT", "100"))
+    pool_limit_per_host = int(os.getenv("UPSTREAM_POOL_LIMIT_PER_HOST", "20"))
+    keepalive_seconds = float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "60"))
+    dns_cache_ttl_seconds = int(os.getenv("UPSTREAM_DNS_CACHE_TTL_SECONDS", "300"))
+    timeout_seconds = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "30"))
+    connect_timeout_seconds = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "10"))
+    prewarm_connections = int(os.getenv("UPSTREAM_PREWARM_CONNECTIONS", "0"))
+    # Codeforces allows about one call per two seconds; a burst of 3 covers a
+    # cold card (user.info, user.rating, user.status)
+    budget_rate_per_second = float(os.getenv("UPSTREAM_BUDGET_RATE_PER_SECOND", "0.5"))
+    budget_burst = int(os.getenv("UPSTREAM_BUDGET_BURST", "3"))
+    budget_max_wait_seconds = float(os.getenv("UPSTREAM_BUDGET_MAX_WAIT_SECONDS", "10"))
+    user_info_batch_window_ms = float(os.getenv("USER_INFO_BATCH_WINDOW_MS", "5"))
+    user_info_batch_max_handles = int(os.getenv("USER_INFO_BATCH_MAX_HANDLES", "100"))
+    common_contests_concurrency = int(os.getenv("COMMON_CONTESTS_CONCURRENCY", "8"))
+    contest_catalogue_refresh_seconds = float(os.getenv("CONTEST_CATALOGUE_REFRESH_SECONDS", "300"))
+
+
+upstream_settings = UpstreamSettings()
+
+
+class SubmissionStoreSettings:
+    backend = os.getenv("SUBMISSION_STORE", "")
+    sqlite_path = os.getenv("SUBMISSION_STORE_SQLITE_PATH", "submissions.sqlite3")
+    ttl_seconds = int(os.getenv("SUBMISSION_STORE_TTL_SECONDS", str(30 * 86400)))
+    max_handles = int(os.getenv("SUBMISSION_STORE_MAX_HANDLES", "1000"))
+    first_page_size = int(os.getenv("SUBMISSION_STORE_FIRST_PAGE_SIZE", "20"))
+    max_page_size = int(os.getenv("SUBMISSION_STORE_MAX_PAGE_SIZE", "1000"))
+    full_refresh_seconds = int(os.getenv("SUBMISSION_STORE_FULL_REFRESH_SECONDS", "86400"))
+
+
+submission_store_settings = SubmissionStoreSettings()
+
+
+class HandleDataSettings:
+    ttl_seconds = float(os.getenv("HANDLE_DATA_TTL_SECONDS", "300"))
+    max_handles = int(os.getenv("HANDLE_DATA_MAX_HANDLES", "1000"))
+    canonical_handles_max = int(os.getenv("CANONICAL_HANDLES_MAX", "100000"))
+
+
+handle_data_settings = HandleDataSettings()
+
+
+class PrewarmSettings:
+    # inline: this process refreshes hot handles; publish: it only publishes
+    # them to Redis for prewarm_worker.py; off: no tracking
+    mode = os.getenv("PREWARM_MODE", "inline").lower()
+    top_k = int(os.getenv("PREWARM_TOP_K", "200"))
+    sketch_width = int(os.getenv("PREWARM_SKETCH_WIDTH", "4096"))
+    sketch_depth = int(os.getenv("PREWARM_SKETCH_DEPTH", "4"))
+    paths_per_handle = int(os.getenv("PREWARM_PATHS_PER_HANDLE", "8"))
+    interval_seconds = float(os.getenv("PREWARM_INTERVAL_SECONDS", "30"))
+    lead_seconds = float(os.getenv("PREWARM_LEAD_SECONDS", "120"))
+    decay_seconds = float(os.getenv("PREWARM_DECAY_SECONDS", "3600"))
+    handles_per_minute = float(os.getenv("PREWARM_HANDLES_PER_MINUTE", "30"))
+
+
+prewarm_settings = PrewarmSettings()
+
+
+class RatingWatchSettings:
+    enabled = os.getenv("RATING_WATCH_ENABLED", "true").lower() in {"1", "true", "yes"}
+    interval_seconds = float(os.getenv("RATING_WATCH_INTERVAL_SECONDS", "300"))
+    lookback_seconds = float(os.getenv("RATING_WATCH_LOOKBACK_SECONDS", str(3 * 86400)))
+    recheck_seconds = float(os.getenv("RATING_WATCH_RECHECK_SECONDS", "900"))
+    batch_size = int(os.getenv("RATING_WATCH_BATCH_SIZE", "500"))
+
+
+rating_watch_settings = RatingWatchSettings()
+
+
+class InvalidFilterSettings:
+    enabled = os.getenv("INVALID_FILTER_ENABLED", "true").lower() in {"1", "true", "yes"}
+    capacity = int(os.getenv("INVALID_FILTER_CAPACITY", "100000"))
+    false_positive_rate = float(os.getenv("INVALID_FILTER_FALSE_POSITIVE_RATE", "0.001"))
+    sync_interval_seconds = float(os.getenv("INVALID_FILTER_SYNC_SECONDS", "60"))
+
+
+invalid_filter_settings = InvalidFilterSettings()
@@ -0,0 +1,79 @@
+"""Approximate request counting: a count-min sketch plus a top-K tracker.
+
+``CountMinSketch`` estimates per-key counts in fixed memory (``depth`` rows of
+``width`` counters) and never under-counts. ``HeavyHitters`` keeps the ``k``
+keys with the highest estimates alongside it. ``decay`` halves every count so
+the ranking follows recent traffic rather than all-time totals.
+"""
+
+import hashlib
+from array import array
+from typing import Dict, List, Tuple
+
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int) -> None:
+        self.width = width
+        self.depth = depth
+        self._rows = [array("L", bytes(array("L").itemsize * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        # double hashing: row i uses first + i * second
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Count ``key`` and return its new estimate."""
+        estimate = None
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += count
+            value = row[index]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate or 0
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def decay(self) -> None:
+        for row in self._rows:
+            for index, value in enumerate(row):
+                if value:
+                    row[index] = value >> 1
+
+
+class HeavyHitters:
+    def __init__(self, k: int, width: int, depth: int) -> None:
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self._top: Dict[str, int] = {}
+        self._floor = 0
+
+    def add(self, key: str) -> int:
+        estimate = self.sketch.add(key)
+        if key in self._top:
+            self._top[key] = estimate
+        elif len(self._top) < self.k:
+            self._top[key] = estimate
+            self._floor = min(self._top.values())
+        elif estimate > self._floor:
+            # the floor may lag behind keys that grew since; check the real minimum
+            lowest = min(self._top, key=self._top.__getitem__)
+            if estimate > self._top[lowest]:
+                del self._top[lowest]
+                self._top[key] = estimate
+            self._floor = min(self._top.values())
+        return estimate
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._top
+
+    def top(self, n: int | None = None) -> List[Tuple[str, int]]:
+        ranked = sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+    def decay(self) -> None:
+        self.sketch.decay()
+        self._top = {key: count >> 1 for key, count in self._top.items()}
+        self._floor = min(self._top.values(), default=0)
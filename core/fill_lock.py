@@ -0,0 +1,151 @@
+"""Cross-instance fill leases for cache misses.
+
+``SingleFlight`` coalesces identical work inside one process, but with several
+uvicorn workers or serverless instances a hot key that expires is still filled
+once per instance. Before filling, an instance takes a lease in Redis
+(``SET lease:{key} token NX PX``). Instances that find the lease taken
+subscribe to ``lease-done:{key}`` and wait up to ``FILL_LEASE_WAIT_SECONDS`` for
+the holder to publish, then read the result back from the shared cache.
+
+The lease expires after ``FILL_LEASE_TTL_SECONDS``, so a worker that dies
+mid-fill blocks the key for at most that long; a waiter that times out fills
+the key itself. Without Redis, or when Redis fails, every fill just runs.
+"""
+
+import asyncio
+import secrets
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from core.cache import get_redis
+from core.config import cache_rate_limit_settings as settings
+from core.singleflight import SingleFlight
+
+
+LEASE_KEY = "lease:{key}"
+DONE_CHANNEL = "lease-done:{key}"
+# drop the lease only while we still hold it (it may have expired and been
+# taken by another instance), then wake whoever is waiting
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('del', KEYS[1])
+end
+return redis.call('publish', ARGV[2], '1')
+"""
+
+lease_stats = {"acquired": 0, "contended": 0, "peer_fills": 0, "timeouts": 0, "errors": 0}
+# one subscription per key in this process, however many requests wait on it
+_waits = SingleFlight()
+
+
+class Lease:
+    __slots__ = ("key", "token", "_client")
+
+    def __init__(self, key: str, token: str, client=None) -> None:
+        self.key = key
+        self.token = token
+        self._client = client
+
+    async def release(self) -> None:
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        try:
+            await client.eval(
+                RELEASE_SCRIPT, 1, LEASE_KEY.format(key=self.key), self.token, DONE_CHANNEL.format(key=self.key)
+            )
+        except Exception:
+            lease_stats["errors"] += 1
+
+
+async def acquire(key: str) -> Lease | None:
+    """Take the fill lease for ``key``; ``None`` while another instance holds it.
+
+    Without Redis the returned lease is a no-op, so callers always fill.
+    """
+    client = get_redis()
+    token = secrets.token_hex(8)
+    if client is None:
+        return Lease(key, token)
+    try:
+        acquired = await client.set(
+            LEASE_KEY.format(key=key), token, nx=True, px=max(1, int(settings.fill_lease_ttl_seconds * 1000))
+        )
+    except Exception:
+        lease_stats["errors"] += 1
+        return Lease(key, token)
+    if not acquired:
+        lease_stats["contended"] += 1
+        return None
+    lease_stats["acquired"] += 1
+    return Lease(key, token, client)
+
+
+async def _wait(key: str, check: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+    client = get_redis()
+    if client is None:
+        return None
+    channel = DONE_CHANNEL.format(key=key)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(channel)
+        # the holder may have published before we subscribed
+        result = await check()
+        if result is not None:
+            return result
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                return await check()
+    except Exception:
+        lease_stats["errors"] += 1
+        return None
+    finally:
+        try:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+
+async def wait(key: str, check: Callable[[], Awaitable[Any]], timeout: float | None = None) -> Any:
+    """Wait for the lease holder of ``key`` to finish and return ``check()``.
+
+    ``check`` reads the filled value from the shared cache and returns ``None``
+    while it is not there. Returns ``None`` when nothing arrives within
+    ``timeout``; the result is shared between waiters, so treat it as read-only.
+    """
+    timeout = settings.fill_lease_wait_seconds if timeout is None else timeout
+    result = await _waits.do(key, lambda: _wait(key, check, timeout))
+    if result is None:
+        lease_stats["timeouts"] += 1
+    else:
+        lease_stats["peer_fills"] += 1
+    return result
+
+
+async def fill(
+    key: str,
+    load: Callable[[], Awaitable[Any]],
+    check: Callable[[], Awaitable[Any]],
+    timeout: float | None = None,
+) -> Any:
+    """Run ``load`` under the lease for ``key``, or take the holder's result via ``check``.
+
+    ``load`` must write its result where ``check`` finds it.
+    """
+    lease = await acquire(key)
+    if lease is None:
+        result = await wait(key, check, timeout)
+        if result is not None:
+            return result
+    try:
+        return await load()
+    finally:
+        if lease is not None:
+            await lease.release()
@@ -0,0 +1,75 @@
+"""Incremental decoding of Codeforces ``{"status": ..., "result": [...]}`` bodies.
+
+``ResultArrayDecoder`` is fed raw byte chunks as they arrive and hands back each
+element of the ``result`` array as soon as it is complete, so a caller can
+aggregate while the rest of the body is still downloading. Only the unparsed
+tail (at most one partial element plus one chunk) is ever buffered.
+"""
+
+import codecs
+import json
+import re
+from typing import Any
+
+_RESULT_START = re.compile(r'"result"\s*:\s*\[')
+_SKIP = " \t\r\n,"
+
+_PREFIX, _ITEMS, _SUFFIX = range(3)
+
+
+class ResultArrayDecoder:
+    def __init__(self) -> None:
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._prefix = ""
+        self._state = _PREFIX
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Consume ``chunk`` and return the ``result`` elements it completed."""
+        self._buffer += self._text.decode(chunk)
+        if self._state == _PREFIX:
+            match = _RESULT_START.search(self._buffer)
+            if match is None:
+                return []
+            self._prefix = self._buffer[: match.end() - 1]
+            self._buffer = self._buffer[match.end():]
+            self._state = _ITEMS
+        if self._state == _ITEMS:
+            return self._drain()
+        return []
+
+    def _drain(self) -> list[Any]:
+        items = []
+        buffer, pos, end = self._buffer, 0, len(self._buffer)
+        while True:
+            while pos < end and buffer[pos] in _SKIP:
+                pos += 1
+            if pos == end:
+                break
+            if buffer[pos] == "]":
+                self._state = _SUFFIX
+                pos += 1
+                break
+            try:
+                item, pos = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # element is still incomplete; wait for the next chunk
+                break
+            items.append(item)
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self) -> dict[str, Any]:
+        """Finish the body and return the envelope without its ``result`` array.
+
+        Raises ``ValueError`` if the body ended inside the array or is not JSON.
+        """
+        self._buffer += self._text.decode(b"", final=True)
+        if self._state == _PREFIX:
+            return json.loads(self._buffer)
+        if self._state == _ITEMS:
+            raise ValueError("response ended inside the result array")
+        envelope = json.loads(self._prefix + "[]" + self._buffer)
+        envelope.pop("result", None)
+        return envelope
@@ -0,0 +1,167 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters and fixed-bucket histograms keep their samples in plain dicts keyed by
+label values. Every instrumented call site runs on the event loop thread and an
+update never awaits, so no locks are taken; each uvicorn worker reports its
+own numbers, to be summed by the scraper. A histogram observation is one
+``bisect`` over its bucket bounds plus two additions.
+
+``registry.render()`` produces the ``/metrics`` body. Stats kept elsewhere as
+plain dicts (cache tiers, fill leases) are read at scrape time through
+``registry.collect`` instead of being counted twice.
+"""
+
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+# upstream and request latencies: 1ms to 30s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name, type, help, [(labels, value)]) gathered at scrape time
+Family = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        # the 0.0.4 text format names the family after its ``_total`` samples
+        self.family = f"{name}_total"
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        values = self._values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.family}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-on-render histogram over fixed upper bounds (``le``)."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.family = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket ..., count above the last bound, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return int(sum(state[:-1])) if state is not None else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), state):
+                cumulative += hits
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(state[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: list[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Add families computed at scrape time by ``collector``."""
+        self._collectors.append(collector)
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.family} {metric.help}")
+            lines.append(f"# TYPE {metric.family} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_labels(names, tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# its _count series doubles as the request counter for hit ratios
+cache_request_seconds = registry.histogram(
+    "cfapi_cache_request_duration_seconds",
+    "Time spent answering per-handle GET requests, by cache outcome.",
+    ("outcome",),
+)
+rate_limit_checks = registry.counter(
+    "cfapi_rate_limit_checks",
+    "Rate-limit checks by result and the limit that decided them.",
+    ("result", "limited_by"),
+)
+upstream_requests = registry.counter(
+    "cfapi_upstream_requests",
+    "Requests sent to the Codeforces API, by method and outcome.",
+    ("method", "outcome"),
+)
+upstream_request_seconds = registry.histogram(
+    "cfapi_upstream_request_duration_seconds",
+    "Codeforces API latency per method, from sending the request to reading the body.",
+    ("method",),
+)
@@ -1,18 +1,22 @@
+import asyncio
 import hashlib
 import re
 import json
+import time
 from collections.abc import Callable
 
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse, Response
 
-from core.cache import decode_body, encode_body, get_json, redis_enabled, set_json
+from core import fill_lock, metrics
+from core.cache import get_entry, get_json, key_stats, cache_enabled, set_entry, set_json
+from core.cache_entry import IDENTITY, CacheEntry, make_etag
 from core.config import cache_rate_limit_settings as settings
-from core.rate_limit import RateLimitResult, check_rate_limit
+from core.rate_limit import RateLimitResult, check_rate_limits
+from core.singleflight import SingleFlight
 
 
-SKIP_PATHS = {"/", "/docs", "/redoc", "/openapi.json", "/favicon.ico"}
+SKIP_PATHS = {"/", "/docs", "/redoc", "/openapi.json", "/favicon.ico", "/metrics"}
 INVALID_USER_MARKERS = ("user does not exist", "user not found", "not found on", "invalid username")
 
 
@@ -35,30 +39,40 @@ def _handle_from_path(path: str) -> str | None:
     return segment.lower()
 
 
-def _query_string(request: Request) -> str:
-    pairs = sorted(request.query_params.multi_items())
-    return "&".join(f"{key}={value}" for key, value in pairs)
+def _query_string(pairs: list[tuple[str, str]]) -> str:
+    return "&".join(f"{key}={value}" for key, value in sorted(pairs))
 
 
-def _cache_key(platform: str, request: Request) -> str:
-    raw = f"{request.method}:{request.url.path}:{_query_string(request)}"
+def _cache_key(platform: str, method: str, path: str, query: list[tuple[str, str]]) -> str:
+    raw = f"{method}:{path}:{_query_string(query)}"
     digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
     return f"cache:{platform}:{digest}"
 
 
-def _is_invalid_user(status_code: int, body: bytes) -> bool:
+def _is_invalid_user(status_code: int, body: bytes | bytearray) -> bool:
     if status_code == 404:
         return True
     try:
         payload = json.loads(body.decode("utf-8"))
     except (UnicodeDecodeError, ValueError):
         return False
+    if not isinstance(payload, dict):
+        # list endpoints (/contests/upcoming, /multi/...) and null bodies
+        return False
 
     message = str(payload.get("message") or payload.get("detail") or "").lower()
     status = str(payload.get("status") or "").lower()
     return status == "error" and any(marker in message for marker in INVALID_USER_MARKERS)
 
 
+def _invalid_user_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=404,
+        content={"status": "error", "message": "User does not exist"},
+        headers={"X-Cache": "NEGATIVE-HIT"},
+    )
+
+
 def _rate_limited_response(result: RateLimitResult) -> JSONResponse:
     headers = {
         "Retry-After": str(result.retry_after),
@@ -88,117 +102,478 @@ def _ttl_from_cache_control(headers: dict, default: int) -> int:
     return default
 
 
-class CacheRateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, platform: str) -> None:
-        super().__init__(app)
-        self.platform = platform.lower()
+def _prewarm_scope(path: str, query_string: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "root_path": "",
+        "query_string": query_string.encode("latin-1"),
+        "headers": [(b"host", b"prewarm")],
+        "client": None,
+        "server": None,
+    }
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if request.method != "GET" or not redis_enabled() or request.url.path in SKIP_PATHS:
-            return await call_next(request)
 
-        handle = _handle_from_path(request.url.path)
+def _outcome(response: Response) -> str:
+    """Metrics label for an answer the middleware produced itself."""
+    if response.status_code == 429:
+        return "RATE-LIMITED"
+    if response.status_code == 304:
+        return "NOT-MODIFIED"
+    # scanning the raw headers is cheaper than building a Headers view
+    for name, value in response.raw_headers:
+        if name == b"x-cache":
+            return value.decode("latin-1")
+    return "MISS"
+
+
+def _stale_window() -> int:
+    return max(settings.cache_stale_while_revalidate_seconds, settings.cache_stale_if_error_seconds, 0)
+
+
+def _freshness(cached: CacheEntry) -> str:
+    """Classify a cached entry as ``fresh``, ``stale`` (serve and revalidate) or ``expired``.
+
+    Entries written before ``stored_at`` existed are treated as fresh until
+    the backend drops them.
+    """
+    if cached.stored_at is None:
+        return "fresh"
+    age = time.time() - cached.stored_at
+    fresh_for = cached.fresh_for
+    if age < fresh_for:
+        return "fresh"
+    if age < fresh_for + settings.cache_stale_while_revalidate_seconds:
+        return "stale"
+    return "expired"
+
+
+class CacheRateLimitMiddleware:
+    """Response cache, negative cache and rate limits for per-handle routes.
+
+    ``canonicalize(path, query, resolve)`` optionally maps a request to its
+    canonical ``(path, query, resolved)`` so spellings of the same request
+    share one cache entry; see ``services.request_keys.canonical_request``.
+    ``prewarm`` is told about every cacheable request (``record``) and drives
+    ``needs_refresh``/``refresh``; see ``services.prewarm``. ``invalid_filter``
+    answers handles it knows to be invalid before any backend I/O and learns
+    new ones from responses; see ``services.invalid_handles``.
+
+    A plain ASGI middleware: a miss streams to the client as the route
+    produces it while the body is copied for the cache, and cached answers go
+    out as a single body message.
+    """
+
+    def __init__(
+        self, app, platform: str, canonicalize: Callable | None = None, prewarm=None, invalid_filter=None
+    ) -> None:
+        self.app = app
+        self.platform = platform.lower()
+        self.canonicalize = canonicalize
+        self.prewarm = prewarm
+        self.invalid_filter = invalid_filter
+        if prewarm is not None:
+            prewarm.attach(self)
+        # one revalidation per key in this process, however many requests see it stale
+        self._refreshes = SingleFlight()
+        self._tasks: set = set()
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not cache_enabled()
+            or scope["path"] in SKIP_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        handle = _handle_from_path(scope["path"])
         if handle is None:
-            return await call_next(request)
-
-        key = _cache_key(self.platform, request)
-        cached = await get_json(key)
-        if cached is not None:
-            headers = dict(cached.get("headers") or {})
-            headers["X-Cache"] = "HIT"
-            headers.setdefault("Cache-Control", f"public, max-age={settings.cache_ttl_seconds}")
-            return Response(
-                content=decode_body(cached["body"]),
-                status_code=int(cached["status_code"]),
-                headers=headers,
-                media_type=cached.get("media_type") or "application/json",
-            )
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        response = await self._dispatch(Request(scope, receive), handle, send)
+        if response is None:
+            outcome = "MISS"
+        else:
+            await response(scope, receive, send)
+            outcome = _outcome(response)
+        metrics.cache_request_seconds.observe(time.perf_counter() - started, outcome)
+
+    async def _dispatch(self, request: Request, handle: str, send: Callable) -> Response | None:
+        """Answer ``request`` from the cache or a limit; ``None`` once a miss was streamed to ``send``."""
+        if self.invalid_filter is not None and self.invalid_filter.known_invalid(handle):
+            return _invalid_user_response()
+
+        key, rewritten, resolved = await self._request_key(request, resolve=False)
+        accept_encoding = request.headers.get("accept-encoding", "")
+        if_none_match = request.headers.get("if-none-match", "")
+        cached = await get_entry(key)
+        served = self._serve_cached(
+            key, cached, request.scope, accept_encoding, rewritten, if_none_match
+        )
+        if served is not None:
+            self._record(handle, request)
+            return served
 
         invalid_key = f"invalid:{self.platform}:{handle}"
         invalid_cached = await get_json(invalid_key)
         if invalid_cached is not None:
+            if self.invalid_filter is not None:
+                # whoever cached it already shared it; skip the next lookups here
+                await self.invalid_filter.add(handle, share=False)
             limited = await self._check_invalid_limits(request, handle)
             if not limited.allowed:
                 return _rate_limited_response(limited)
-            return JSONResponse(
-                status_code=404,
-                content={"status": "error", "message": "User does not exist"},
-                headers={"X-Cache": "NEGATIVE-HIT"},
-            )
+            return _invalid_user_response()
 
         limited = await self._check_limits(request, handle)
         if not limited.allowed:
             return _rate_limited_response(limited)
 
-        response = await call_next(request)
-        body = b""
-        async for chunk in response.body_iterator:
-            body += chunk
-
-        headers = dict(response.headers)
-        headers.pop("content-length", None)
-        headers["X-Cache"] = "MISS"
+        if not resolved:
+            # first sight of this spelling: resolve it (the route needs user.info
+            # anyway) and look again under the canonical key
+            canonical_key, rewritten, _ = await self._request_key(request, resolve=True)
+            if canonical_key != key:
+                key = canonical_key
+                cached = await get_entry(key)
+                served = self._serve_cached(
+                    key, cached, request.scope, accept_encoding, rewritten, if_none_match
+                )
+                if served is not None:
+                    self._record(handle, request)
+                    return served
+
+        self._record(handle, request)
+        if cached is not None:
+            # past the stale-while-revalidate window: refresh now, but fall back
+            # to the last good body (stale-if-error) if Codeforces fails or stalls
+            return await self._revalidate_or_stale(
+                key, request.scope, cached, handle, invalid_key, accept_encoding, if_none_match
+            )
 
-        invalid_user = _is_invalid_user(response.status_code, body)
-        if invalid_user:
-            await set_json(invalid_key, {"invalid": True}, settings.invalid_user_cache_ttl_seconds)
-        elif response.status_code == 200:
-            headers.setdefault("Cache-Control", f"public, max-age={settings.cache_ttl_seconds}")
-            ttl = _ttl_from_cache_control(headers, settings.cache_ttl_seconds)
-            await set_json(key, self._cached_response(response, body), ttl)
+        lease = await fill_lock.acquire(key)
+        if lease is None:
+            # another instance is rendering this key; take its entry if it lands in time
+            filled = await fill_lock.wait(key, lambda: self._filled(key))
+            if filled is not None:
+                return self._from_cache(filled, "HIT", accept_encoding, if_none_match)
+        try:
+            await self._stream_miss(request.scope, request.receive, send, key, handle, invalid_key)
+        finally:
+            if lease is not None:
+                await lease.release()
+        return None
 
-        return Response(
-            content=body,
-            status_code=response.status_code,
-            headers=headers,
-            media_type=response.media_type,
-            background=response.background,
-        )
+    async def _stream_miss(
+        self, scope: dict, receive: Callable, send: Callable, key: str, handle: str, invalid_key: str
+    ) -> None:
+        """Run the app, passing its response through as it is produced and
+        keeping a copy of the body to store once the last chunk is sent.
+
+        A 200 whose body arrives in one message gets the ETag its cache entry
+        will have, so the client can revalidate from its first fetch."""
+        status_code = 500
+        headers: dict = {}
+        body = bytearray()
+        start: dict | None = None
+
+        async def tee(message: dict) -> None:
+            nonlocal status_code, headers, start
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                raw_headers = list(message.get("headers", []))
+                if status_code == 200 and not any(name.lower() == b"cache-control" for name, _ in raw_headers):
+                    raw_headers.append(
+                        (b"cache-control", f"public, max-age={settings.cache_ttl_seconds}".encode("latin-1"))
+                    )
+                headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in raw_headers}
+                message = {**message, "headers": raw_headers + [(b"x-cache", b"MISS")]}
+                if status_code == 200 and "etag" not in headers:
+                    # hold the headers until the first body message shows whether it is the whole body
+                    start = message
+                    return
+            elif message["type"] == "http.response.body":
+                body.extend(message.get("body", b""))
+                if start is not None:
+                    held, start = start, None
+                    if not message.get("more_body", False):
+                        etag = make_etag(bytes(body)).encode("latin-1")
+                        held = {**held, "headers": held["headers"] + [(b"etag", etag)]}
+                    await send(held)
+            await send(message)
+
+        await self.app(scope, receive, tee)
+
+        if _is_invalid_user(status_code, body):
+            await self._remember_invalid(handle, invalid_key)
+        elif status_code == 200:
+            headers.pop("content-length", None)
+            await self._store(key, status_code, headers, None, body, self._index(scope))
+
+    async def _remember_invalid(self, handle: str, invalid_key: str) -> None:
+        await set_json(invalid_key, {"invalid": True}, settings.invalid_user_cache_ttl_seconds)
+        if self.invalid_filter is not None:
+            await self.invalid_filter.add(handle)
+
+    def _record(self, handle: str, request: Request) -> None:
+        if self.prewarm is not None:
+            self.prewarm.record(handle, request.scope["path"], request.scope.get("query_string", b"").decode("latin-1"))
+
+    async def needs_refresh(self, path: str, query_string: str, lead_seconds: float) -> bool:
+        """Whether the entry for ``GET path?query_string`` is missing or fresh for under ``lead_seconds``."""
+        key, _, _ = await self._request_key(Request(_prewarm_scope(path, query_string)), resolve=False)
+        cached = await get_entry(key)
+        if cached is None:
+            return True
+        if cached.stored_at is None:
+            return False
+        return cached.stored_at + cached.fresh_for - time.time() < lead_seconds
+
+    async def refresh(self, path: str, query_string: str) -> int:
+        """Re-render ``GET path?query_string`` into the cache; returns the status code."""
+        scope = _prewarm_scope(path, query_string)
+        key, _, _ = await self._request_key(Request(scope), resolve=False)
+        status_code, _, _, _ = await self._revalidate(key, scope)
+        return status_code
+
+    async def _request_key(self, request: Request, resolve: bool) -> tuple[str, bool, bool]:
+        """Cache key for ``request``, whether canonicalization changed it and
+        whether the handle spelling was resolved.
+
+        When canonicalization changes the path, the request is rewritten so the
+        route renders the canonical handle and every spelling gets the same body.
+        """
+        path = request.url.path
+        query = request.query_params.multi_items()
+        raw_key = _cache_key(self.platform, request.method, path, query)
+        if self.canonicalize is None:
+            return raw_key, False, True
+        try:
+            path, query, resolved = await self.canonicalize(path, query, resolve)
+        except Exception:
+            return raw_key, False, True
+        key = _cache_key(self.platform, request.method, path, query)
+        if path != request.url.path:
+            request.scope["path"] = path
+            request.scope["raw_path"] = path.encode("utf-8")
+        key_stats["lookups"] += 1
+        if key != raw_key:
+            key_stats["canonicalized"] += 1
+        return key, key != raw_key, resolved
+
+    def _serve_cached(
+        self,
+        key: str,
+        cached: CacheEntry | None,
+        scope: dict,
+        accept_encoding: str,
+        rewritten: bool,
+        if_none_match: str = "",
+    ) -> Response | None:
+        """Answer from a fresh or revalidating entry; ``None`` when the request must go on."""
+        if cached is None:
+            return None
+        freshness = _freshness(cached)
+        if freshness != "expired":
+            key_stats["hits"] += 1
+            if rewritten:
+                # the raw key would have been a separate entry, so this hit is the gain
+                key_stats["canonical_hits"] += 1
+        if freshness == "fresh":
+            return self._from_cache(cached, "HIT", accept_encoding, if_none_match)
+        if freshness == "stale":
+            self._revalidate_in_background(key, scope)
+            return self._from_cache(cached, "STALE", accept_encoding, if_none_match)
+        return None
 
     async def _check_limits(self, request: Request, handle: str) -> RateLimitResult:
-        ip = _client_ip(request)
-        ip_result = await check_rate_limit(
-            f"ip:{self.platform}:{ip}",
-            settings.rate_limit_ip_requests,
-            settings.rate_limit_window_seconds,
-            "ip",
-        )
-        if not ip_result.allowed:
-            return ip_result
-        return await check_rate_limit(
-            f"handle:{self.platform}:{handle}",
-            settings.rate_limit_handle_requests,
-            settings.rate_limit_window_seconds,
-            "handle",
+        # both limits in one round trip; the handle is not counted once the IP is limited
+        return await check_rate_limits(
+            [
+                (f"ip:{self.platform}:{_client_ip(request)}", settings.rate_limit_ip_requests,
+                 settings.rate_limit_window_seconds, "ip"),
+                (f"handle:{self.platform}:{handle}", settings.rate_limit_handle_requests,
+                 settings.rate_limit_window_seconds, "handle"),
+            ]
         )
 
     async def _check_invalid_limits(self, request: Request, handle: str) -> RateLimitResult:
-        ip = _client_ip(request)
-        ip_result = await check_rate_limit(
-            f"invalid-ip:{self.platform}:{ip}",
-            settings.invalid_rate_limit_ip_requests,
-            settings.invalid_rate_limit_window_seconds,
-            "invalid-ip",
-        )
-        if not ip_result.allowed:
-            return ip_result
-        return await check_rate_limit(
-            f"invalid-handle:{self.platform}:{handle}",
-            settings.invalid_rate_limit_handle_requests,
-            settings.invalid_rate_limit_window_seconds,
-            "invalid-handle",
+        return await check_rate_limits(
+            [
+                (f"invalid-ip:{self.platform}:{_client_ip(request)}", settings.invalid_rate_limit_ip_requests,
+                 settings.invalid_rate_limit_window_seconds, "invalid-ip"),
+                (f"invalid-handle:{self.platform}:{handle}", settings.invalid_rate_limit_handle_requests,
+                 settings.invalid_rate_limit_window_seconds, "invalid-handle"),
+            ]
         )
 
     @staticmethod
-    def _cached_response(response: Response, body: bytes) -> dict:
+    def _from_cache(
+        cached: CacheEntry, outcome: str, accept_encoding: str = "", if_none_match: str = ""
+    ) -> Response:
+        encoding = cached.encoding_for(accept_encoding)
         headers = {
-            key: value
-            for key, value in response.headers.items()
-            if key.lower() in {"content-type", "cache-control"}
-        }
-        return {
-            "status_code": response.status_code,
-            "headers": headers,
-            "media_type": response.media_type or "application/json",
-            "body": encode_body(body),
+            "Cache-Control": cached.cache_control or f"public, max-age={settings.cache_ttl_seconds}",
+            "ETag": cached.etag_for(encoding),
+            "X-Cache": outcome,
         }
+        if IDENTITY not in cached.variants:
+            # an identity answer rebuilt from a compressed variant still depends on Accept-Encoding
+            headers["Vary"] = "Accept-Encoding"
+        if if_none_match and cached.matches(if_none_match):
+            key_stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        body = cached.variants[encoding] if encoding is not None else cached.body
+        return Response(
+            content=body,
+            status_code=cached.status_code,
+            headers=headers,
+            media_type=cached.media_type or "application/json",
+        )
+
+    def _index(self, scope: dict) -> tuple[str, str, str]:
+        """``(platform, handle, route)`` under which a response for ``scope`` is indexed."""
+        handle, _, route = scope["path"].strip("/").partition("/")
+        return self.platform, handle.lower(), route
+
+    @staticmethod
+    async def _store(
+        key: str,
+        status_code: int,
+        headers: dict,
+        media_type: str | None,
+        body: bytes | bytearray,
+        index: tuple[str, str, str] | None = None,
+    ) -> CacheEntry | None:
+        """Store the response under ``key``; ``None`` when its ``max-age`` is 0."""
+        fresh_for = _ttl_from_cache_control(headers, settings.cache_ttl_seconds)
+        if fresh_for <= 0:
+            # never fresh: storing it would only serve it STALE for the whole stale window
+            return None
+        entry = CacheEntry.build(
+            status_code,
+            headers.get("content-type") or media_type or "application/json",
+            headers.get("cache-control") or headers.get("Cache-Control") or "",
+            body,
+            stored_at=time.time(),
+            fresh_for=fresh_for,
+        )
+        # the backend keeps the entry for the whole stale window; freshness is decided on read
+        await set_entry(key, entry, fresh_for + _stale_window(), index)
+        return entry
+
+    async def _render(self, scope: dict) -> tuple[int, dict, bytes]:
+        """Run the wrapped app for a copy of ``scope`` and collect the response."""
+        scope = dict(scope)
+        done = asyncio.Event()
+        requested = False
+        status_code = 500
+        headers: dict = {}
+        body = bytearray()
+
+        async def receive() -> dict:
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            nonlocal status_code, headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                body.extend(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        headers.pop("content-length", None)
+        return status_code, headers, bytes(body)
+
+    async def _filled(self, key: str) -> CacheEntry | None:
+        """A fresh entry for ``key`` written by any instance, else ``None``."""
+        entry = await get_entry(key, local=False)
+        if entry is None or _freshness(entry) != "fresh":
+            return None
+        return entry
+
+    def _revalidate(self, key: str, scope: dict) -> "asyncio.Future":
+        async def render() -> tuple[int, dict, bytes, CacheEntry | None]:
+            status_code, headers, body = await self._render(scope)
+            entry = None
+            if status_code == 200:
+                headers.setdefault("cache-control", f"public, max-age={settings.cache_ttl_seconds}")
+                entry = await self._store(
+                    key, status_code, headers, headers.get("content-type"), body, self._index(scope)
+                )
+            return status_code, headers, body, entry
+
+        async def filled() -> tuple[int, dict, bytes, CacheEntry] | None:
+            entry = await self._filled(key)
+            return None if entry is None else (entry.status_code, {}, entry.body, entry)
+
+        async def refresh() -> tuple[int, dict, bytes, CacheEntry | None]:
+            # one instance re-renders; the others pick its entry up from Redis
+            return await fill_lock.fill(key, render, filled)
+
+        return asyncio.ensure_future(self._refreshes.do(key, refresh))
+
+    def _revalidate_in_background(self, key: str, scope: dict) -> None:
+        self._track(self._revalidate(key, scope))
+
+    def _track(self, task: "asyncio.Future") -> None:
+        self._tasks.add(task)
+
+        def finished(task: asyncio.Future) -> None:
+            self._tasks.discard(task)
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(finished)
+
+    async def _revalidate_or_stale(
+        self,
+        key: str,
+        scope: dict,
+        cached: CacheEntry,
+        handle: str,
+        invalid_key: str,
+        accept_encoding: str,
+        if_none_match: str = "",
+    ) -> Response:
+        task = self._revalidate(key, scope)
+        try:
+            status_code, headers, body, entry = await asyncio.wait_for(
+                asyncio.shield(task), settings.cache_refresh_timeout_seconds
+            )
+        except Exception:
+            # let a slow refresh finish in the background so the next request gets it
+            if not task.done():
+                self._track(task)
+            return self._from_cache(cached, "STALE", accept_encoding, if_none_match)
+        if status_code >= 500:
+            # includes the 502 the routes answer when Codeforces cannot be reached
+            return self._from_cache(cached, "STALE", accept_encoding, if_none_match)
+        if entry is not None:
+            return self._from_cache(entry, "MISS", accept_encoding, if_none_match)
+        if _is_invalid_user(status_code, body):
+            await self._remember_invalid(handle, invalid_key)
+        headers["X-Cache"] = "MISS"
+        return Response(content=body, status_code=status_code, headers=headers)
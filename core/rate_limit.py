@@ -1,7 +1,23 @@
+"""Windowed rate limits with exponential backoff, evaluated in the cache backend.
+
+Every limit has a counter (``rl:{key}``), a violation count
+(``violations:{key}``) and a backoff marker (``backoff:{key}``). A request
+over the limit sets a backoff of ``RATE_LIMIT_BACKOFF_BASE_SECONDS`` doubled
+per consecutive violation (capped at ``RATE_LIMIT_BACKOFF_MAX_SECONDS``);
+while it lasts the limit denies without counting.
+
+``check_rate_limits`` evaluates several limits in order in one backend call
+(one Lua script with Redis), so the IP and handle limits of a request cost a
+single round trip. The first limit that denies ends the check and later
+limits are not counted. The in-memory backend counts sliding windows instead
+of fixed ones; see ``core.cache_backend``.
+"""
+
 import time
 from dataclasses import dataclass
 
-from core.cache import get_redis
+from core import metrics
+from core.cache import get_backend
 from core.config import cache_rate_limit_settings as settings
 
 
@@ -15,39 +31,33 @@ class RateLimitResult:
     reset_at: int | None = None
 
 
-async def check_rate_limit(key: str, limit: int, window_seconds: int, label: str) -> RateLimitResult:
-    client = get_redis()
-    if client is None:
-        return RateLimitResult(allowed=True)
+async def check_rate_limits(limits: list[tuple[str, int, int, str]]) -> RateLimitResult:
+    """Count a request against ``(key, limit, window_seconds, label)`` limits in order.
 
-    backoff_key = f"backoff:{key}"
-    violations_key = f"violations:{key}"
-    counter_key = f"rl:{key}"
+    Returns the first denial, or the last limit's result when all allow. Fails
+    open when caching is off or the backend errors.
+    """
+    backend = get_backend()
+    if backend is None or not limits:
+        return RateLimitResult(allowed=True)
     now = int(time.time())
-
     try:
-        retry_after = await client.ttl(backoff_key)
-        if retry_after and retry_after > 0:
-            return RateLimitResult(False, retry_after, label, limit, 0, now + retry_after)
-
-        count = await client.incr(counter_key)
-        if count == 1:
-            await client.expire(counter_key, window_seconds)
-
-        ttl = await client.ttl(counter_key)
-        reset_at = now + max(ttl, 0)
-        remaining = max(limit - count, 0)
-        if count <= limit:
-            await client.delete(violations_key)
-            return RateLimitResult(True, 0, label, limit, remaining, reset_at)
-
-        violations = await client.incr(violations_key)
-        await client.expire(violations_key, settings.rate_limit_backoff_max_seconds)
-        backoff = min(
-            settings.rate_limit_backoff_base_seconds * (2 ** max(violations - 1, 0)),
+        index, allowed, retry_after, remaining, reset_in = await backend.check_rate_limits(
+            [(key, limit, window_seconds) for key, limit, window_seconds, _ in limits],
+            settings.rate_limit_backoff_base_seconds,
             settings.rate_limit_backoff_max_seconds,
         )
-        await client.setex(backoff_key, backoff, "1")
-        return RateLimitResult(False, backoff, label, limit, 0, now + backoff)
     except Exception:
+        metrics.rate_limit_checks.inc("error", "")
         return RateLimitResult(allowed=True)
+
+    _, limit, _, label = limits[index - 1]
+    if not allowed:
+        metrics.rate_limit_checks.inc("denied", label)
+        return RateLimitResult(False, retry_after, label, limit, 0, now + retry_after)
+    metrics.rate_limit_checks.inc("allowed", label)
+    return RateLimitResult(True, 0, label, limit, max(remaining, 0), now + max(reset_in, 0))
+
+
+async def check_rate_limit(key: str, limit: int, window_seconds: int, label: str) -> RateLimitResult:
+    return await check_rate_limits([(key, limit, window_seconds, label)])
@@ -0,0 +1,183 @@
+"""Process-wide HTTP client for outbound Codeforces API calls.
+
+A single pooled ``aiohttp.ClientSession`` keeps TLS connections to
+codeforces.com alive between cache misses, so a miss no longer pays a fresh
+TCP+TLS handshake per call. The app lifespan opens and closes the session;
+``get_session`` also creates it lazily so scripts, tests and serverless cold
+starts work without the lifespan hook.
+
+Identical concurrent calls (same method and params) are coalesced through a
+``SingleFlight`` so a burst of cache misses costs one upstream request. Each
+request that does go out first takes a token from the shared upstream budget
+(``core.upstream_budget``). Requests that go out are counted and timed per
+method in ``core.metrics``; coalesced callers are not counted again.
+
+A ``FAILED`` reply is an upstream failure too (``Call limit exceeded`` comes
+back as an HTTP 503 with a normal JSON body) and raises ``UpstreamFailed``,
+an ``aiohttp.ClientError``. Only an unknown handle (``MISSING_HANDLE``) is
+returned as a reply, so callers can tell it from an outage.
+"""
+
+import asyncio
+import re
+import time
+from collections.abc import Callable
+from typing import Any
+
+import aiohttp
+
+from core import metrics, upstream_budget
+from core.config import upstream_settings as settings
+from core.json_stream import ResultArrayDecoder
+from core.singleflight import SingleFlight
+
+
+API_BASE = "https://codeforces.com/api"
+STREAM_CHUNK_BYTES = 64 * 1024
+MISSING_HANDLE = re.compile(r"User with handle (\S+) not found", re.IGNORECASE)
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+flights = SingleFlight()
+
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.pool_limit,
+        limit_per_host=settings.pool_limit_per_host,
+        keepalive_timeout=settings.keepalive_seconds,
+        use_dns_cache=True,
+        ttl_dns_cache=settings.dns_cache_ttl_seconds,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.timeout_seconds,
+        connect=settings.connect_timeout_seconds,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared session, creating it for the running loop if needed."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = _new_session()
+        _session_loop = loop
+    return _session
+
+
+async def _prewarm(session: aiohttp.ClientSession, connections: int) -> None:
+    async def touch() -> None:
+        try:
+            async with session.head(API_BASE) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return
+
+    await asyncio.gather(*(touch() for _ in range(connections)))
+
+
+async def startup() -> None:
+    session = get_session()
+    if settings.prewarm_connections > 0:
+        await _prewarm(session, settings.prewarm_connections)
+
+
+async def shutdown() -> None:
+    global _session, _session_loop
+    session, _session, _session_loop = _session, None, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+class UpstreamFailed(aiohttp.ClientError):
+    """Codeforces answered ``FAILED`` for a reason other than an unknown handle."""
+
+
+def _raise_for_failure(method: str, envelope: Any) -> None:
+    if not isinstance(envelope, dict) or envelope.get("status") != "FAILED":
+        return
+    comment = envelope.get("comment") or ""
+    if not MISSING_HANDLE.search(comment):
+        raise UpstreamFailed(f"Codeforces {method} failed: {comment}")
+
+
+async def _take_budget(method: str) -> None:
+    try:
+        await upstream_budget.acquire()
+    except upstream_budget.UpstreamBudgetExceeded:
+        metrics.upstream_requests.inc(method, "budget")
+        raise
+
+
+def _observe(method: str, outcome: str, started: float) -> None:
+    metrics.upstream_requests.inc(method, outcome)
+    metrics.upstream_request_seconds.observe(time.perf_counter() - started, method)
+
+
+async def _get_json(method: str, params: dict[str, Any] | None) -> dict[str, Any]:
+    await _take_budget(method)
+    session = get_session()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        async with session.get(f"{API_BASE}/{method}", params=params) as response:
+            data = await response.json()
+            outcome = str(response.status)
+            _raise_for_failure(method, data)
+            return data
+    except asyncio.TimeoutError as exc:
+        outcome = "timeout"
+        raise aiohttp.ServerTimeoutError(f"Codeforces {method} timed out") from exc
+    finally:
+        _observe(method, outcome, started)
+
+
+async def fetch_json(method: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+    """GET ``{API_BASE}/{method}`` over the shared session and decode the body.
+
+    Concurrent calls with the same method and params share one request and
+    receive the same (read-only) result. Timeouts are re-raised as
+    ``aiohttp.ServerTimeoutError`` and an exhausted budget raises
+    ``UpstreamBudgetExceeded`` and a ``FAILED`` reply other than an unknown
+    handle raises ``UpstreamFailed``, so callers only need to handle
+    ``aiohttp.ClientError``.
+    """
+    key = (method, tuple(sorted((params or {}).items())))
+    return await flights.do(key, lambda: _get_json(method, params))
+
+
+async def stream_result(
+    method: str,
+    params: dict[str, Any] | None,
+    on_item: Callable[[Any], None],
+) -> dict[str, Any]:
+    """GET ``method`` and pass each ``result`` element to ``on_item`` as it arrives.
+
+    The body is decoded incrementally, so memory stays bounded by one element
+    and aggregation overlaps with the download. Returns the envelope (``status``,
+    ``comment``) without ``result``. Not coalesced: callers single-flight at
+    their own level. Malformed bodies raise ``aiohttp.ClientPayloadError`` and
+    ``FAILED`` replies other than an unknown handle raise ``UpstreamFailed``.
+    """
+    await _take_budget(method)
+    session = get_session()
+    decoder = ResultArrayDecoder()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        async with session.get(f"{API_BASE}/{method}", params=params) as response:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+                for item in decoder.feed(chunk):
+                    on_item(item)
+            envelope = decoder.close()
+            outcome = str(response.status)
+            _raise_for_failure(method, envelope)
+            return envelope
+    except asyncio.TimeoutError as exc:
+        outcome = "timeout"
+        raise aiohttp.ServerTimeoutError(f"Codeforces {method} timed out") from exc
+    except ValueError as exc:
+        raise aiohttp.ClientPayloadError(f"Malformed Codeforces {method} response") from exc
+    finally:
+        _observe(method, outcome, started)
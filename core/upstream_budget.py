@@ -0,0 +1,105 @@
+"""Token bucket shared by every outbound Codeforces call.
+
+With ``REDIS_URL`` set the bucket lives in Redis and is refilled by a Lua
+script against the Redis clock, so all uvicorn workers and instances draw from
+one budget. Without Redis (or when Redis errors) a per-process bucket with the
+same parameters is used instead.
+
+A caller that finds the bucket empty reserves the next token and sleeps only
+until it is due; callers never pay a fixed delay. If the wait would exceed
+``budget_max_wait_seconds`` no token is taken and ``UpstreamBudgetExceeded`` is
+raised.
+"""
+
+import asyncio
+import math
+import time
+
+import aiohttp
+
+from core.cache import get_redis
+from core.config import upstream_settings as settings
+
+
+BUDGET_KEY = "budget:codeforces:upstream"
+
+# Returns the milliseconds to wait for the reserved token, or -1 when the wait
+# would exceed ARGV[3] (in which case nothing is reserved).
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate / 1000) - 1
+local wait = 0
+if tokens < 0 then
+    wait = math.ceil(-tokens * 1000 / rate)
+    if wait > max_wait then
+        return -1
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + wait + 1000)
+return wait
+"""
+
+
+class UpstreamBudgetExceeded(aiohttp.ClientError):
+    """The shared upstream budget cannot grant a call within the allowed wait."""
+
+
+class LocalTokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self, max_wait: float) -> float | None:
+        """Reserve one token; return seconds to wait, or ``None`` if too long."""
+        now = time.monotonic()
+        tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+        wait = -tokens / self.rate if tokens < 0 else 0.0
+        if wait > max_wait:
+            return None
+        self._tokens = tokens
+        self._updated = now
+        return wait
+
+
+_local = LocalTokenBucket(settings.budget_rate_per_second, settings.budget_burst)
+
+
+async def _take_shared(max_wait: float) -> float | None:
+    client = get_redis()
+    if client is not None:
+        try:
+            wait_ms = await client.eval(
+                _TAKE_SCRIPT,
+                1,
+                BUDGET_KEY,
+                settings.budget_rate_per_second,
+                settings.budget_burst,
+                math.floor(max_wait * 1000),
+            )
+            wait_ms = int(wait_ms)
+            return None if wait_ms < 0 else wait_ms / 1000
+        except Exception:
+            pass
+    return _local.take(max_wait)
+
+
+async def acquire(max_wait: float | None = None) -> None:
+    """Wait until the shared budget grants one upstream call."""
+    if settings.budget_rate_per_second <= 0:
+        return
+    limit = settings.budget_max_wait_seconds if max_wait is None else max_wait
+    wait = await _take_shared(limit)
+    if wait is None:
+        raise UpstreamBudgetExceeded("Codeforces upstream budget exhausted")
+    if wait > 0:
+        await asyncio.sleep(wait)
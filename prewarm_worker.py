@@ -0,0 +1,29 @@
+"""Standalone pre-warm worker.
+
+Run alongside app processes started with ``PREWARM_MODE=publish``: they count
+requests and publish their hot handles to Redis, and this process refreshes
+those handles' cached responses before they go stale, within
+``PREWARM_HANDLES_PER_MINUTE``.
+
+    REDIS_URL=redis://... python prewarm_worker.py
+"""
+
+import asyncio
+
+from app import app
+from core import upstream
+from services import prewarm
+
+
+async def main() -> None:
+    # building the stack attaches the cache middleware to the scheduler
+    app.middleware_stack = app.build_middleware_stack()
+    await upstream.startup()
+    try:
+        await prewarm.scheduler.run_forever(published=True)
+    finally:
+        await upstream.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
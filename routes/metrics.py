@@ -0,0 +1,43 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.cache import cache_stats
+from core.fill_lock import lease_stats
+from core.metrics import registry
+from services.invalid_handles import invalid_filter
+
+
+router = APIRouter(tags=["Operations"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _stat_families():
+    # counters and sizes mixed in one dict, so exposed untyped
+    for tier, stats in cache_stats().items():
+        yield (
+            f"cfapi_cache_{tier}",
+            "untyped",
+            f"Cache {tier} statistics of this process.",
+            [({"stat": stat}, value) for stat, value in stats.items()],
+        )
+    yield (
+        "cfapi_fill_lease",
+        "untyped",
+        "Fill lease events of this process.",
+        [({"stat": stat}, value) for stat, value in lease_stats.items()],
+    )
+    yield (
+        "cfapi_invalid_filter",
+        "untyped",
+        "Invalid-handle filter statistics of this process.",
+        [({"stat": stat}, value) for stat, value in invalid_filter.stats().items()],
+    )
+
+
+registry.collect(_stat_families)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, HTTPException, Path
 
 from models.canonical import make_envelope
-from services import canonical_mapper
-from services.users import get_user_info
+from services import canonical_mapper, handle_data
 
 
 router = APIRouter(tags=["Canonical"])
@@ -10,7 +9,7 @@ router = APIRouter(tags=["Canonical"])
 
 @router.get("/{userid}/profile")
 async def get_profile(userid: str = Path(..., description="Codeforces handle")):
-    info = await get_user_info([userid])
+    info = (await handle_data.load(userid, "info")).info
     if not info:
         raise HTTPException(status_code=404, detail=f"User information not found for {userid}")
-    return make_envelope(userid, canonical_mapper.profile_from(info[0], userid))
+    return make_envelope(userid, canonical_mapper.profile_from(info, userid))
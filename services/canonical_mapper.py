@@ -1,14 +1,15 @@
 """Builds the canonical cross-platform card for CodeForces from the official API.
 
-Profile/rating/rank come from ``user.info`` + ``user.rating``; solved count and
-topic analysis are aggregated from ``user.status`` submissions; the heatmap reuses
-the existing activity-heatmap builder. CodeForces has no public badges, so that
+Profile/rating/rank come from ``user.info`` + ``user.rating``; solved count,
+topic analysis, contest participation and the heatmap are all projections of a
+single ``user.status`` download (``SubmissionSnapshot``). All of them are read
+through the per-handle ``HandleData`` cache, so every endpoint and heatmap view
+of a warm handle is a projection. CodeForces has no public badges, so that
 section is empty. See ../CANONICAL_SCHEMA.md.
 """
 
-import asyncio
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Optional
 
 from models.canonical.badges import Badges
 from models.canonical.card import Card
@@ -18,12 +19,10 @@ from models.canonical.profile import Profile, Social
 from models.canonical.rating import RatingPoint, Rating
 from models.canonical.stats import TopicCount, Stats
 from models.canonical.summary import Summary
-from services.contests import get_contests_participated_by_user
-from services.heatmap import get_user_activity_heatmap
+from services import handle_data
+from services.heatmap import heatmap_from_snapshot
 from services.heatmap_window import window_heatmap
-from services.rating import get_user_rating
-from services.stats import get_solved_problem_count, get_solved_tags
-from services.users import get_user_info
+from services.submissions import SubmissionSnapshot
 
 
 def _ts_to_date(timestamp) -> Optional[str]:
@@ -49,11 +48,13 @@ def profile_from(info: Optional[dict], handle: str) -> Profile:
     )
 
 
-def stats_from(solved_count: int, tags: List[dict]) -> Stats:
+def stats_from(snapshot: Optional[SubmissionSnapshot]) -> Stats:
+    if snapshot is None:
+        return Stats(totalSolved=0, byDifficulty={}, topicAnalysis=[])
     return Stats(
-        totalSolved=solved_count or 0,
+        totalSolved=snapshot.solved_count,
         byDifficulty={},
-        topicAnalysis=[TopicCount(topic=t["topic"], count=t["count"]) for t in tags],
+        topicAnalysis=[TopicCount(topic=t["topic"], count=t["count"]) for t in snapshot.topics()],
     )
 
 
@@ -147,61 +148,61 @@ def summary_from(card: Card) -> Summary:
     )
 
 
+def _full_heatmap(data: handle_data.HandleData) -> tuple[Heatmap, Optional[list]]:
+    # Build the full history once per handle and slice locally so every view
+    # goes through the same windowing path; availableYears comes from the
+    # registration date.
+    heatmap = heatmap_from_snapshot(data.handle, data.info, data.snapshot, days=None, year=None)
+    available_years = heatmap.available_years if heatmap else None
+    return heatmap_from(heatmap), available_years
+
+
+def _heatmap_projection(data: handle_data.HandleData) -> tuple[Heatmap, Optional[list]]:
+    if data.snapshot is None or data.info is None:
+        return _full_heatmap(data)
+    return data.projection("heatmap", lambda: _full_heatmap(data))
+
+
+def _contests_count(data: handle_data.HandleData) -> int:
+    return len(data.snapshot.contest_ids) if data.snapshot else 0
+
+
 async def build_stats(handle: str) -> Stats:
-    solved, tags = await asyncio.gather(
-        get_solved_problem_count(handle),
-        get_solved_tags(handle),
-    )
-    return stats_from(solved or 0, tags)
+    data = await handle_data.load(handle, "snapshot")
+    return stats_from(data.snapshot)
 
 
 async def build_contests(handle: str) -> Contests:
-    info, rating_history, contests = await asyncio.gather(
-        get_user_info([handle]),
-        get_user_rating(handle),
-        get_contests_participated_by_user(handle),
-    )
-    return contests_from(info[0] if info else None, rating_history, len(contests or []))
+    data = await handle_data.load(handle, "info", "rating", "snapshot")
+    return contests_from(data.info, data.rating, _contests_count(data))
 
 
 async def build_rating(handle: str) -> Rating:
-    info, rating_history = await asyncio.gather(
-        get_user_info([handle]),
-        get_user_rating(handle),
-    )
-    return rating_from(info[0] if info else None, rating_history)
+    data = await handle_data.load(handle, "info", "rating")
+    return rating_from(data.info, data.rating)
 
 
 async def build_profile(handle: str) -> Profile:
-    info = await get_user_info([handle])
-    return profile_from(info[0] if info else None, handle)
+    data = await handle_data.load(handle, "info")
+    return profile_from(data.info, handle)
 
 
 async def build_heatmap(handle: str, view: str = "all", year: int | None = None) -> Heatmap:
-    # Fetch the full history and slice locally so every view goes through the
-    # same windowing path; availableYears comes from the registration date.
-    heatmap = await get_user_activity_heatmap(handle, days=None, year=None)
-    available_years = heatmap.available_years if heatmap else None
-    return window_heatmap(heatmap_from(heatmap), view, year, available_years=available_years)
+    data = await handle_data.load(handle, "info", "snapshot")
+    heatmap, available_years = _heatmap_projection(data)
+    # window_heatmap slices in place; the memoized full heatmap is shared
+    return window_heatmap(heatmap.model_copy(), view, year, available_years=available_years)
 
 
 async def build_card(handle: str) -> Card:
-    info, rating_history, contests, solved, tags, heatmap = await asyncio.gather(
-        get_user_info([handle]),
-        get_user_rating(handle),
-        get_contests_participated_by_user(handle),
-        get_solved_problem_count(handle),
-        get_solved_tags(handle),
-        get_user_activity_heatmap(handle, days=None, year=None),
-    )
-    info0 = info[0] if info else None
-    available_years = heatmap.available_years if heatmap else None
+    data = await handle_data.load(handle, "info", "rating", "snapshot")
+    heatmap, available_years = _heatmap_projection(data)
     return Card(
         username=handle,
-        profile=profile_from(info0, handle),
-        stats=stats_from(solved or 0, tags),
-        contests=contests_from(info0, rating_history, len(contests or [])),
-        rating=rating_from(info0, rating_history),
-        heatmap=window_heatmap(heatmap_from(heatmap), "all", None, available_years=available_years),
+        profile=profile_from(data.info, handle),
+        stats=stats_from(data.snapshot),
+        contests=contests_from(data.info, data.rating, _contests_count(data)),
+        rating=rating_from(data.info, data.rating),
+        heatmap=window_heatmap(heatmap.model_copy(), "all", None, available_years=available_years),
         badges=Badges(),
     )
@@ -0,0 +1,128 @@
+"""In-memory ``contest.list`` catalogue refreshed in the background.
+
+The list is loaded at startup (gym contests on first use) and reloaded every
+``CONTEST_CATALOGUE_REFRESH_SECONDS``. Contests are indexed by phase and sorted
+by start time, so upcoming/ongoing queries are a bisect instead of a download
+and a linear scan per request.
+"""
+
+import asyncio
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from core.config import upstream_settings as settings
+from core.singleflight import SingleFlight
+from core.upstream import fetch_json
+
+
+class _PhaseIndex:
+    __slots__ = ("starts", "contests")
+
+    def __init__(self, contests: List[dict]) -> None:
+        self.contests = sorted(contests, key=lambda c: c.get("startTimeSeconds") or 0)
+        self.starts = [c.get("startTimeSeconds") or 0 for c in self.contests]
+
+
+class ContestCatalogue:
+    def __init__(self, gym: bool) -> None:
+        self.gym = gym
+        self.loaded_at: Optional[float] = None
+        self._phases: Dict[str, _PhaseIndex] = {}
+        self._order: Dict[int, int] = {}
+        self._loads = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, contests: List[dict]) -> None:
+        by_phase: Dict[str, List[dict]] = {}
+        for contest in contests:
+            by_phase.setdefault(contest.get("phase"), []).append(contest)
+        # remember the API order so responses keep the shape clients already see
+        self._order = {contest.get("id"): position for position, contest in enumerate(contests)}
+        self._phases = {phase: _PhaseIndex(items) for phase, items in by_phase.items()}
+        self.loaded_at = time.time()
+
+    async def refresh(self) -> bool:
+        async def fetch() -> bool:
+            try:
+                data = await fetch_json("contest.list", {"gym": str(self.gym).lower()})
+            except aiohttp.ClientError:
+                return False
+            if data.get("status") != "OK":
+                return False
+            self.load(data["result"])
+            return True
+
+        return await self._loads.do("contest.list", fetch)
+
+    async def ensure_loaded(self) -> bool:
+        if self.loaded_at is None:
+            await self.refresh()
+        self.start()
+        return self.loaded_at is not None
+
+    def _in_api_order(self, contests: List[dict]) -> List[dict]:
+        return sorted(contests, key=lambda c: self._order.get(c.get("id"), 0))
+
+    def upcoming(self, now: Optional[float] = None) -> List[dict]:
+        """Contests in phase ``BEFORE`` that start after ``now``."""
+        index = self._phases.get("BEFORE")
+        if index is None:
+            return []
+        now = time.time() if now is None else now
+        return self._in_api_order(index.contests[bisect_right(index.starts, now):])
+
+    def ongoing(self, now: Optional[float] = None) -> List[dict]:
+        """Contests running at ``now``, including ones the last load still had as ``BEFORE``."""
+        now = time.time() if now is None else now
+        started = list(self._phases["CODING"].contests) if "CODING" in self._phases else []
+        index = self._phases.get("BEFORE")
+        if index is not None:
+            started += index.contests[: bisect_right(index.starts, now)]
+        running = [c for c in started if c.get("startTimeSeconds", 0) + c.get("durationSeconds", 0) > now]
+        return self._in_api_order(running)
+
+    def finished_since(self, since: float, now: Optional[float] = None) -> List[dict]:
+        """``FINISHED`` contests whose end time falls in ``[since, now]``."""
+        index = self._phases.get("FINISHED")
+        if index is None:
+            return []
+        now = time.time() if now is None else now
+        ended = [
+            contest
+            for contest in index.contests[: bisect_right(index.starts, now)]
+            if since <= (contest.get("startTimeSeconds") or 0) + (contest.get("durationSeconds") or 0) <= now
+        ]
+        return self._in_api_order(ended)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_forever())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.contest_catalogue_refresh_seconds)
+            await self.refresh()
+
+
+catalogues = {False: ContestCatalogue(gym=False), True: ContestCatalogue(gym=True)}
+
+
+async def startup() -> None:
+    await catalogues[False].ensure_loaded()
+
+
+async def shutdown() -> None:
+    for catalogue in catalogues.values():
+        await catalogue.stop()
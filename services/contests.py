@@ -1,51 +1,71 @@
 import asyncio
-import time
-from collections import defaultdict
-from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional, Set
 
-import aiohttp
+from core.config import upstream_settings as settings
+from services.contest_catalogue import catalogues
+from services import handle_data
 
 
 async def get_upcoming_contests(gym: bool = False):
-    """Fetches a list of upcoming contests."""
-    url = f"https://codeforces.com/api/contest.list?gym={str(gym).lower()}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-                if data["status"] == "OK":
-                    current_time = time.time()
-                    return [c for c in data["result"] 
-                           if c["phase"] == "BEFORE" and c["startTimeSeconds"] > current_time]
-                return None
-        except aiohttp.ClientError:
-            return None
+    """Lists upcoming contests from the in-memory contest catalogue."""
+    catalogue = catalogues[bool(gym)]
+    if not await catalogue.ensure_loaded():
+        return None
+    return catalogue.upcoming()
 
 async def get_contests_participated_by_user(handle: str) -> Set[int]:
     """Gets contests participated in by a user."""
-    await asyncio.sleep(2)  # Rate limit
-    url = f"https://codeforces.com/api/user.status?handle={handle}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-                if data["status"] == "OK":
-                    return {s["contestId"] for s in data["result"] if "contestId" in s}
-                return set()
-        except aiohttp.ClientError:
-            return set()
+    snapshot = (await handle_data.load(handle, "snapshot")).snapshot
+    return set(snapshot.contest_ids) if snapshot is not None else set()
+
+def _to_bitset(contest_ids: Set[int]) -> int:
+    """Contest ids as an int bitset (bit ``id`` set), built in linear time."""
+    if not contest_ids:
+        return 0
+    bits = bytearray(max(contest_ids) // 8 + 1)
+    for contest_id in contest_ids:
+        bits[contest_id >> 3] |= 1 << (contest_id & 7)
+    return int.from_bytes(bits, "little")
+
+def _from_bitset(bitset: int) -> Set[int]:
+    contest_ids = set()
+    for position, byte in enumerate(bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")):
+        while byte:
+            low = byte & -byte
+            contest_ids.add(position * 8 + low.bit_length() - 1)
+            byte ^= low
+    return contest_ids
 
 async def get_common_contests(handles: List[str]) -> Set[int]:
-    """Gets common contests for multiple users."""
+    """Gets common contests for multiple users.
+
+    Participation is fetched concurrently (at most ``common_contests_concurrency``
+    at a time) and intersected as bitsets as each handle completes; once the
+    intersection is empty the remaining fetches are cancelled.
+    """
+    unique: dict = {}
+    for handle in handles:
+        unique.setdefault(handle.lower(), handle)
+    handles = list(unique.values())
     if not handles:
         return set()
 
-    all_contests = []
-    for handle in handles:
-        contests = await get_contests_participated_by_user(handle)
-        if not contests:
-            return set()
-        all_contests.append(contests)
+    semaphore = asyncio.Semaphore(max(1, settings.common_contests_concurrency))
+
+    async def participation(handle: str) -> Set[int]:
+        async with semaphore:
+            return await get_contests_participated_by_user(handle)
+
+    tasks = [asyncio.ensure_future(participation(handle)) for handle in handles]
+    common: Optional[int] = None
+    try:
+        for finished in asyncio.as_completed(tasks):
+            contests = _to_bitset(await finished)
+            common = contests if common is None else common & contests
+            if not common:
+                return set()
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    return all_contests[0].intersection(*all_contests[1:])
+    return _from_bitset(common)
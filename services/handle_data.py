@@ -0,0 +1,259 @@
+"""Per-handle aggregates shared by every endpoint.
+
+The HTTP cache keys on the full request, so ``/tourist/stats``,
+``/tourist/topics`` and each heatmap view miss separately. ``HandleData``
+sits beneath it: user info, rating history and the submission snapshot
+(solved set, tag counts, daily buckets) are each loaded at most once per
+handle and kept for ``HANDLE_DATA_TTL_SECONDS`` in a per-process LRU. Sources
+load on first use, so a profile request never downloads ``user.status``, but
+whatever one endpoint loaded is reused by the next. Expensive projections
+(the full heatmap) are memoized on the entry with ``projection`` so every
+view of a warm handle is a slice.
+
+When Codeforces cannot be reached ``load`` raises ``HTTPException(502)``
+instead of handing back an empty source, so an outage is never answered (and
+cached) as an unknown handle or an empty history.
+
+``handles`` maps lowercased handles to the spelling ``user.info`` reports, in a
+per-process LRU backed by a Redis hash shared by every worker; it is filled
+whenever ``user.info`` loads and is used to canonicalize cache keys. Handles
+``user.info`` reports unknown are remembered per process for
+``HANDLE_DATA_TTL_SECONDS``, so resolving a bad handle and rendering its 404
+cost one upstream call.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from fastapi import HTTPException
+
+from core.cache import get_redis
+from core.config import handle_data_settings as settings
+from core.singleflight import SingleFlight
+from services.rating import get_user_rating
+from services.submissions import SubmissionSnapshot, get_submission_snapshot
+from services.user_info_batcher import batcher
+
+HANDLES_KEY = "handles:codeforces"
+UPSTREAM_UNAVAILABLE = "Codeforces is unavailable, try again later"
+
+
+async def _user_info(handle: str) -> Optional[dict]:
+    if handles.missing(handle):
+        return None
+    info = await batcher.get(handle)
+    if info and info.get("handle"):
+        await handles.remember(info["handle"])
+    elif info is None:
+        handles.remember_missing(handle)
+    return info
+
+
+class CanonicalHandles:
+    def __init__(self, max_handles: int, missing_ttl_seconds: float = settings.ttl_seconds) -> None:
+        self.max_handles = max_handles
+        self.missing_ttl_seconds = missing_ttl_seconds
+        self._handles: "OrderedDict[str, str]" = OrderedDict()
+        # lowercased handles user.info reported unknown -> monotonic expiry
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+
+    def _remember_local(self, key: str, canonical: str) -> None:
+        self._handles[key] = canonical
+        self._handles.move_to_end(key)
+        while len(self._handles) > self.max_handles:
+            self._handles.popitem(last=False)
+
+    def remember_missing(self, handle: str) -> None:
+        """Answer ``handle`` as unknown without ``user.info`` for ``missing_ttl_seconds``."""
+        key = handle.lower()
+        self._missing[key] = time.monotonic() + self.missing_ttl_seconds
+        self._missing.move_to_end(key)
+        while len(self._missing) > self.max_handles:
+            self._missing.popitem(last=False)
+
+    def missing(self, handle: str) -> bool:
+        key = handle.lower()
+        expires = self._missing.get(key)
+        if expires is None:
+            return False
+        if time.monotonic() < expires:
+            return True
+        del self._missing[key]
+        return False
+
+    async def remember(self, canonical: str) -> None:
+        key = canonical.lower()
+        self._missing.pop(key, None)
+        if self._handles.get(key) == canonical:
+            return
+        self._remember_local(key, canonical)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.hset(HANDLES_KEY, key, canonical)
+        except Exception:
+            return
+
+    async def lookup(self, handle: str) -> Optional[str]:
+        """Canonical spelling of ``handle`` if any worker has seen it, without upstream calls."""
+        key = handle.lower()
+        canonical = self._handles.get(key)
+        if canonical is not None:
+            self._handles.move_to_end(key)
+            return canonical
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            canonical = await client.hget(HANDLES_KEY, key)
+        except Exception:
+            return None
+        if canonical:
+            self._remember_local(key, canonical)
+        return canonical or None
+
+    async def resolve(self, handle: str) -> Optional[str]:
+        """Canonical spelling of ``handle``, loading ``user.info`` once if it was never seen."""
+        canonical = await self.lookup(handle)
+        if canonical is not None:
+            return canonical
+        try:
+            info = await get_handle_data(handle).user_info()
+        except aiohttp.ClientError:
+            return None
+        return info.get("handle") if info else None
+
+
+class HandleData:
+    """Lazily loaded sources for one handle.
+
+    A source that came back empty (``None``) or raised is retried on next use.
+    """
+
+    __slots__ = ("handle", "loaded_at", "_sources", "_loads", "_projections")
+
+    def __init__(self, handle: str) -> None:
+        self.handle = handle
+        self.loaded_at = time.monotonic()
+        self._sources: Dict[str, Any] = {}
+        self._loads = SingleFlight()
+        self._projections: Dict[str, Any] = {}
+
+    async def _source(self, name: str, load: Callable[[str], Awaitable[Any]]) -> Any:
+        if name in self._sources:
+            return self._sources[name]
+
+        async def fetch():
+            value = await load(self.handle)
+            if value is not None:
+                self._sources[name] = value
+            return value
+
+        return await self._loads.do(name, fetch)
+
+    async def user_info(self) -> Optional[dict]:
+        return await self._source("info", _user_info)
+
+    async def rating_history(self) -> Optional[List[dict]]:
+        return await self._source("rating", get_user_rating)
+
+    async def submission_snapshot(self) -> Optional[SubmissionSnapshot]:
+        return await self._source("snapshot", get_submission_snapshot)
+
+    @property
+    def info(self) -> Optional[dict]:
+        return self._sources.get("info")
+
+    @property
+    def rating(self) -> Optional[List[dict]]:
+        return self._sources.get("rating")
+
+    @property
+    def snapshot(self) -> Optional[SubmissionSnapshot]:
+        return self._sources.get("snapshot")
+
+    def apply_rating_change(self, change: dict) -> None:
+        """Fold a ``contest.ratingChanges`` row into the loaded rating history.
+
+        The row has the same shape as a ``user.rating`` entry. ``user.info``
+        (rating, rank) is dropped and reloaded on next use.
+        """
+        history = self._sources.get("rating")
+        if history is not None and all(row.get("contestId") != change.get("contestId") for row in history):
+            self._sources["rating"] = history + [change]
+        self._sources.pop("info", None)
+        self._projections.clear()
+
+    def projection(self, name: str, build: Callable[[], Any]) -> Any:
+        """Return ``build()``, computed once per entry. Results are shared; do not mutate."""
+        if name not in self._projections:
+            self._projections[name] = build()
+        return self._projections[name]
+
+
+class HandleDataCache:
+    def __init__(self, ttl_seconds: float, max_handles: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_handles = max_handles
+        self._entries: "OrderedDict[str, HandleData]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, handle: str) -> HandleData:
+        key = handle.lower()
+        data = self._entries.get(key)
+        if data is not None and time.monotonic() - data.loaded_at < self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = HandleData(handle)
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_handles:
+            self._entries.popitem(last=False)
+        return data
+
+    def peek(self, handle: str) -> Optional[HandleData]:
+        """The cached entry for ``handle`` without loading or touching recency."""
+        return self._entries.get(handle.lower())
+
+    def invalidate(self, handle: str) -> None:
+        self._entries.pop(handle.lower(), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+cache = HandleDataCache(settings.ttl_seconds, settings.max_handles)
+handles = CanonicalHandles(settings.canonical_handles_max)
+
+
+def get_handle_data(handle: str) -> HandleData:
+    return cache.get(handle)
+
+
+async def load(handle: str, *sources: str) -> HandleData:
+    """Return the handle's entry with ``sources`` (``info``, ``rating``, ``snapshot``) loaded concurrently.
+
+    Read the results from the entry's ``info``/``rating``/``snapshot`` properties.
+    Raises ``HTTPException(502)`` when Codeforces could not be reached for any of them.
+    """
+    data = get_handle_data(handle)
+    loaders = {
+        "info": data.user_info,
+        "rating": data.rating_history,
+        "snapshot": data.submission_snapshot,
+    }
+    try:
+        await asyncio.gather(*(loaders[name]() for name in sources))
+    except aiohttp.ClientError as exc:
+        raise HTTPException(status_code=502, detail=UPSTREAM_UNAVAILABLE) from exc
+    return data
@@ -1,51 +1,20 @@
 import asyncio
-import time
-from collections import defaultdict
 from datetime import date, datetime, timedelta, timezone
-from typing import List, Optional, Set
-
-import aiohttp
+from typing import Dict, List, Optional
 
 from models.heatmap import HeatmapDay, UserActivityHeatmap
-
-async def get_user_info(handles: List[str]):
-    """Fetches information about Codeforces users."""
-    url = f"https://codeforces.com/api/user.info?handles={';'.join(handles)}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-                if data["status"] == "OK":
-                    return data["result"]
-                return None
-        except aiohttp.ClientError:
-            return None
+from services.submissions import SubmissionSnapshot, day_index, get_submission_snapshot
+from services.users import get_user_info
 
 def _build_heatmap_response(
     handle: str,
-    submissions: List[dict],
+    daily: Dict[int, List[int]],
     start_date: date,
     end_date: date,
     mode: str,
     available_years: List[int],
     year: Optional[int] = None,
 ) -> UserActivityHeatmap:
-    activity_by_day = defaultdict(lambda: {"submissions": 0, "accepted": 0})
-
-    for submission in submissions:
-        created_at = datetime.fromtimestamp(
-            submission["creationTimeSeconds"],
-            tz=timezone.utc,
-        ).date()
-
-        if created_at < start_date or created_at > end_date:
-            continue
-
-        day_key = created_at.isoformat()
-        activity_by_day[day_key]["submissions"] += 1
-        if submission.get("verdict") == "OK":
-            activity_by_day[day_key]["accepted"] += 1
-
     days = (end_date - start_date).days + 1
     heatmap = []
     current_streak = 0
@@ -55,12 +24,11 @@ def _build_heatmap_response(
     total_accepted = 0
     active_days = 0
 
+    first_day = day_index(start_date)
     for day_offset in range(days):
         current_date = start_date + timedelta(days=day_offset)
         day_key = current_date.isoformat()
-        day_activity = activity_by_day[day_key]
-        submissions_count = day_activity["submissions"]
-        accepted = day_activity["accepted"]
+        submissions_count, accepted = daily.get(first_day + day_offset, (0, 0))
 
         if submissions_count > 0:
             active_days += 1
@@ -101,21 +69,22 @@ def _build_heatmap_response(
         heatmap=heatmap,
     )
 
-async def get_user_activity_heatmap(
+def heatmap_from_snapshot(
     handle: str,
+    info: Optional[dict],
+    snapshot: Optional[SubmissionSnapshot],
     days: Optional[int] = 365,
     year: Optional[int] = None,
 ) -> Optional[UserActivityHeatmap]:
-    """Builds daily submission activity for a user's heatmap.
+    """Builds the heatmap from an already-fetched ``user.info`` entry and snapshot.
 
     ``year`` restricts to a calendar year; otherwise ``days`` selects a trailing
     window, and ``days=None`` returns the full history since registration.
     """
-    user_info = await get_user_info([handle])
-    if not user_info:
+    if not info or snapshot is None:
         return None
 
-    registered_at = user_info[0].get("registrationTimeSeconds")
+    registered_at = info.get("registrationTimeSeconds")
     if registered_at is None:
         return None
 
@@ -144,22 +113,24 @@ async def get_user_activity_heatmap(
             start_date = registration_date
         mode = "trailing_days"
 
-    url = f"https://codeforces.com/api/user.status?handle={handle}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-                if data["status"] != "OK":
-                    return None
+    return _build_heatmap_response(
+        handle=handle,
+        daily=snapshot.daily,
+        start_date=start_date,
+        end_date=end_date,
+        mode=mode,
+        available_years=available_years,
+        year=year,
+    )
 
-                return _build_heatmap_response(
-                    handle=handle,
-                    submissions=data["result"],
-                    start_date=start_date,
-                    end_date=end_date,
-                    mode=mode,
-                    available_years=available_years,
-                    year=year,
-                )
-        except (aiohttp.ClientError, KeyError, TypeError, ValueError):
-            return None
+async def get_user_activity_heatmap(
+    handle: str,
+    days: Optional[int] = 365,
+    year: Optional[int] = None,
+) -> Optional[UserActivityHeatmap]:
+    """Builds daily submission activity for a user's heatmap."""
+    user_info, snapshot = await asyncio.gather(
+        get_user_info([handle]),
+        get_submission_snapshot(handle),
+    )
+    return heatmap_from_snapshot(handle, user_info[0] if user_info else None, snapshot, days, year)
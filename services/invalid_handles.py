@@ -0,0 +1,130 @@
+"""In-process filter of handles known not to exist.
+
+Bots probing random handles used to cost a cache lookup for the response, one
+for ``invalid:{platform}:{handle}`` and the rate-limit round trips before
+getting their 404. The cache middleware now checks this Bloom filter first and
+answers a known-bad handle without any backend I/O.
+
+Handles go in when a response marks them invalid (``_is_invalid_user``) or a
+negative-cache hit shows another instance found them, and are shared through a
+backend set (``invalid-handles:{platform}``) whose members expire with the
+negative cache. Every ``INVALID_FILTER_SYNC_SECONDS`` the filter is rebuilt
+from that set, which both picks up other instances' handles and forgets
+expired ones, since a Bloom filter cannot delete.
+
+``INVALID_FILTER_CAPACITY`` and ``INVALID_FILTER_FALSE_POSITIVE_RATE`` size the
+filter; a rebuild grows it when the set holds more handles than the capacity.
+A false positive answers 404 for an existing handle until a rebuild over a
+different set clears it, so keep the rate low.
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from core.bloom import BloomFilter
+from core.cache import get_backend
+from core.config import cache_rate_limit_settings
+from core.config import invalid_filter_settings as settings
+
+MEMBERS_KEY = "invalid-handles:{platform}"
+
+
+class InvalidHandleFilter:
+    def __init__(
+        self,
+        platform: str,
+        enabled: bool = settings.enabled,
+        capacity: int = settings.capacity,
+        error_rate: float = settings.false_positive_rate,
+    ) -> None:
+        self.key = MEMBERS_KEY.format(platform=platform.lower())
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        # handles added while a rebuild is reading the backend
+        self._pending: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.rejected = 0
+        self.added = 0
+        self.syncs = 0
+        self.errors = 0
+
+    def known_invalid(self, handle: str) -> bool:
+        if not self.enabled or handle not in self._filter:
+            return False
+        self.rejected += 1
+        return True
+
+    async def add(self, handle: str, share: bool = True) -> None:
+        """Remember ``handle`` as invalid; ``share`` also records it for other instances."""
+        if not self.enabled:
+            return
+        self._filter.add(handle)
+        if self._pending is not None:
+            self._pending.append(handle)
+        self.added += 1
+        backend = get_backend()
+        if not share or backend is None:
+            return
+        try:
+            await backend.add_member(self.key, handle, cache_rate_limit_settings.invalid_user_cache_ttl_seconds)
+        except Exception:
+            self.errors += 1
+
+    async def sync(self) -> bool:
+        """Rebuild the filter from the shared set; ``False`` when it could not be read."""
+        backend = get_backend()
+        if backend is None:
+            return False
+        self._pending = []
+        try:
+            members = await backend.members(self.key)
+        except Exception:
+            self.errors += 1
+            return False
+        finally:
+            pending, self._pending = self._pending, None
+        members += pending
+        rebuilt = BloomFilter(max(self.capacity, len(members)), self.error_rate)
+        for handle in members:
+            rebuilt.add(handle)
+        self._filter = rebuilt
+        self.syncs += 1
+        return True
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                self.errors += 1
+            await asyncio.sleep(settings.sync_interval_seconds)
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run_forever())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rejected": self.rejected,
+            "added": self.added,
+            "syncs": self.syncs,
+            "errors": self.errors,
+            "entries": self._filter.count,
+            "bits": self._filter.size,
+        }
+
+
+invalid_filter = InvalidHandleFilter("codeforces")
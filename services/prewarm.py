@@ -0,0 +1,188 @@
+"""Keeps the most requested handles warm.
+
+Traffic is dominated by a few hundred handles embedded in READMEs (mostly
+``/stats/svg`` cards). Every cacheable request is counted per handle in a
+count-min sketch; the top ``PREWARM_TOP_K`` handles and the paths they were
+requested with are refreshed shortly (``PREWARM_LEAD_SECONDS``) before their
+cached responses stop being fresh, so they essentially never miss.
+
+A refresh drops the handle's ``HandleData`` entry and re-renders each of its
+paths through the cache middleware. At most ``PREWARM_HANDLES_PER_MINUTE``
+handles are refreshed per minute, on top of the shared upstream budget every
+Codeforces call already goes through.
+
+``PREWARM_MODE`` picks where refreshes run: ``inline`` in this process,
+``publish`` hands the hot set to Redis for ``prewarm_worker.py``, ``off``
+disables tracking. A ``PREWARM_HANDLES_PER_MINUTE`` of 0 or less also means
+``off``.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from core.cache import get_redis
+from core.config import prewarm_settings as settings
+from core.count_min import HeavyHitters
+from core.upstream_budget import LocalTokenBucket
+from services import handle_data
+
+HOT_KEY = "prewarm:codeforces:hot"
+PATHS_KEY = "prewarm:codeforces:paths:{handle}"
+
+Path = Tuple[str, str]
+
+
+class PrewarmScheduler:
+    def __init__(
+        self,
+        mode: str = settings.mode,
+        top_k: int = settings.top_k,
+        handles_per_minute: float = settings.handles_per_minute,
+    ) -> None:
+        if handles_per_minute <= 0:
+            # the token bucket cannot refill at a zero rate; no refreshes means off
+            mode, handles_per_minute = "off", 1
+        self.mode = mode
+        self.top_k = top_k
+        self.hot = HeavyHitters(top_k, settings.sketch_width, settings.sketch_depth)
+        self._paths: Dict[str, "OrderedDict[Path, None]"] = {}
+        self._budget = LocalTokenBucket(handles_per_minute / 60, max(1, int(handles_per_minute)))
+        self._middleware = None
+        self._task: Optional[asyncio.Task] = None
+        self._decayed_at = time.monotonic()
+        self.refreshes = 0
+        self.deferred = 0
+
+    def attach(self, middleware) -> None:
+        self._middleware = middleware
+
+    def record(self, handle: str, path: str, query_string: str) -> None:
+        if self.mode == "off":
+            return
+        key = handle.lower()
+        self.hot.add(key)
+        if key not in self.hot:
+            return
+        paths = self._paths.setdefault(key, OrderedDict())
+        paths[(path, query_string)] = None
+        paths.move_to_end((path, query_string))
+        while len(paths) > settings.paths_per_handle:
+            paths.popitem(last=False)
+
+    def _prune(self) -> None:
+        for key in [key for key in self._paths if key not in self.hot]:
+            del self._paths[key]
+
+    def hot_handles(self) -> List[Tuple[str, List[Path]]]:
+        return [(handle, list(self._paths.get(handle, ()))) for handle, _ in self.hot.top()]
+
+    async def refresh_round(self, hot: List[Tuple[str, List[Path]]]) -> int:
+        """Refresh handles in ``hot`` whose entries are about to go stale; returns how many."""
+        if self._middleware is None:
+            return 0
+        refreshed = 0
+        for handle, paths in hot:
+            due = [
+                (path, query)
+                for path, query in paths
+                if await self._middleware.needs_refresh(path, query, settings.lead_seconds)
+            ]
+            if not due:
+                continue
+            if self._budget.take(0) is None:
+                # out of budget for this round; the hottest handles went first
+                self.deferred += 1
+                break
+            handle_data.cache.invalidate(handle)
+            for path, query in due:
+                try:
+                    await self._middleware.refresh(path, query)
+                except Exception:
+                    continue
+            refreshed += 1
+        self.refreshes += refreshed
+        return refreshed
+
+    async def publish(self) -> None:
+        """Share this process's hot set with the standalone worker."""
+        client = get_redis()
+        top = self.hot.top()
+        if client is None or not top:
+            return
+        ttl = int(settings.decay_seconds * 2)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zadd(HOT_KEY, dict(top))
+                pipe.zremrangebyrank(HOT_KEY, 0, -(self.top_k * 2) - 1)
+                pipe.expire(HOT_KEY, ttl)
+                for handle, _ in top:
+                    paths = self._paths.get(handle)
+                    if not paths:
+                        continue
+                    key = PATHS_KEY.format(handle=handle)
+                    pipe.hset(key, mapping={f"{path}?{query}": 1 for path, query in paths})
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+        except Exception:
+            return
+
+    async def published_handles(self) -> List[Tuple[str, List[Path]]]:
+        """The hot set app processes published, hottest first."""
+        client = get_redis()
+        if client is None:
+            return []
+        try:
+            handles = await client.zrevrange(HOT_KEY, 0, self.top_k - 1)
+            async with client.pipeline(transaction=False) as pipe:
+                for handle in handles:
+                    pipe.hkeys(PATHS_KEY.format(handle=handle))
+                paths = await pipe.execute()
+        except Exception:
+            return []
+        return [
+            (handle, [tuple(entry.split("?", 1)) for entry in entries])
+            for handle, entries in zip(handles, paths)
+        ]
+
+    async def run_once(self, published: bool = False) -> int:
+        if time.monotonic() - self._decayed_at >= settings.decay_seconds:
+            self.hot.decay()
+            self._decayed_at = time.monotonic()
+        self._prune()
+        if published:
+            return await self.refresh_round(await self.published_handles())
+        if self.mode == "publish":
+            await self.publish()
+            return 0
+        return await self.refresh_round(self.hot_handles())
+
+    async def run_forever(self, published: bool = False) -> None:
+        while True:
+            await asyncio.sleep(settings.interval_seconds)
+            try:
+                await self.run_once(published)
+            except Exception:
+                continue
+
+    def start(self) -> None:
+        if self.mode == "off":
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run_forever())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracked": len(self.hot.top()), "refreshes": self.refreshes, "deferred": self.deferred}
+
+
+scheduler = PrewarmScheduler()
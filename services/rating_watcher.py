@@ -0,0 +1,144 @@
+"""Invalidates rating-derived cache entries when a rated contest finishes.
+
+After a rated round thousands of cached ``/{handle}``, ``/rating``,
+``/contests`` and ``/basic`` responses go stale at once. The watcher checks the
+contest catalogue every ``RATING_WATCH_INTERVAL_SECONDS`` for contests that
+finished within ``RATING_WATCH_LOOKBACK_SECONDS`` and fetches
+``contest.ratingChanges`` once per contest. For every handle listed it folds
+the change into the in-process ``HandleData`` and deletes that handle's
+rating-derived responses from the shared cache, in batches.
+
+Ratings are applied some time after a contest ends and unrated contests never
+get any, so an empty answer is retried every ``RATING_WATCH_RECHECK_SECONDS``
+until the contest leaves the lookback window. With Redis, a claim key per
+contest makes one instance do each check; other instances' ``HandleData`` and
+L1 entries age out within their own short TTLs.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+import aiohttp
+
+from core.cache import get_redis, invalidate_handles
+from core.config import rating_watch_settings as settings
+from core.upstream import fetch_json
+from services import handle_data
+from services.contest_catalogue import catalogues
+
+PLATFORM = "codeforces"
+CLAIM_KEY = "rating-watch:codeforces:{contest_id}"
+# routes whose responses include rating or contest history
+RATING_ROUTES = {"", "rating", "contests", "basic"}
+
+
+class RatingWatcher:
+    def __init__(self) -> None:
+        self._done: Set[int] = set()
+        self._next_check: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.contests = 0
+        self.invalidated = 0
+
+    async def _claim(self, contest_id: int, seconds: float) -> bool:
+        """Whether this instance should check ``contest_id`` now."""
+        now = time.time()
+        if contest_id in self._done or self._next_check.get(contest_id, 0) > now:
+            return False
+        self._next_check[contest_id] = now + settings.recheck_seconds
+        client = get_redis()
+        if client is None:
+            return True
+        try:
+            return bool(await client.set(CLAIM_KEY.format(contest_id=contest_id), "checking", nx=True, ex=int(seconds)))
+        except Exception:
+            return True
+
+    async def _mark_done(self, contest_id: int) -> None:
+        self._done.add(contest_id)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            await client.set(CLAIM_KEY.format(contest_id=contest_id), "done", ex=int(settings.lookback_seconds * 2))
+        except Exception:
+            return
+
+    async def apply(self, changes: List[dict]) -> int:
+        """Fold ``contest.ratingChanges`` rows into cached data; returns responses removed."""
+        handles = []
+        for change in changes:
+            handle = (change.get("handle") or "").lower()
+            if not handle:
+                continue
+            handles.append(handle)
+            data = handle_data.cache.peek(handle)
+            if data is not None:
+                data.apply_rating_change(change)
+        removed = 0
+        for start in range(0, len(handles), settings.batch_size):
+            removed += await invalidate_handles(PLATFORM, handles[start:start + settings.batch_size], RATING_ROUTES)
+        return removed
+
+    async def check(self, contest: dict) -> bool:
+        """Apply ``contest``'s rating changes if published; ``True`` once handled."""
+        contest_id = contest["id"]
+        if not await self._claim(contest_id, settings.recheck_seconds):
+            return False
+        try:
+            data = await fetch_json("contest.ratingChanges", {"contestId": contest_id})
+        except aiohttp.ClientError:
+            return False
+        changes = data.get("result") if data.get("status") == "OK" else None
+        if not changes:
+            return False
+        self.invalidated += await self.apply(changes)
+        self.contests += 1
+        await self._mark_done(contest_id)
+        return True
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        catalogue = catalogues[False]
+        if not await catalogue.ensure_loaded():
+            return 0
+        now = time.time() if now is None else now
+        finished = catalogue.finished_since(now - settings.lookback_seconds, now)
+        # forget contests that left the lookback window
+        current = {contest["id"] for contest in finished}
+        self._done &= current
+        self._next_check = {cid: due for cid, due in self._next_check.items() if cid in current}
+        handled = 0
+        for contest in finished:
+            if await self.check(contest):
+                handled += 1
+        return handled
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.interval_seconds)
+            try:
+                await self.run_once()
+            except Exception:
+                continue
+
+    def start(self) -> None:
+        if not settings.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run_forever())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"contests": self.contests, "invalidated": self.invalidated}
+
+
+watcher = RatingWatcher()
@@ -0,0 +1,73 @@
+"""Canonical form of cacheable requests.
+
+Codeforces handles are case-insensitive and the heatmap accepts several
+spellings of the same view, so ``/Tourist/heatmap?view=last365`` and
+``/tourist/heatmap?view=last_365`` are the same response. ``canonical_request``
+maps a path and query to one spelling before the middleware hashes it:
+
+* the handle segment becomes the handle as ``user.info`` reports it, looked up
+  in ``handle_data.handles``. With ``resolve=True`` a handle no worker has
+  seen is looked up through the per-handle data cache, but only for
+  ``USER_INFO_ROUTES``, whose handlers load that ``user.info`` anyway; other
+  routes (``/stats``, ``/topics``) keep an unseen spelling instead of paying
+  an upstream call for it;
+* heatmap ``view``/``year`` go through ``heatmap_window.normalize_view``.
+"""
+
+from typing import Iterable, List, Set, Tuple
+
+from fastapi import HTTPException
+
+from services.handle_data import handles
+from services.heatmap_window import normalize_view
+
+# first path segments that name a route rather than a handle; the app adds
+# every literal first segment it serves at startup (see ``route_segments``)
+ROUTE_SEGMENTS = {"contests", "metrics", "multi", "playground", "users"}
+# what follows the handle for routes that load user.info ("" is the summary)
+USER_INFO_ROUTES = {"", "contests", "heatmap", "profile", "rating"}
+
+
+def route_segments(routes: Iterable) -> Set[str]:
+    """First path segments of ``routes`` that are literals rather than parameters."""
+    segments = set()
+    for route in routes:
+        segment = getattr(route, "path", "").strip("/").split("/", 1)[0]
+        if segment and not segment.startswith("{"):
+            segments.add(segment)
+    return segments
+
+
+def _canonical_query(rest: str, query: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    if rest != "heatmap":
+        return query
+    params = dict(query)
+    try:
+        year = int(params["year"]) if params.get("year") else None
+        view, year = normalize_view(params.get("view", "all"), year)
+    except (HTTPException, ValueError):
+        return query
+    others = [(name, value) for name, value in query if name not in {"view", "year"}]
+    canonical = [("view", view)] + ([("year", str(year))] if year is not None else [])
+    return sorted(others + canonical)
+
+
+async def canonical_request(
+    path: str, query: List[Tuple[str, str]], resolve: bool = False
+) -> Tuple[str, List[Tuple[str, str]], bool]:
+    """Return ``(path, query, resolved)`` with the handle and parameter aliases in canonical form.
+
+    ``resolved`` is false when the handle's spelling is not known yet and
+    resolving it could change the key; without ``resolve`` that never costs
+    an upstream call.
+    """
+    segment, _, rest = path.strip("/").partition("/")
+    if segment in ROUTE_SEGMENTS:
+        return path, query, True
+    resolvable = rest in USER_INFO_ROUTES
+    canonical = None
+    if segment:
+        canonical = await (handles.resolve(segment) if resolve and resolvable else handles.lookup(segment))
+    if canonical is not None and canonical != segment:
+        path = "/" + canonical + ("/" + rest if rest else "")
+    return path, _canonical_query(rest, query), canonical is not None or not resolvable
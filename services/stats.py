@@ -1,26 +1,10 @@
-from collections import defaultdict
-
-import aiohttp
+from services import handle_data
 
 
 async def get_solved_problem_count(handle: str) -> int | None:
     """Calculates the number of solved problems for a Codeforces user."""
-    url = f"https://codeforces.com/api/user.status?handle={handle}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-                if data["status"] == "OK":
-                    solved_problems = {
-                        (s["problem"]["contestId"], s["problem"]["index"])
-                        for s in data["result"]
-                        if s["verdict"] == "OK"
-                    }
-                    return len(solved_problems)
-                return None
-
-        except aiohttp.ClientError:
-            return None
+    snapshot = (await handle_data.load(handle, "snapshot")).snapshot
+    return snapshot.solved_count if snapshot is not None else None
 
 
 async def get_solved_tags(handle: str) -> list[dict]:
@@ -28,33 +12,5 @@ async def get_solved_tags(handle: str) -> list[dict]:
 
     Returns a list of ``{"topic": str, "count": int}`` dicts sorted by count.
     """
-    url = f"https://codeforces.com/api/user.status?handle={handle}"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                data = await response.json()
-        except aiohttp.ClientError:
-            return []
-
-    if data.get("status") != "OK":
-        return []
-
-    seen: set[tuple] = set()
-    tag_counts: defaultdict = defaultdict(int)
-    for submission in data["result"]:
-        if submission.get("verdict") != "OK":
-            continue
-        problem = submission.get("problem", {})
-        key = (problem.get("contestId"), problem.get("index"))
-        if key in seen:
-            continue
-        seen.add(key)
-        for tag in problem.get("tags", []):
-            tag_counts[tag] += 1
-
-    return [
-        {"topic": topic, "count": count}
-        for topic, count in sorted(
-            tag_counts.items(), key=lambda kv: kv[1], reverse=True
-        )
-    ]
+    snapshot = (await handle_data.load(handle, "snapshot")).snapshot
+    return snapshot.topics() if snapshot is not None else []
@@ -0,0 +1,138 @@
+"""Pluggable persistence for per-handle ``SubmissionSnapshot`` tables.
+
+``SUBMISSION_STORE`` selects the backend: ``memory`` (per-process LRU),
+``sqlite`` (file at ``SUBMISSION_STORE_SQLITE_PATH``) or ``redis`` (shared by
+every worker). When unset, Redis is used if ``REDIS_URL`` is configured and
+memory otherwise. Handles are stored case-insensitively. Entries written in an
+older layout load as missing and are rebuilt by a full fetch.
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Optional
+
+from core.cache import get_redis
+from core.config import submission_store_settings as settings
+from services import submissions
+
+
+class SubmissionStore(ABC):
+    # whether other processes see what this one saves
+    shared = False
+
+    @abstractmethod
+    async def load(self, handle: str) -> Optional["submissions.SubmissionSnapshot"]:
+        """The stored snapshot for ``handle``, or ``None``."""
+
+    @abstractmethod
+    async def save(self, handle: str, snapshot: "submissions.SubmissionSnapshot") -> None:
+        """Store ``snapshot`` for ``handle``, replacing any previous one."""
+
+
+class MemorySubmissionStore(SubmissionStore):
+    def __init__(self, max_handles: int = settings.max_handles) -> None:
+        self.max_handles = max_handles
+        self._snapshots: OrderedDict = OrderedDict()
+
+    async def load(self, handle):
+        key = handle.lower()
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            self._snapshots.move_to_end(key)
+        return snapshot
+
+    async def save(self, handle, snapshot):
+        key = handle.lower()
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_handles:
+            self._snapshots.popitem(last=False)
+
+
+class SqliteSubmissionStore(SubmissionStore):
+    shared = True
+
+    def __init__(self, path: str = settings.sqlite_path) -> None:
+        self.path = path
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS submission_snapshots "
+                "(handle TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at INTEGER NOT NULL)"
+            )
+
+    def _load(self, key: str) -> Optional[str]:
+        with closing(sqlite3.connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT data FROM submission_snapshots WHERE handle = ? AND updated_at > ?",
+                (key, int(time.time()) - settings.ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _save(self, key: str, data: str) -> None:
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO submission_snapshots (handle, data, updated_at) VALUES (?, ?, ?)",
+                (key, data, int(time.time())),
+            )
+
+    async def load(self, handle):
+        data = await asyncio.to_thread(self._load, handle.lower())
+        return submissions.SubmissionSnapshot.from_dict(json.loads(data)) if data else None
+
+    async def save(self, handle, snapshot):
+        data = json.dumps(snapshot.to_dict(), separators=(",", ":"))
+        await asyncio.to_thread(self._save, handle.lower(), data)
+
+
+class RedisSubmissionStore(SubmissionStore):
+    shared = True
+
+    @staticmethod
+    def _key(handle: str) -> str:
+        return f"submissions:codeforces:{handle.lower()}"
+
+    async def load(self, handle):
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            data = await client.get(self._key(handle))
+        except Exception:
+            return None
+        if not data:
+            return None
+        try:
+            return submissions.SubmissionSnapshot.from_dict(json.loads(data))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    async def save(self, handle, snapshot):
+        client = get_redis()
+        if client is None:
+            return
+        data = json.dumps(snapshot.to_dict(), separators=(",", ":"))
+        try:
+            await client.setex(self._key(handle), settings.ttl_seconds, data)
+        except Exception:
+            return
+
+
+_store: SubmissionStore | None = None
+
+
+def get_store() -> SubmissionStore:
+    global _store
+    if _store is None:
+        backend = settings.backend.lower() or ("redis" if get_redis() is not None else "memory")
+        if backend == "redis":
+            _store = RedisSubmissionStore()
+        elif backend == "sqlite":
+            _store = SqliteSubmissionStore()
+        else:
+            _store = MemorySubmissionStore()
+    return _store
@@ -0,0 +1,136 @@
+"""Columnar, array-backed storage for a handle's ``user.status`` rows.
+
+A submission dict from the API costs hundreds of bytes once its nested
+``problem``/``author`` dicts are materialized. ``SubmissionTable`` keeps only
+what the aggregates need, one typed ``array`` column per field (about 25 bytes
+per row). Problems are interned process-wide in ``ProblemCatalog``, with tags
+stored once per problem as ids into a shared tag table.
+"""
+
+import sys
+from array import array
+from base64 import b64decode, b64encode
+from typing import Dict, List, Optional, Tuple
+
+VERDICTS = (
+    None,
+    "OK",
+    "FAILED",
+    "PARTIAL",
+    "COMPILATION_ERROR",
+    "RUNTIME_ERROR",
+    "WRONG_ANSWER",
+    "PRESENTATION_ERROR",
+    "TIME_LIMIT_EXCEEDED",
+    "MEMORY_LIMIT_EXCEEDED",
+    "IDLENESS_LIMIT_EXCEEDED",
+    "SECURITY_VIOLATED",
+    "CRASHED",
+    "INPUT_PREPARATION_CRASHED",
+    "CHALLENGED",
+    "SKIPPED",
+    "TESTING",
+    "REJECTED",
+)
+VERDICT_CODES = {verdict: code for code, verdict in enumerate(VERDICTS)}
+VERDICT_OTHER = 255
+OK = VERDICT_CODES["OK"]
+
+# array typecodes: int64 ids/timestamps, uint8 verdicts, int32 problem/contest ids
+_COLUMNS = (("ids", "q"), ("created", "q"), ("verdicts", "B"), ("problems", "i"), ("contests", "i"))
+
+
+def verdict_code(verdict: Optional[str]) -> int:
+    return VERDICT_CODES.get(verdict, VERDICT_OTHER)
+
+
+class ProblemCatalog:
+    """Process-wide interning of ``(contestId, index)`` keys and tag names."""
+
+    __slots__ = ("_ids", "keys", "tags", "_tag_ids", "tag_names")
+
+    def __init__(self) -> None:
+        self._ids: Dict[Tuple, int] = {}
+        self.keys: List[Tuple] = []
+        self.tags: List[Tuple[int, ...]] = []
+        self._tag_ids: Dict[str, int] = {}
+        self.tag_names: List[str] = []
+
+    def tag_id(self, name: str) -> int:
+        tag = self._tag_ids.get(name)
+        if tag is None:
+            tag = self._tag_ids[name] = len(self.tag_names)
+            self.tag_names.append(name)
+        return tag
+
+    def intern(self, contest_id: Optional[int], index: Optional[str], tags: List[str]) -> int:
+        key = (contest_id, index)
+        problem = self._ids.get(key)
+        if problem is None:
+            problem = self._ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.tags.append(tuple(self.tag_id(tag) for tag in tags))
+        return problem
+
+
+catalog = ProblemCatalog()
+
+
+def _pack(column: array) -> str:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return b64encode(column.tobytes()).decode("ascii")
+
+
+def _unpack(typecode: str, data: str) -> array:
+    column = array(typecode)
+    column.frombytes(b64decode(data.encode("ascii")))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class SubmissionTable:
+    __slots__ = tuple(name for name, _ in _COLUMNS)
+
+    def __init__(self) -> None:
+        for name, typecode in _COLUMNS:
+            setattr(self, name, array(typecode))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, submission: dict) -> int:
+        """Store one API submission dict and return its row number."""
+        problem = submission.get("problem") or {}
+        self.ids.append(submission.get("id") or 0)
+        self.created.append(submission.get("creationTimeSeconds") or 0)
+        self.verdicts.append(verdict_code(submission.get("verdict")))
+        self.problems.append(catalog.intern(problem.get("contestId"), problem.get("index"), problem.get("tags", [])))
+        self.contests.append(submission.get("contestId") or 0)
+        return len(self.ids) - 1
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).itemsize * len(getattr(self, name)) for name, _ in _COLUMNS)
+
+    def to_dict(self) -> dict:
+        # problem ids are process-local, so ship the keys and remap on load
+        used = sorted(set(self.problems))
+        local = {problem: position for position, problem in enumerate(used)}
+        columns = {name: _pack(getattr(self, name)) for name, _ in _COLUMNS if name != "problems"}
+        columns["problems"] = _pack(array("i", (local[problem] for problem in self.problems)))
+        columns["catalog"] = [
+            [*catalog.keys[problem], [catalog.tag_names[tag] for tag in catalog.tags[problem]]]
+            for problem in used
+        ]
+        return columns
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SubmissionTable":
+        table = cls()
+        for name, typecode in _COLUMNS:
+            setattr(table, name, _unpack(typecode, data[name]))
+        interned = [catalog.intern(contest_id, index, tags) for contest_id, index, tags in data["catalog"]]
+        table.problems = array("i", (interned[problem] for problem in table.problems))
+        return table
@@ -0,0 +1,282 @@
+"""Single-pass aggregation of a handle's ``user.status`` submissions.
+
+Solved count, topic analysis, contest participation and the activity heatmap
+all derive from the same submission list. ``SubmissionSnapshot`` keeps that list
+in a compact columnar ``SubmissionTable`` and derives every aggregate from one
+pass over it, so each request downloads ``user.status`` once per handle no
+matter how many sections it renders.
+
+Snapshots are kept in a ``SubmissionStore`` together with the newest submission
+id already aggregated. A refresh pages ``user.status`` newest-first with small
+``from``/``count`` windows until it reaches known data and merges only the new
+rows, so refreshing an active handle costs a few KB instead of the full
+history. Rows below that id can still change (rejudges, SKIPPED after a
+contest), so a snapshot older than ``SUBMISSION_STORE_FULL_REFRESH_SECONDS``
+is downloaded in full again instead.
+"""
+
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set
+
+import aiohttp
+
+from core import fill_lock
+from core.config import submission_store_settings as store_settings
+from core.singleflight import SingleFlight
+from core.upstream import fetch_json, stream_result
+from services import submission_store
+from services.submission_table import OK, SubmissionTable, catalog, verdict_code
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+# verdicts that can still change; such rows are re-checked on later refreshes
+PENDING_VERDICTS = {None, "TESTING"}
+
+_refreshes = SingleFlight()
+
+
+def day_index(d: date) -> int:
+    """Days since the Unix epoch for a UTC calendar date."""
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+class SubmissionSnapshot:
+    """One handle's submissions in a ``SubmissionTable`` plus derived aggregates.
+
+    The solved set, tag counts, contest ids and ``daily`` buckets (UTC day
+    index, see ``day_index``, to ``[submissions, accepted]``) come from a single
+    pass over the table and are cached until new rows are merged. ``last_id`` is
+    the newest submission id seen; ``pending`` maps ids still being judged to
+    their row so a later merge can settle their verdict in place.
+    ``fetched_at`` is when the full history was last downloaded.
+    """
+
+    __slots__ = ("table", "last_id", "pending", "fetched_at", "_aggregates")
+
+    def __init__(
+        self,
+        table: Optional[SubmissionTable] = None,
+        last_id: int = 0,
+        pending: Optional[Dict[int, int]] = None,
+        fetched_at: Optional[float] = None,
+    ) -> None:
+        self.table = table if table is not None else SubmissionTable()
+        self.last_id = last_id
+        self.pending = pending if pending is not None else {}
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self._aggregates = None
+
+    @classmethod
+    def from_submissions(cls, submissions: Iterable[dict]) -> "SubmissionSnapshot":
+        snapshot = cls()
+        snapshot.merge(submissions)
+        return snapshot
+
+    @property
+    def floor_id(self) -> int:
+        """Rows with an id above this may still need to be merged."""
+        return min(self.pending) - 1 if self.pending else self.last_id
+
+    def merge(self, submissions: Iterable[dict]) -> None:
+        """Add rows not seen before and settle verdicts of pending rows."""
+        known_id = self.last_id
+        for submission in submissions:
+            self.ingest(submission, known_id)
+
+    def ingest(self, submission: dict, known_id: int) -> None:
+        """Merge one row unless it is at or below ``known_id`` and already final."""
+        submission_id = submission.get("id")
+        still_pending = submission.get("verdict") in PENDING_VERDICTS
+        if submission_id is not None and submission_id <= known_id:
+            row = self.pending.get(submission_id)
+            if row is None:
+                return
+            self.table.verdicts[row] = verdict_code(submission.get("verdict"))
+            if not still_pending:
+                del self.pending[submission_id]
+            self._aggregates = None
+            return
+
+        row = self.table.append(submission)
+        self._aggregates = None
+        if submission_id is None:
+            return
+        if still_pending:
+            self.pending[submission_id] = row
+        if submission_id > self.last_id:
+            self.last_id = submission_id
+
+    def _aggregate(self) -> tuple:
+        if self._aggregates is not None:
+            return self._aggregates
+
+        table = self.table
+        problem_tags = catalog.tags
+        solved: Set[int] = set()
+        tag_counts: Dict[int, int] = defaultdict(int)
+        contest_ids: Set[int] = set()
+        daily: Dict[int, List[int]] = {}
+        for created_at, verdict, problem, contest_id in zip(
+            table.created, table.verdicts, table.problems, table.contests
+        ):
+            if contest_id:
+                contest_ids.add(contest_id)
+            day = created_at // SECONDS_PER_DAY
+            bucket = daily.get(day)
+            if bucket is None:
+                bucket = daily[day] = [0, 0]
+            bucket[0] += 1
+            if verdict != OK:
+                continue
+            bucket[1] += 1
+            if problem in solved:
+                continue
+            solved.add(problem)
+            for tag in problem_tags[problem]:
+                tag_counts[tag] += 1
+
+        tags = {catalog.tag_names[tag]: count for tag, count in tag_counts.items()}
+        self._aggregates = (solved, tags, contest_ids, daily)
+        return self._aggregates
+
+    @property
+    def solved(self) -> Set[int]:
+        """Interned ids (see ``ProblemCatalog``) of distinct solved problems."""
+        return self._aggregate()[0]
+
+    @property
+    def tag_counts(self) -> Dict[str, int]:
+        return self._aggregate()[1]
+
+    @property
+    def contest_ids(self) -> Set[int]:
+        return self._aggregate()[2]
+
+    @property
+    def daily(self) -> Dict[int, List[int]]:
+        return self._aggregate()[3]
+
+    @property
+    def solved_count(self) -> int:
+        return len(self.solved)
+
+    def topics(self) -> List[dict]:
+        """Tag counts as ``{"topic": str, "count": int}`` dicts sorted by count."""
+        return [
+            {"topic": topic, "count": count}
+            for topic, count in sorted(self.tag_counts.items(), key=lambda kv: kv[1], reverse=True)
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "table": self.table.to_dict(),
+            "last_id": self.last_id,
+            "pending": [[submission_id, row] for submission_id, row in self.pending.items()],
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Optional["SubmissionSnapshot"]:
+        """Rebuild a stored snapshot; ``None`` for entries in an older layout."""
+        if "table" not in data:
+            return None
+        return cls(
+            table=SubmissionTable.from_dict(data["table"]),
+            last_id=data.get("last_id", 0),
+            pending={submission_id: row for submission_id, row in data.get("pending", [])},
+            # entries from before fetched_at was stored are due for a full fetch
+            fetched_at=data.get("fetched_at", 0.0),
+        )
+
+
+async def _fetch_full(handle: str) -> Optional[SubmissionSnapshot]:
+    # stream the full history straight into the aggregates; no row list is kept
+    snapshot = SubmissionSnapshot()
+    envelope = await stream_result(
+        "user.status",
+        {"handle": handle},
+        lambda submission: snapshot.ingest(submission, 0),
+    )
+    if envelope.get("status") != "OK":
+        return None
+    return snapshot
+
+
+async def _fetch_since(handle: str, floor_id: int) -> Optional[List[dict]]:
+    """Page ``user.status`` newest-first until a row at or below ``floor_id``."""
+    rows: List[dict] = []
+    start, count = 1, store_settings.first_page_size
+    while True:
+        data = await fetch_json("user.status", {"handle": handle, "from": start, "count": count})
+        if data.get("status") != "OK":
+            return None
+        page = data["result"]
+        for row in page:
+            if row.get("id", 0) <= floor_id:
+                return rows
+            rows.append(row)
+        if len(page) < count:
+            return rows
+        start += count
+        count = min(count * 4, store_settings.max_page_size)
+
+
+async def _load_full(handle: str, store: "submission_store.SubmissionStore") -> Optional[SubmissionSnapshot]:
+    snapshot = await _fetch_full(handle)
+    if snapshot is not None:
+        await store.save(handle, snapshot)
+    return snapshot
+
+
+def _needs_full(snapshot: Optional[SubmissionSnapshot]) -> bool:
+    return snapshot is None or time.time() - snapshot.fetched_at >= store_settings.full_refresh_seconds
+
+
+async def _refresh(handle: str) -> Optional[SubmissionSnapshot]:
+    store = submission_store.get_store()
+    snapshot = await store.load(handle)
+    if _needs_full(snapshot):
+        try:
+            if not store.shared:
+                full = await _load_full(handle, store)
+            else:
+                # the full history is the expensive download: one instance fetches
+                # it and the others load the stored snapshot
+                async def stored() -> Optional[SubmissionSnapshot]:
+                    loaded = await store.load(handle)
+                    return None if _needs_full(loaded) else loaded
+
+                full = await fill_lock.fill(
+                    f"submissions:codeforces:{handle.lower()}",
+                    lambda: _load_full(handle, store),
+                    stored,
+                )
+        except aiohttp.ClientError:
+            # nothing to fall back to: let the caller tell an outage from an unknown handle
+            if snapshot is None:
+                raise
+            full = None
+        if full is not None or snapshot is None:
+            return full
+        # the refetch failed; fall through to an incremental refresh of what we have
+    try:
+        rows = await _fetch_since(handle, snapshot.floor_id)
+    except aiohttp.ClientError:
+        # keep serving the last aggregated history when Codeforces is down
+        return snapshot
+    if rows is None:
+        return None
+    snapshot.merge(rows)
+    await store.save(handle, snapshot)
+    return snapshot
+
+
+async def get_submission_snapshot(handle: str) -> Optional[SubmissionSnapshot]:
+    """Returns the handle's aggregates, fetching only submissions not yet stored.
+
+    Raises ``aiohttp.ClientError`` when nothing is stored and Codeforces cannot
+    be reached; ``None`` means Codeforces did not return the handle's submissions.
+    """
+    return await _refreshes.do(handle.lower(), lambda: _refresh(handle))
@@ -0,0 +1,135 @@
+"""Micro-batching of single-handle ``user.info`` lookups.
+
+``user.info`` accepts many semicolon-separated handles, but every route asks
+for one. ``UserInfoBatcher.get`` parks each lookup for a few milliseconds, then
+sends all handles collected in that window as one upstream call and hands each
+caller its own entry. A handle Codeforces reports as unknown fails only its own
+callers: it is dropped and the rest of the batch is retried.
+
+Codeforces names one unknown handle per failed call, so a batch full of bot
+probes would otherwise take one sequential call (and one upstream budget
+token) per probe before any real handle is answered. After
+``MISSING_RETRIES`` retries the rest of the batch is bisected instead, and each
+half is treated the same way: halves are looked up concurrently, halves
+without unknown handles finish in one call, and an error (such as an exhausted
+upstream budget) fails only the callers of the half that hit it. Probe-heavy
+batches spend somewhat more calls in total but answer real handles in a
+logarithmic number of rounds instead of one round per probe.
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from core.config import upstream_settings as settings
+from core.upstream import MISSING_HANDLE, fetch_json
+
+# Codeforces documents up to 10000 handles per call; URL length caps us far lower
+MAX_HANDLES = 10000
+# plain retries after an unknown handle before the rest is bisected
+MISSING_RETRIES = 1
+
+
+def _settle(futures: List[asyncio.Future], result=None, error: Optional[BaseException] = None) -> None:
+    for future in futures:
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class UserInfoBatcher:
+    def __init__(self, window_seconds: float, max_handles: int) -> None:
+        self.window_seconds = window_seconds
+        self.max_handles = max(1, min(max_handles, MAX_HANDLES))
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._spellings: Dict[str, str] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.lookups = 0
+        self.batches = 0
+
+    async def get(self, handle: str) -> Optional[dict]:
+        """Return the ``user.info`` entry for ``handle``, or ``None`` if unknown."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = handle.lower()
+        self.lookups += 1
+        if key in self._waiters:
+            self._waiters[key].append(future)
+        else:
+            self._waiters[key] = [future]
+            self._spellings[key] = handle
+
+        if len(self._waiters) >= self.max_handles:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+        waiters, spellings = self._waiters, self._spellings
+        self._waiters, self._spellings = {}, {}
+        self.batches += 1
+        task = asyncio.ensure_future(self._dispatch(waiters, spellings))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, waiters: Dict[str, List[asyncio.Future]], spellings: Dict[str, str]) -> None:
+        await self._lookup(list(waiters), waiters, spellings, MISSING_RETRIES)
+
+    async def _lookup(
+        self,
+        keys: List[str],
+        waiters: Dict[str, List[asyncio.Future]],
+        spellings: Dict[str, str],
+        retries: int,
+    ) -> None:
+        """Settle the callers of ``keys``; bisects once ``retries`` retries after unknown handles are used up."""
+        try:
+            while keys:
+                data = await fetch_json("user.info", {"handles": ";".join(spellings[key] for key in keys)})
+                if data.get("status") == "OK":
+                    results = data["result"]
+                    if len(results) != len(keys):
+                        by_handle = {info.get("handle", "").lower(): info for info in results}
+                        results = [by_handle.get(key) for key in keys]
+                    for key, info in zip(keys, results):
+                        _settle(waiters[key], info)
+                    return
+
+                match = MISSING_HANDLE.search(data.get("comment") or "")
+                missing = match.group(1).lower() if match else None
+                if missing not in keys:
+                    break
+                _settle(waiters[missing], None)
+                keys = [key for key in keys if key != missing]
+                if retries <= 0 and len(keys) > 1:
+                    half = len(keys) // 2
+                    await asyncio.gather(
+                        self._lookup(keys[:half], waiters, spellings, MISSING_RETRIES),
+                        self._lookup(keys[half:], waiters, spellings, MISSING_RETRIES),
+                    )
+                    return
+                retries -= 1
+        except Exception as exc:
+            for key in keys:
+                _settle(waiters[key], error=exc)
+            return
+        for key in keys:
+            _settle(waiters[key], None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"lookups": self.lookups, "batches": self.batches}
+
+
+batcher = UserInfoBatcher(
+    settings.user_info_batch_window_ms / 1000,
+    settings.user_info_batch_max_handles,
+)
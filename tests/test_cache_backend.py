@@ -0,0 +1,138 @@
+"""One behavioural suite for every cache backend.
+
+``MemoryBackend`` always runs. ``RedisBackend`` runs against ``TEST_REDIS_URL``
+when it is set and reachable, and is skipped otherwise.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+import uuid
+
+from redis import asyncio as redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.cache_backend import CacheBackend, MemoryBackend, RedisBackend  # noqa: E402
+
+BASE, MAX = 5, 300
+
+
+class BackendContract:
+    """Mixed into a test case whose ``asyncSetUp`` sets ``self.backend`` and ``self.prefix``."""
+
+    def key(self, name):
+        return f"{self.prefix}{name}"
+
+    async def limits(self, ip="1.2.3.4", ip_limit=10, handle_limit=2):
+        return await self.backend.check_rate_limits(
+            [(self.key(f"ip:{ip}"), ip_limit, 60), (self.key("handle:tourist"), handle_limit, 60)], BASE, MAX
+        )
+
+    async def test_values_round_trip_with_their_ttl(self):
+        await self.backend.set(self.key("a"), b"\x00binary", 60)
+        value, ttl = await self.backend.get(self.key("a"))
+        self.assertEqual(value, b"\x00binary")
+        self.assertTrue(0 < ttl <= 60)
+        self.assertEqual(await self.backend.get(self.key("missing")), (None, 0))
+
+    async def test_values_expire(self):
+        await self.backend.set(self.key("a"), b"v", 0.05)
+        await asyncio.sleep(0.15)
+        self.assertEqual(await self.backend.get(self.key("a")), (None, 0))
+
+    async def test_invalidate_removes_indexed_routes_only(self):
+        index = self.key("index:tourist")
+        await self.backend.set(self.key("rating"), b"r", 60, (index, "rating"))
+        await self.backend.set(self.key("svg"), b"s", 60, (index, "stats/svg"))
+
+        removed = await self.backend.invalidate([index, self.key("index:nobody")], {"rating"})
+
+        self.assertEqual(removed, [self.key("rating")])
+        self.assertEqual((await self.backend.get(self.key("rating")))[0], None)
+        self.assertEqual((await self.backend.get(self.key("svg")))[0], b"s")
+        self.assertEqual(await self.backend.invalidate([index]), [self.key("svg")])
+
+    async def test_set_members_expire_one_by_one(self):
+        await self.backend.add_member(self.key("set"), "short", 0.05)
+        await self.backend.add_member(self.key("set"), "long", 60)
+        self.assertEqual(sorted(await self.backend.members(self.key("set"))), ["long", "short"])
+        await asyncio.sleep(0.15)
+        self.assertEqual(await self.backend.members(self.key("set")), ["long"])
+        self.assertEqual(await self.backend.members(self.key("empty")), [])
+
+    async def test_limit_allows_then_backs_off_without_counting(self):
+        self.assertEqual((await self.limits())[:4], (2, True, 0, 1))
+        self.assertEqual((await self.limits())[:4], (2, True, 0, 0))
+        self.assertEqual(await self.limits(), (2, False, BASE, 0, 0))
+
+        index, allowed, retry_after, _, _ = await self.limits()
+        self.assertEqual((index, allowed), (2, False))
+        self.assertTrue(0 < retry_after <= BASE)
+
+    async def test_denied_ip_does_not_count_the_handle(self):
+        self.assertTrue((await self.limits(ip_limit=1))[1])
+        self.assertEqual((await self.limits(ip_limit=1))[:3], (1, False, BASE))
+        # had the denied request counted, the handle would now be over its limit
+        self.assertEqual((await self.limits(ip="5.6.7.8"))[:4], (2, True, 0, 0))
+
+
+class ContractTests(unittest.TestCase):
+    def test_a_backend_missing_a_method_cannot_be_created(self):
+        class Partial(CacheBackend):
+            async def get(self, key):
+                return None, 0
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class MemoryBackendTests(BackendContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend = MemoryBackend(max_bytes=1 << 20, max_counters=1000)
+        self.prefix = ""
+
+    async def test_least_recently_used_values_go_first(self):
+        backend = MemoryBackend(max_bytes=30, max_counters=10)
+        await backend.set("a", b"x" * 10, 60)
+        await backend.set("b", b"x" * 10, 60)
+        await backend.get("a")
+        await backend.set("c", b"x" * 10, 60)
+
+        self.assertEqual(await backend.get("b"), (None, 0))
+        self.assertEqual((await backend.get("a"))[0], b"x" * 10)
+        self.assertEqual(backend.stats()["evictions"], 1)
+        self.assertLessEqual(backend.stats()["bytes"], 30)
+
+    async def test_previous_window_still_counts_after_the_boundary(self):
+        now = [59.0]
+        backend = MemoryBackend(clock=lambda: now[0])
+        for _ in range(10):
+            self.assertTrue((await backend.check_rate_limits([("ip", 10, 60)], BASE, MAX))[1])
+        # a fixed window would reset here and allow another 10
+        now[0] = 61.0
+        self.assertFalse((await backend.check_rate_limits([("ip", 10, 60)], BASE, MAX))[1])
+
+        now[0] = 300.0
+        self.assertTrue((await backend.check_rate_limits([("ip", 10, 60)], BASE, MAX))[1])
+
+
+class RedisBackendTests(BackendContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        url = os.getenv("TEST_REDIS_URL")
+        if not url:
+            self.skipTest("TEST_REDIS_URL is not set")
+        client = redis.from_url(url, decode_responses=False)
+        try:
+            await client.ping()
+        except Exception:
+            await client.aclose()
+            self.skipTest(f"Redis at {url} is not reachable")
+        self.addAsyncCleanup(client.aclose)
+        self.backend = RedisBackend(lambda: client)
+        self.prefix = f"test:{uuid.uuid4().hex}:"
+
+
+if __name__ == "__main__":
+    unittest.main()
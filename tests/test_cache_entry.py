@@ -0,0 +1,157 @@
+"""Binary cache entry layout, compressed variants and migration from JSON/base64."""
+
+import gzip
+import json
+import os
+import sys
+import unittest
+from base64 import b64encode
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import cache  # noqa: E402
+from core.cache_backend import RedisBackend  # noqa: E402
+from core import cache_entry  # noqa: E402
+from core.cache_entry import CacheEntry  # noqa: E402
+from core.l1_cache import L1Cache  # noqa: E402
+from tests.test_l1_cache import FakeRedis  # noqa: E402
+
+
+class CacheEntryTests(unittest.TestCase):
+    def test_round_trip(self):
+        body = b"<svg>\x00\xff</svg>"
+        entry = CacheEntry(200, "image/svg+xml", "public, max-age=86400", {"identity": body}, 1700000000.5, 86400)
+        packed = entry.pack()
+        restored = CacheEntry.unpack(packed)
+
+        self.assertEqual(
+            len(packed),
+            23 + len("image/svg+xml") + len("public, max-age=86400") + 34 + 5 + len("identity") + len(body),
+        )
+        self.assertEqual(restored.status_code, 200)
+        self.assertEqual(restored.media_type, "image/svg+xml")
+        self.assertEqual(restored.cache_control, "public, max-age=86400")
+        self.assertEqual(restored.body, body)
+        self.assertEqual(restored.stored_at, 1700000000.5)
+        self.assertEqual(restored.fresh_for, 86400)
+        self.assertEqual(restored.etag, cache_entry.make_etag(body))
+
+    def test_unknown_stored_at_round_trips_as_none(self):
+        restored = CacheEntry.unpack(CacheEntry.build(200, "application/json", "", b"{}").pack())
+        self.assertIsNone(restored.stored_at)
+
+    def test_legacy_json_entry_is_decoded(self):
+        legacy = json.dumps({
+            "status_code": 200,
+            "headers": {"content-type": "application/json", "cache-control": "public, max-age=3600"},
+            "media_type": "application/json",
+            "body": b64encode(b'{"ok":true}').decode("ascii"),
+        }).encode()
+        entry = CacheEntry.unpack(legacy)
+
+        self.assertEqual(entry.body, b'{"ok":true}')
+        self.assertEqual(entry.cache_control, "public, max-age=3600")
+        self.assertIsNone(entry.stored_at)
+
+    def test_version_1_entry_is_decoded(self):
+        header = cache_entry._HEADER_V1.pack(b"CE", 1, 200, 5.0, 60, 16, 0)
+        entry = CacheEntry.unpack(header + b"application/json" + b"[1]")
+
+        self.assertEqual(entry.body, b"[1]")
+        self.assertEqual(entry.media_type, "application/json")
+        self.assertEqual(entry.fresh_for, 60)
+
+    def test_version_2_entry_gets_an_etag_from_its_body(self):
+        header = cache_entry._HEADER_V2.pack(b"CE", 2, 200, 5.0, 60, 16, 0, 1)
+        variant = cache_entry._VARIANT.pack(len("identity"), 3) + b"identity" + b"[1]"
+        entry = CacheEntry.unpack(header + b"application/json" + variant)
+
+        self.assertEqual(entry.body, b"[1]")
+        self.assertEqual(entry.etag, cache_entry.make_etag(b"[1]"))
+
+    def test_etag_matching_is_weak_and_covers_every_variant(self):
+        entry = CacheEntry.build(200, "application/json", "", b"{}")
+        gzip_tag = entry.etag_for("gzip")
+
+        self.assertNotEqual(gzip_tag, entry.etag)
+        self.assertTrue(entry.matches(entry.etag))
+        self.assertTrue(entry.matches(f'"other", W/{gzip_tag}'))
+        self.assertTrue(entry.matches("*"))
+        self.assertFalse(entry.matches('"other"'))
+        self.assertFalse(entry.matches(""))
+
+    def test_garbage_is_rejected(self):
+        self.assertIsNone(CacheEntry.unpack(b"not an entry"))
+        self.assertIsNone(CacheEntry.unpack(b"CE"))
+
+
+class CompressionTests(unittest.TestCase):
+    body = json.dumps([{"date": f"2024-01-{day:02d}", "count": day} for day in range(1, 29)] * 20).encode()
+
+    def test_large_json_is_stored_compressed_only(self):
+        entry = CacheEntry.build(200, "application/json", "", self.body)
+
+        self.assertNotIn("identity", entry.variants)
+        self.assertEqual(gzip.decompress(entry.variants["gzip"]), self.body)
+        self.assertEqual(entry.body, self.body)
+        self.assertLess(len(entry.pack()), len(self.body) // 4)
+
+    def test_small_or_binary_bodies_stay_identity(self):
+        self.assertEqual(list(CacheEntry.build(200, "application/json", "", b"{}").variants), ["identity"])
+        self.assertEqual(list(CacheEntry.build(200, "image/png", "", self.body).variants), ["identity"])
+
+    def test_select_follows_accept_encoding(self):
+        entry = CacheEntry.build(200, "application/json", "", self.body)
+
+        self.assertEqual(entry.select("gzip, deflate")[0], "gzip")
+        self.assertEqual(entry.select("*")[0], "br" if cache_entry.brotli else "gzip")
+        self.assertEqual(entry.select("gzip;q=0, identity"), (None, self.body))
+        self.assertEqual(entry.select(""), (None, self.body))
+
+    def test_brotli_is_preferred_when_available(self):
+        with mock.patch.object(cache_entry, "brotli") as brotli:
+            brotli.compress.return_value = b"br-bytes"
+            entry = CacheEntry.build(200, "application/json", "", self.body)
+
+        self.assertEqual(entry.select("gzip, br"), ("br", b"br-bytes"))
+        self.assertEqual(entry.select("gzip;q=1, br;q=0.5")[0], "gzip")
+        self.assertEqual(CacheEntry.unpack(entry.pack()).variants, entry.variants)
+
+
+class BinaryRedis(FakeRedis):
+    async def set(self, key, value, px=None):
+        self.round_trips += 1
+        self.values[key] = value
+
+
+class EntryCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def test_legacy_entry_is_rewritten_in_binary_layout(self):
+        client = BinaryRedis()
+        client.values["k"] = json.dumps({
+            "status_code": 200,
+            "headers": {},
+            "media_type": "application/json",
+            "body": b64encode(b"[]").decode("ascii"),
+        }).encode()
+        with mock.patch.object(cache, "get_backend", return_value=RedisBackend(lambda: client)), \
+                mock.patch.object(cache, "l1", L1Cache(1024, 60)):
+            entry = await cache.get_entry("k")
+
+        self.assertEqual(entry.body, b"[]")
+        self.assertEqual(client.values["k"], entry.pack())
+
+    async def test_set_then_get_skips_redis(self):
+        client = BinaryRedis()
+        entry = CacheEntry.build(200, "application/json", "", b"{}", 1.0, 60)
+        with mock.patch.object(cache, "get_backend", return_value=RedisBackend(lambda: client)), \
+                mock.patch.object(cache, "l1", L1Cache(1024, 60)):
+            await cache.set_entry("k", entry, 60)
+            self.assertIs(await cache.get_entry("k"), entry)
+
+        self.assertEqual(client.round_trips, 1)
+        self.assertIsInstance(client.values["k"], bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Concurrent, bitset-based common-contest intersection."""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import contests  # noqa: E402
+
+
+class BitsetTests(unittest.TestCase):
+    def test_round_trip(self):
+        ids = {1, 7, 8, 9, 1900, 100_123}
+        self.assertEqual(contests._from_bitset(contests._to_bitset(ids)), ids)
+        self.assertEqual(contests._to_bitset(set()), 0)
+
+
+class CommonContestsTests(unittest.IsolatedAsyncioTestCase):
+    async def test_intersects_all_handles(self):
+        data = {"a": {1, 2, 3}, "b": {2, 3, 4}, "c": {3, 2, 9}}
+
+        async def lookup(handle):
+            return data[handle]
+
+        with mock.patch.object(contests, "get_contests_participated_by_user", lookup):
+            self.assertEqual(await contests.get_common_contests(["a", "b", "c", "A"]), {2, 3})
+
+    async def test_empty_intersection_cancels_pending_fetches(self):
+        slow_cancelled = asyncio.Event()
+
+        async def lookup(handle):
+            if handle == "slow":
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    slow_cancelled.set()
+                    raise
+            return {"a": {1}, "b": {2}}[handle]
+
+        with mock.patch.object(contests, "get_contests_participated_by_user", lookup):
+            result = await asyncio.wait_for(contests.get_common_contests(["slow", "a", "b"]), timeout=1)
+
+        self.assertEqual(result, set())
+        await asyncio.wait_for(slow_cancelled.wait(), timeout=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""ETag and If-None-Match handling for cached responses in CacheRateLimitMiddleware."""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware  # noqa: E402
+from core.cache_entry import CacheEntry  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+
+
+class ConditionalRequestTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.calls = 0
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        async def rating(handle: str):
+            self.calls += 1
+            return {"handle": handle, "rating": 3800, "history": list(range(2000))}
+
+        app = FastAPI()
+        app.get("/{handle}/rating")(rating)
+
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        transport = httpx.ASGITransport(app=middleware.CacheRateLimitMiddleware(app, platform="codeforces"))
+        self.client = httpx.AsyncClient(transport=transport, base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def get(self, **headers):
+        headers.setdefault("accept-encoding", "identity")
+        return await self.client.get("/tourist/rating", headers=headers)
+
+    async def test_miss_and_hit_carry_the_same_etag_and_a_match_is_not_modified(self):
+        miss = await self.get()
+        self.assertEqual(miss.headers["x-cache"], "MISS")
+        etag = miss.headers["etag"]
+
+        hit = await self.get()
+        self.assertEqual(hit.headers["x-cache"], "HIT")
+        self.assertEqual(hit.headers["etag"], etag)
+
+        revalidated = await self.get(**{"if-none-match": etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+        self.assertEqual(revalidated.headers["etag"], etag)
+        self.assertIn("cache-control", revalidated.headers)
+        self.assertEqual(self.calls, 1)
+
+    async def test_compressed_entries_vary_on_accept_encoding(self):
+        await self.get()
+        for accept_encoding in ("identity", "gzip"):
+            hit = await self.get(**{"accept-encoding": accept_encoding})
+            self.assertEqual(hit.headers["x-cache"], "HIT")
+            self.assertEqual(hit.headers["vary"], "Accept-Encoding", accept_encoding)
+
+    async def test_a_different_tag_gets_the_full_body(self):
+        await self.get()
+        response = await self.get(**{"if-none-match": '"stale", W/"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rating"], 3800)
+
+    async def test_weak_and_compressed_variant_tags_match(self):
+        await self.get()
+        gzipped = await self.get(**{"accept-encoding": "gzip"})
+        self.assertEqual(gzipped.headers["content-encoding"], "gzip")
+        self.assertTrue(gzipped.headers["etag"].endswith('-gzip"'))
+
+        # a client that switched encodings still holds the same body
+        for tag in (gzipped.headers["etag"], "W/" + gzipped.headers["etag"], "*"):
+            response = await self.get(**{"if-none-match": tag})
+            self.assertEqual(response.status_code, 304, tag)
+            self.assertNotIn("content-encoding", response.headers)
+
+
+
+class AppCorsTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        from app import app
+
+        entry = CacheEntry.build(
+            200, "application/json", "public, max-age=60", b'{"rating": 3800}', stored_at=time.time(), fresh_for=60
+        )
+
+        async def get_entry(key, local=True):
+            return entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def test_cached_answers_carry_cors_headers(self):
+        origin = {"origin": "https://example.com"}
+        hit = await self.client.get("/tourist/rating", headers=origin)
+        self.assertEqual(hit.headers["x-cache"], "HIT")
+        self.assertIn("access-control-allow-origin", hit.headers)
+
+        revalidated = await self.client.get("/tourist/rating", headers={**origin, "if-none-match": hit.headers["etag"]})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn("access-control-allow-origin", revalidated.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Phase/start-time indexed contest catalogue."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.contest_catalogue import ContestCatalogue  # noqa: E402
+
+NOW = 1_700_000_000
+# contest.list returns newest first
+CONTESTS = [
+    {"id": 5, "phase": "BEFORE", "startTimeSeconds": NOW + 7200, "durationSeconds": 7200},
+    {"id": 4, "phase": "BEFORE", "startTimeSeconds": NOW + 3600, "durationSeconds": 7200},
+    {"id": 3, "phase": "BEFORE", "startTimeSeconds": NOW - 600, "durationSeconds": 7200},
+    {"id": 2, "phase": "CODING", "startTimeSeconds": NOW - 3600, "durationSeconds": 7200},
+    {"id": 1, "phase": "FINISHED", "startTimeSeconds": NOW - 86400, "durationSeconds": 7200},
+]
+
+
+class ContestCatalogueTests(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = ContestCatalogue(gym=False)
+        self.catalogue.load(CONTESTS)
+
+    def test_upcoming_keeps_api_order_and_skips_started(self):
+        self.assertEqual([c["id"] for c in self.catalogue.upcoming(NOW)], [5, 4])
+        self.assertEqual([c["id"] for c in self.catalogue.upcoming(NOW + 5000)], [5])
+
+    def test_ongoing_includes_contests_started_since_last_load(self):
+        self.assertEqual([c["id"] for c in self.catalogue.ongoing(NOW)], [3, 2])
+        self.assertEqual([c["id"] for c in self.catalogue.ongoing(NOW + 4000)], [4, 3])
+
+    def test_empty_catalogue(self):
+        catalogue = ContestCatalogue(gym=True)
+        self.assertEqual(catalogue.upcoming(NOW), [])
+        self.assertEqual(catalogue.ongoing(NOW), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""Cross-instance fill leases: one instance fills, the others wait or take over."""
+
+import asyncio
+import os
+import sys
+import unittest
+from collections import Counter
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import fill_lock, middleware  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.client.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel):
+        self.client.subscribers.get(channel, set()).discard(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    """The lease commands of one Redis shared by every simulated instance."""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+        self.published = 0
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, lease_key, token, channel):
+        if self.values.get(lease_key) == token:
+            del self.values[lease_key]
+        self.published += 1
+        for subscriber in list(self.subscribers.get(channel, ())):
+            subscriber.messages.put_nowait({"type": "message", "data": "1"})
+        return len(self.subscribers.get(channel, ()))
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FillLeaseTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        self.stats = dict.fromkeys(fill_lock.lease_stats, 0)
+        for patcher in (
+            mock.patch.object(fill_lock, "get_redis", return_value=self.client),
+            mock.patch.object(fill_lock, "lease_stats", self.stats),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_waiters_take_the_holders_result(self):
+        shared = {}
+        loads = 0
+        release = asyncio.Event()
+
+        async def load():
+            nonlocal loads
+            loads += 1
+            await release.wait()
+            shared["value"] = "filled"
+            return "filled"
+
+        async def check():
+            return shared.get("value")
+
+        tasks = [asyncio.ensure_future(fill_lock.fill("k", load, check, timeout=5)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*tasks), ["filled"] * 4)
+        self.assertEqual(loads, 1)
+        self.assertEqual(self.stats["contended"], 3)
+        self.assertEqual(self.stats["peer_fills"], 3)
+        self.assertNotIn("lease:k", self.client.values)
+
+    async def test_dead_holder_only_delays_a_waiter(self):
+        self.assertIsNotNone(await fill_lock.acquire("k"))  # never released
+
+        async def load():
+            return "mine"
+
+        async def check():
+            return None
+
+        self.assertEqual(await fill_lock.fill("k", load, check, timeout=0.02), "mine")
+        self.assertEqual(self.stats["timeouts"], 1)
+
+    async def test_release_keeps_a_lease_taken_over_by_another_instance(self):
+        lease = await fill_lock.acquire("k")
+        self.client.values["lease:k"] = "someone-else"  # ours expired and was re-taken
+        await lease.release()
+        self.assertEqual(self.client.values["lease:k"], "someone-else")
+        self.assertEqual(self.client.published, 1)
+
+    async def test_without_redis_every_fill_runs(self):
+        with mock.patch.object(fill_lock, "get_redis", return_value=None):
+            lease = await fill_lock.acquire("k")
+            self.assertIsNotNone(lease)
+            await lease.release()
+        self.assertEqual(self.client.values, {})
+
+
+class MiddlewareFillTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = FakeRedis()
+        self.store = {}
+        self.renders = Counter()
+        self.release = asyncio.Event()
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        app = FastAPI()
+
+        @app.get("/{handle}/rating")
+        async def rating(handle: str):
+            self.renders[handle] += 1
+            await self.release.wait()
+            return {"handle": handle}
+
+        for patcher in (
+            mock.patch.object(fill_lock, "get_redis", return_value=self.client),
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # two instances sharing one Redis
+        self.instances = []
+        for _ in range(2):
+            wrapped = middleware.CacheRateLimitMiddleware(app, platform="codeforces")
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+            self.addAsyncCleanup(client.aclose)
+            self.instances.append(client)
+
+    async def test_concurrent_misses_on_two_instances_render_once(self):
+        first = asyncio.ensure_future(self.instances[0].get("/tourist/rating"))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(self.instances[1].get("/tourist/rating"))
+        await asyncio.sleep(0.05)
+        self.release.set()
+
+        first, second = await first, await second
+        self.assertEqual(self.renders["tourist"], 1)
+        self.assertEqual(first.headers["x-cache"], "MISS")
+        self.assertEqual(second.headers["x-cache"], "HIT")
+        self.assertEqual(second.json(), {"handle": "tourist"})
+
+
+if __name__ == "__main__":
+    unittest.main()
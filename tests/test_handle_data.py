@@ -0,0 +1,101 @@
+"""Per-handle data cache shared by every endpoint and heatmap view."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import canonical_mapper, handle_data  # noqa: E402
+from services.handle_data import HandleDataCache  # noqa: E402
+from services.submissions import SubmissionSnapshot  # noqa: E402
+
+
+def _submission(submission_id, seconds, index="A", verdict="OK"):
+    return {
+        "id": submission_id,
+        "contestId": 999001,
+        "creationTimeSeconds": seconds,
+        "verdict": verdict,
+        "problem": {"contestId": 999001, "index": index, "name": index, "tags": ["dp"]},
+    }
+
+
+class Sources:
+    def __init__(self):
+        self.calls = {"info": 0, "rating": 0, "snapshot": 0}
+        self.info = {"handle": "tourist", "rating": 3800, "maxRating": 3900, "registrationTimeSeconds": 1_262_304_000}
+
+    async def user_info(self, handle):
+        self.calls["info"] += 1
+        return self.info
+
+    async def rating(self, handle):
+        self.calls["rating"] += 1
+        return [{"contestName": "Round 1", "newRating": 3800, "ratingUpdateTimeSeconds": 1_700_000_000}]
+
+    async def snapshot(self, handle):
+        self.calls["snapshot"] += 1
+        return SubmissionSnapshot.from_submissions(
+            [_submission(2, 1_700_000_000, "B"), _submission(1, 1_600_000_000)]
+        )
+
+
+class HandleDataTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sources = Sources()
+        for patcher in (
+            mock.patch.object(handle_data, "cache", HandleDataCache(ttl_seconds=60, max_handles=2)),
+            mock.patch.object(handle_data, "_user_info", self.sources.user_info),
+            mock.patch.object(handle_data, "get_user_rating", self.sources.rating),
+            mock.patch.object(handle_data, "get_submission_snapshot", self.sources.snapshot),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_every_endpoint_and_view_shares_one_load(self):
+        await canonical_mapper.build_profile("tourist")
+        await canonical_mapper.build_stats("Tourist")
+        all_view = await canonical_mapper.build_heatmap("tourist", "all")
+        year_view = await canonical_mapper.build_heatmap("TOURIST", "year", 2020)
+        await canonical_mapper.build_heatmap("tourist", "last_365")
+        await canonical_mapper.build_rating("tourist")
+        card = await canonical_mapper.build_card("tourist")
+
+        self.assertEqual(self.sources.calls, {"info": 1, "rating": 1, "snapshot": 1})
+        self.assertEqual(all_view.totalSubmissions, 2)
+        self.assertEqual(year_view.totalSubmissions, 1)
+        self.assertEqual(card.heatmap.totalSubmissions, 2)
+        self.assertEqual(card.stats.totalSolved, 2)
+
+    async def test_views_do_not_alter_the_shared_heatmap(self):
+        await canonical_mapper.build_heatmap("tourist", "year", 2020)
+        full = await canonical_mapper.build_heatmap("tourist", "all")
+        self.assertEqual(len(full.dailyContributions), 2)
+
+    async def test_profile_does_not_download_submissions(self):
+        await canonical_mapper.build_profile("tourist")
+        self.assertEqual(self.sources.calls["snapshot"], 0)
+
+    async def test_failed_source_is_retried(self):
+        self.sources.info = None
+        self.assertIsNone((await handle_data.load("tourist", "info")).info)
+        self.sources.info = {"handle": "tourist"}
+        self.assertEqual((await handle_data.load("tourist", "info")).info, {"handle": "tourist"})
+        self.assertEqual(self.sources.calls["info"], 2)
+
+    async def test_entries_expire_and_are_bounded(self):
+        with mock.patch("services.handle_data.time.monotonic", return_value=100.0) as clock:
+            await handle_data.load("tourist", "info")
+            clock.return_value = 161.0
+            await handle_data.load("tourist", "info")
+        self.assertEqual(self.sources.calls["info"], 2)
+
+        for handle in ("a", "b", "c"):
+            handle_data.get_handle_data(handle)
+        self.assertEqual(handle_data.cache.stats()["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware  # noqa: E402
+from core.bloom import BloomFilter  # noqa: E402
+from core.cache_backend import MemoryBackend  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+from services import invalid_handles  # noqa: E402
+from services.invalid_handles import InvalidHandleFilter  # noqa: E402
+
+
+class BloomFilterTests(unittest.TestCase):
+    def test_no_false_negatives_and_false_positives_near_the_target(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"bot{i}")
+
+        self.assertTrue(all(f"bot{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"user{i}" in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+
+class InvalidHandleFilterTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.now = [1000.0]
+        self.backend = MemoryBackend(clock=lambda: self.now[0])
+        patcher = mock.patch.object(invalid_handles, "get_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_rebuilds_pick_up_other_instances_and_forget_expired_handles(self):
+        here = InvalidHandleFilter("codeforces", enabled=True, capacity=100, error_rate=0.001)
+        there = InvalidHandleFilter("codeforces", enabled=True, capacity=100, error_rate=0.001)
+
+        await there.add("ghost")
+        self.assertFalse(here.known_invalid("ghost"))
+        self.assertTrue(await here.sync())
+        self.assertTrue(here.known_invalid("ghost"))
+
+        # the shared set drops the handle with the negative cache entry
+        self.now[0] += middleware.settings.invalid_user_cache_ttl_seconds + 1
+        await here.sync()
+        self.assertFalse(here.known_invalid("ghost"))
+
+    async def test_a_rebuild_grows_past_the_configured_capacity(self):
+        bloom = InvalidHandleFilter("codeforces", enabled=True, capacity=10, error_rate=0.01)
+        size = bloom.stats()["bits"]
+        for i in range(100):
+            await bloom.add(f"bot{i}")
+        await bloom.sync()
+        self.assertGreater(bloom.stats()["bits"], size)
+        self.assertEqual(bloom.stats()["entries"], 100)
+
+    async def test_disabled_filter_knows_nothing(self):
+        bloom = InvalidHandleFilter("codeforces", enabled=False)
+        await bloom.add("ghost")
+        self.assertFalse(bloom.known_invalid("ghost"))
+        self.assertEqual(await self.backend.members(bloom.key), [])
+
+
+class InvalidUserBodyTests(unittest.TestCase):
+    def test_only_error_objects_mark_a_handle_invalid(self):
+        self.assertTrue(middleware._is_invalid_user(200, b'{"status": "error", "message": "User not found"}'))
+        for body in (b"[]", b'[{"id": 1}]', b"null", b"3", b"not json"):
+            self.assertFalse(middleware._is_invalid_user(200, body), body)
+
+
+class MiddlewareFilterTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.lookups = []
+        self.backend = MemoryBackend()
+
+        async def get_entry(key, local=True):
+            self.lookups.append(key)
+            return None
+
+        async def set_entry(key, entry, ttl, index=None):
+            pass
+
+        async def get_json(key):
+            self.lookups.append(key)
+            return None
+
+        async def set_json(key, value, ttl):
+            pass
+
+        async def allow(*args, **kwargs):
+            self.lookups.append("rate-limit")
+            return RateLimitResult(True)
+
+        async def profile(handle: str):
+            return JSONResponse({"status": "FAILED", "comment": "not found"}, status_code=404)
+
+        app = FastAPI()
+        app.get("/{handle}/profile")(profile)
+        self.filter = InvalidHandleFilter("codeforces", enabled=True, capacity=100, error_rate=0.001)
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", get_json),
+            mock.patch.object(middleware, "set_json", set_json),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+            mock.patch.object(invalid_handles, "get_backend", return_value=self.backend),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        wrapped = middleware.CacheRateLimitMiddleware(app, platform="codeforces", invalid_filter=self.filter)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def test_known_invalid_handle_is_answered_without_backend_io(self):
+        first = await self.client.get("/no-such-user/profile")
+        self.assertEqual(first.status_code, 404)
+        self.assertTrue(self.filter.known_invalid("no-such-user"))
+        self.assertEqual(await self.backend.members(self.filter.key), ["no-such-user"])
+
+        self.lookups.clear()
+        second = await self.client.get("/No-Such-User/profile")
+        self.assertEqual(second.status_code, 404)
+        self.assertEqual(second.headers["x-cache"], "NEGATIVE-HIT")
+        self.assertEqual(self.lookups, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Incremental decoding of the ``result`` array of a Codeforces response."""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.json_stream import ResultArrayDecoder  # noqa: E402
+
+ROWS = [
+    {"id": 3, "verdict": "OK", "problem": {"name": "Задача ]\"[", "tags": ["math", "dp"]}},
+    {"id": 2, "verdict": "WRONG_ANSWER", "problem": {"name": "Ünïcode", "tags": []}},
+    {"id": 1, "verdict": None, "problem": {"name": "", "tags": ["greedy"]}},
+]
+
+
+def _decode(body: bytes, chunk_size: int):
+    decoder = ResultArrayDecoder()
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items.extend(decoder.feed(body[start:start + chunk_size]))
+    return items, decoder.close()
+
+
+class ResultArrayDecoderTests(unittest.TestCase):
+    def test_elements_survive_any_chunking(self):
+        body = json.dumps({"status": "OK", "result": ROWS}, ensure_ascii=False, indent=1).encode("utf-8")
+        for chunk_size in (1, 2, 7, 64, len(body)):
+            items, envelope = _decode(body, chunk_size)
+            self.assertEqual(items, ROWS, chunk_size)
+            self.assertEqual(envelope, {"status": "OK"})
+
+    def test_elements_are_released_before_the_body_ends(self):
+        body = json.dumps({"status": "OK", "result": ROWS}).encode("utf-8")
+        decoder = ResultArrayDecoder()
+        first_row_end = body.index(b"}}") + 2
+        self.assertEqual(decoder.feed(body[:first_row_end + 1]), [ROWS[0]])
+
+    def test_failed_envelope_without_result(self):
+        body = b'{"status":"FAILED","comment":"handle: User with handle x not found"}'
+        items, envelope = _decode(body, 5)
+        self.assertEqual(items, [])
+        self.assertEqual(envelope["status"], "FAILED")
+
+    def test_truncated_body_raises(self):
+        decoder = ResultArrayDecoder()
+        decoder.feed(b'{"status":"OK","result":[{"id":1},{"id"')
+        with self.assertRaises(ValueError):
+            decoder.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
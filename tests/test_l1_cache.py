@@ -0,0 +1,101 @@
+"""In-process L1 tier in front of the Redis response cache."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import cache  # noqa: E402
+from core.cache_backend import RedisBackend  # noqa: E402
+from core.l1_cache import L1Cache  # noqa: E402
+
+
+class L1CacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used_over_byte_budget(self):
+        l1 = L1Cache(max_bytes=10, max_ttl_seconds=60)
+        l1.set("a", "A", 4, 60)
+        l1.set("b", "B", 4, 60)
+        l1.get("a")
+        l1.set("c", "C", 4, 60)
+
+        self.assertIsNone(l1.get("b"))
+        self.assertEqual(l1.get("a"), "A")
+        self.assertEqual(l1.stats()["evictions"], 1)
+        self.assertEqual(l1.stats()["bytes"], 8)
+
+    def test_expiry_honours_ttl_and_cap(self):
+        with mock.patch("core.l1_cache.time.monotonic", return_value=100.0) as clock:
+            l1 = L1Cache(max_bytes=100, max_ttl_seconds=30)
+            l1.set("short", 1, 1, 5)
+            l1.set("long", 2, 1, 3600)
+            clock.return_value = 106.0
+            self.assertIsNone(l1.get("short"))
+            self.assertEqual(l1.get("long"), 2)
+            clock.return_value = 131.0
+            self.assertIsNone(l1.get("long"))
+
+        self.assertEqual(l1.stats()["expirations"], 2)
+
+    def test_oversized_values_are_not_kept(self):
+        l1 = L1Cache(max_bytes=10, max_ttl_seconds=60)
+        l1.set("big", "x", 11, 60)
+        self.assertIsNone(l1.get("big"))
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get(self, key):
+        self.ops.append(lambda: self.client.values.get(key))
+        return self
+
+    def pttl(self, key):
+        self.ops.append(lambda: 60_000 if key in self.client.values else -2)
+        return self
+
+    async def execute(self):
+        self.client.round_trips += 1
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def setex(self, key, ttl, value):
+        self.round_trips += 1
+        self.values[key] = value
+
+
+class TwoTierTests(unittest.IsolatedAsyncioTestCase):
+    async def test_second_read_is_served_without_redis(self):
+        client = FakeRedis()
+        client.values["k"] = '{"body":"eA=="}'
+        with mock.patch.object(cache, "get_backend", return_value=RedisBackend(lambda: client)), \
+                mock.patch.object(cache, "l1", L1Cache(1024, 60)):
+            first = await cache.get_json("k")
+            second = await cache.get_json("k")
+            stats = cache.cache_stats()
+
+        self.assertEqual(first, {"body": "eA=="})
+        self.assertIs(second, first)
+        self.assertEqual(client.round_trips, 1)
+        self.assertEqual(stats["l1"]["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
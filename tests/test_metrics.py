@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+import aiohttp
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import metrics, middleware, upstream  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+
+
+class RegistryTests(unittest.TestCase):
+    def test_counters_and_histograms_render_in_text_format(self):
+        registry = metrics.Registry()
+        requests = registry.counter("demo_requests", "Requests.", ("route",))
+        latency = registry.histogram("demo_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+        requests.inc('a"b')
+        requests.inc('a"b', amount=2)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, "x")
+
+        lines = registry.render().splitlines()
+
+        self.assertIn("# HELP demo_requests_total Requests.", lines)
+        self.assertIn("# TYPE demo_requests_total counter", lines)
+        self.assertIn('demo_requests_total{route="a\\"b"} 3', lines)
+        self.assertIn("# TYPE demo_seconds histogram", lines)
+        # buckets are cumulative and the upper bound is inclusive
+        self.assertIn('demo_seconds_bucket{route="x",le="0.1"} 2', lines)
+        self.assertIn('demo_seconds_bucket{route="x",le="1"} 3', lines)
+        self.assertIn('demo_seconds_bucket{route="x",le="+Inf"} 4', lines)
+        self.assertIn('demo_seconds_sum{route="x"} 3.65', lines)
+        self.assertIn('demo_seconds_count{route="x"} 4', lines)
+
+    def test_collectors_are_read_at_render_time(self):
+        registry = metrics.Registry()
+        stats = {"hits": 1}
+        registry.collect(lambda: [("demo_cache", "untyped", "Cache.", [({"stat": "hits"}, stats["hits"])])])
+        stats["hits"] = 7
+        self.assertIn('demo_cache{stat="hits"} 7', registry.render().splitlines())
+
+    def test_names_are_registered_once(self):
+        registry = metrics.Registry()
+        registry.counter("demo", "Demo.")
+        with self.assertRaises(ValueError):
+            registry.histogram("demo", "Demo.")
+
+
+class MiddlewareMetricsTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.allowed = True
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def limits(*args, **kwargs):
+            return RateLimitResult(self.allowed, retry_after=5)
+
+        async def missing(key):
+            return None
+
+        async def rating(handle: str):
+            return {"handle": handle}
+
+        app = FastAPI()
+        app.get("/{handle}/rating")(rating)
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", limits),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        transport = httpx.ASGITransport(app=middleware.CacheRateLimitMiddleware(app, platform="codeforces"))
+        self.client = httpx.AsyncClient(transport=transport, base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def test_each_request_is_counted_and_timed_by_outcome(self):
+        outcomes = ("MISS", "HIT", "RATE-LIMITED")
+        before = {o: metrics.cache_request_seconds.count(o) for o in outcomes}
+
+        await self.client.get("/metrics-miss/rating")
+        await self.client.get("/metrics-miss/rating")
+        self.allowed = False
+        await self.client.get("/metrics-limited/rating")
+
+        for outcome in outcomes:
+            self.assertEqual(metrics.cache_request_seconds.count(outcome) - before[outcome], 1, outcome)
+
+
+class _Response:
+    status = 200
+
+    async def json(self):
+        await asyncio.sleep(0)
+        return {"status": "OK"}
+
+
+class _Session:
+    def __init__(self, fail=None):
+        self.fail = fail
+
+    def get(self, url, params=None):
+        session = self
+
+        class Request:
+            async def __aenter__(self):
+                if session.fail is not None:
+                    raise session.fail
+                return _Response()
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Request()
+
+
+class UpstreamMetricsTests(unittest.IsolatedAsyncioTestCase):
+    async def fetch(self, method, session):
+        async def free():
+            return None
+
+        with mock.patch.object(upstream, "get_session", return_value=session), \
+                mock.patch.object(upstream.upstream_budget, "acquire", free):
+            return await upstream._get_json(method, None)
+
+    async def test_calls_are_counted_per_method_and_outcome(self):
+        await self.fetch("metrics.ok", _Session())
+        with self.assertRaises(aiohttp.ServerTimeoutError):
+            await self.fetch("metrics.slow", _Session(asyncio.TimeoutError()))
+
+        self.assertEqual(metrics.upstream_requests.value("metrics.ok", "200"), 1)
+        self.assertEqual(metrics.upstream_requests.value("metrics.slow", "timeout"), 1)
+        self.assertEqual(metrics.upstream_request_seconds.count("metrics.ok"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Count-min hot-handle tracking and pre-warming of cached responses."""
+
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware  # noqa: E402
+from core.count_min import CountMinSketch, HeavyHitters  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+from services import prewarm  # noqa: E402
+
+
+class SketchTests(unittest.TestCase):
+    def test_estimates_never_undercount(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        counts = Counter(f"user{random.Random(1).randrange(500)}" for _ in range(2000))
+        for key, count in counts.items():
+            sketch.add(key, count)
+        self.assertTrue(all(sketch.estimate(key) >= count for key, count in counts.items()))
+
+    def test_heavy_hitters_find_skewed_keys(self):
+        rng = random.Random(3)
+        hot = HeavyHitters(k=5, width=1024, depth=4)
+        for _ in range(20000):
+            if rng.random() < 0.5:
+                hot.add(f"hot{rng.randrange(5)}")
+            else:
+                hot.add(f"cold{rng.randrange(5000)}")
+        self.assertEqual({key for key, _ in hot.top()}, {f"hot{i}" for i in range(5)})
+
+    def test_decay_halves_counts(self):
+        hot = HeavyHitters(k=2, width=64, depth=2)
+        for _ in range(8):
+            hot.add("a")
+        hot.decay()
+        self.assertEqual(hot.top(), [("a", 4)])
+        self.assertEqual(hot.sketch.estimate("a"), 4)
+
+
+class PrewarmTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.now = 1_000_000.0
+        self.renders = Counter()
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        app = FastAPI()
+
+        @app.get("/{handle}/stats/svg")
+        async def card(handle: str, theme: str = "dark"):
+            self.renders[handle] += 1
+            return {"handle": handle, "theme": theme}
+
+        self.scheduler = prewarm.PrewarmScheduler(mode="inline", top_k=2)
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+            mock.patch.object(middleware.time, "time", lambda: self.now),
+            mock.patch.object(middleware.settings, "cache_ttl_seconds", 600),
+            mock.patch.object(prewarm.settings, "lead_seconds", 120),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        wrapped = middleware.CacheRateLimitMiddleware(app, platform="codeforces", prewarm=self.scheduler)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def traffic(self):
+        for _ in range(5):
+            await self.client.get("/tourist/stats/svg?theme=light")
+            await self.client.get("/petr/stats/svg")
+        await self.client.get("/rare/stats/svg")
+        await self.client.get("/rare2/stats/svg")
+
+    async def test_hot_handles_refresh_before_expiry(self):
+        await self.traffic()
+        self.assertEqual([handle for handle, _ in self.scheduler.hot_handles()], ["tourist", "petr"])
+
+        self.assertEqual(await self.scheduler.refresh_round(self.scheduler.hot_handles()), 0)
+
+        self.now += 500
+        self.assertEqual(await self.scheduler.refresh_round(self.scheduler.hot_handles()), 2)
+        self.assertEqual(self.renders["tourist"], 2)
+        self.assertEqual(self.renders["petr"], 2)
+
+        # a client arriving just after the old entry would have expired still hits
+        self.now += 200
+        response = await self.client.get("/tourist/stats/svg?theme=light")
+        self.assertEqual(response.headers["x-cache"], "HIT")
+        self.assertEqual(response.json(), {"handle": "tourist", "theme": "light"})
+
+    async def test_budget_limits_refreshes_per_round(self):
+        self.scheduler._budget = prewarm.LocalTokenBucket(rate=1 / 60, burst=1)
+        await self.traffic()
+        self.now += 500
+
+        self.assertEqual(await self.scheduler.refresh_round(self.scheduler.hot_handles()), 1)
+        self.assertEqual(self.scheduler.stats()["deferred"], 1)
+
+    async def test_zero_handles_per_minute_turns_prewarm_off(self):
+        scheduler = prewarm.PrewarmScheduler(mode="inline", top_k=2, handles_per_minute=0)
+        self.assertEqual(scheduler.mode, "off")
+        scheduler.start()
+        self.assertIsNone(scheduler._task)
+
+    async def test_off_mode_tracks_nothing(self):
+        self.scheduler.mode = "off"
+        await self.traffic()
+        self.assertEqual(self.scheduler.hot_handles(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
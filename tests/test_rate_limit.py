@@ -0,0 +1,98 @@
+"""IP and handle limits are evaluated together in one Redis script call."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import rate_limit  # noqa: E402
+from core.cache_backend import RedisBackend  # noqa: E402
+
+
+class ScriptModel:
+    """Python model of ``RATE_LIMIT_SCRIPT`` over a dict of counters and TTLs."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.calls = 0
+
+    async def __call__(self, keys, args, client=None):
+        self.calls += 1
+        base, max_backoff = args[0], args[1]
+        result = None
+        for i in range(len(keys) // 3):
+            backoff_key, violations_key, counter_key = keys[3 * i:3 * i + 3]
+            limit, window = args[2 * i + 2], args[2 * i + 3]
+            if self.ttls.get(backoff_key, 0) > 0:
+                return [i + 1, 0, self.ttls[backoff_key], 0, 0]
+            self.values[counter_key] = self.values.get(counter_key, 0) + 1
+            count = self.values[counter_key]
+            if count == 1:
+                self.ttls[counter_key] = window
+            if count > limit:
+                self.values[violations_key] = self.values.get(violations_key, 0) + 1
+                backoff = min(base * 2 ** (self.values[violations_key] - 1), max_backoff)
+                self.ttls[backoff_key] = backoff
+                return [i + 1, 0, backoff, 0, 0]
+            self.values.pop(violations_key, None)
+            result = [i + 1, 1, 0, limit - count, self.ttls[counter_key]]
+        return result
+
+
+class FakeClient:
+    def __init__(self, script):
+        self.script = script
+
+    def register_script(self, source):
+        return self.script
+
+
+LIMITS = [("ip:codeforces:1.2.3.4", 10, 60, "ip"), ("handle:codeforces:tourist", 2, 60, "handle")]
+
+
+class RateLimitTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.script = ScriptModel()
+        for patcher in (
+            mock.patch.object(rate_limit, "get_backend", return_value=RedisBackend(lambda: FakeClient(self.script))),
+            mock.patch.object(rate_limit.time, "time", return_value=1000),
+            mock.patch.object(rate_limit.settings, "rate_limit_backoff_base_seconds", 5),
+            mock.patch.object(rate_limit.settings, "rate_limit_backoff_max_seconds", 300),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_both_limits_cost_one_call(self):
+        result = await rate_limit.check_rate_limits(LIMITS)
+        self.assertEqual(result, rate_limit.RateLimitResult(True, 0, "handle", 2, 1, 1060))
+        self.assertEqual(self.script.calls, 1)
+        self.assertEqual(self.script.values["rl:ip:codeforces:1.2.3.4"], 1)
+
+    async def test_handle_limit_denies_with_doubling_backoff(self):
+        await rate_limit.check_rate_limits(LIMITS)
+        await rate_limit.check_rate_limits(LIMITS)
+        denied = await rate_limit.check_rate_limits(LIMITS)
+        self.assertEqual(denied, rate_limit.RateLimitResult(False, 5, "handle", 2, 0, 1005))
+
+        self.script.ttls["backoff:handle:codeforces:tourist"] = 0
+        self.assertEqual((await rate_limit.check_rate_limits(LIMITS)).retry_after, 10)
+
+    async def test_limited_ip_does_not_count_the_handle(self):
+        self.script.ttls["backoff:ip:codeforces:1.2.3.4"] = 42
+        result = await rate_limit.check_rate_limits(LIMITS)
+        self.assertEqual((result.allowed, result.limited_by, result.retry_after), (False, "ip", 42))
+        self.assertNotIn("rl:handle:codeforces:tourist", self.script.values)
+
+    async def test_fails_open_on_redis_errors(self):
+        async def broken(self, limits, backoff_base, backoff_max):
+            raise ConnectionError("down")
+
+        with mock.patch.object(RedisBackend, "check_rate_limits", broken):
+            self.assertTrue((await rate_limit.check_rate_limits(LIMITS)).allowed)
+
+
+if __name__ == "__main__":
+    unittest.main()
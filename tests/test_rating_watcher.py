@@ -0,0 +1,158 @@
+"""Contest-driven invalidation of rating-derived cache entries."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import cache  # noqa: E402
+from core.cache_backend import RedisBackend  # noqa: E402
+from core.cache_entry import CacheEntry  # noqa: E402
+from core.l1_cache import L1Cache  # noqa: E402
+from services import handle_data, rating_watcher  # noqa: E402
+from services.contest_catalogue import ContestCatalogue  # noqa: E402
+from services.handle_data import HandleDataCache  # noqa: E402
+
+
+class Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.client.round_trips += 1
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.ops]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    async def set(self, key, value, nx=False, ex=None, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key.decode(), None)
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+
+def _change(handle, contest_id=2000, new_rating=3900):
+    return {
+        "contestId": contest_id,
+        "contestName": "Round",
+        "handle": handle,
+        "rank": 1,
+        "ratingUpdateTimeSeconds": 1_700_000_000,
+        "oldRating": 3800,
+        "newRating": new_rating,
+    }
+
+
+class RatingWatcherTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        self.watcher = rating_watcher.RatingWatcher()
+        self.cache = HandleDataCache(60, 10)
+        for patcher in (
+            mock.patch.object(cache, "get_backend", return_value=RedisBackend(lambda: self.client)),
+            mock.patch.object(cache, "l1", L1Cache(1 << 20, 60)),
+            mock.patch.object(rating_watcher, "get_redis", return_value=self.client),
+            mock.patch.object(handle_data, "cache", self.cache),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def store(self, key, handle, route):
+        await cache.set_entry(key, CacheEntry.build(200, "application/json", "", b"{}"), 60, ("codeforces", handle, route))
+
+    async def test_rating_routes_of_listed_handles_are_removed(self):
+        await self.store("rating", "tourist", "rating")
+        await self.store("summary", "tourist", "")
+        await self.store("svg", "tourist", "stats/svg")
+        await self.store("other", "petr", "rating")
+
+        removed = await self.watcher.apply([_change("Tourist")])
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(set(self.client.values), {"svg", "other"})
+        self.assertIsNone(cache.l1.get("rating"))
+        self.assertIsNotNone(cache.l1.get("svg"))
+
+    async def test_loaded_rating_history_is_updated_in_place(self):
+        data = self.cache.get("tourist")
+        data._sources["rating"] = [_change("tourist", contest_id=1000, new_rating=3800)]
+        data._sources["info"] = {"handle": "tourist", "rating": 3800}
+
+        await self.watcher.apply([_change("tourist")])
+        await self.watcher.apply([_change("tourist")])
+
+        self.assertEqual([row["newRating"] for row in data.rating], [3800, 3900])
+        self.assertIsNone(data.info)
+
+    async def test_each_contest_is_fetched_once_and_empty_results_wait(self):
+        responses = {1: {"status": "OK", "result": []}, 2: {"status": "OK", "result": [_change("tourist", 2)]}}
+        calls = []
+
+        async def fetch(method, params):
+            calls.append(params["contestId"])
+            return responses[params["contestId"]]
+
+        catalogue = ContestCatalogue(gym=False)
+        catalogue.load([
+            {"id": 2, "phase": "FINISHED", "startTimeSeconds": 9_000, "durationSeconds": 7200},
+            {"id": 1, "phase": "FINISHED", "startTimeSeconds": 8_000, "durationSeconds": 7200},
+            {"id": 0, "phase": "FINISHED", "startTimeSeconds": 100, "durationSeconds": 7200},
+            {"id": 3, "phase": "CODING", "startTimeSeconds": 17_000, "durationSeconds": 7200},
+        ])
+        with mock.patch.object(rating_watcher, "fetch_json", fetch), \
+                mock.patch.dict(rating_watcher.catalogues, {False: catalogue}), \
+                mock.patch.object(catalogue, "start"), \
+                mock.patch.object(rating_watcher.settings, "lookback_seconds", 10_000):
+            self.assertEqual(await self.watcher.run_once(now=18_000), 1)
+            self.assertEqual(await self.watcher.run_once(now=18_000), 0)
+
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertEqual(self.client.values["rating-watch:codeforces:2"], "done")
+        self.assertEqual(self.watcher.stats()["contests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
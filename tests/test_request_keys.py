@@ -0,0 +1,160 @@
+"""Canonical request keys: handle case and heatmap view aliases share one entry."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import cache, middleware  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+from services import handle_data, request_keys  # noqa: E402
+from services.handle_data import CanonicalHandles, HandleDataCache  # noqa: E402
+
+
+class CanonicalQueryTests(unittest.TestCase):
+    def test_view_aliases_collapse(self):
+        self.assertEqual(request_keys._canonical_query("heatmap", [("view", "last365")]), [("view", "last_365")])
+        self.assertEqual(request_keys._canonical_query("heatmap", []), [("view", "all")])
+        self.assertEqual(
+            request_keys._canonical_query("heatmap", [("year", "2023")]),
+            [("view", "year"), ("year", "2023")],
+        )
+        self.assertEqual(
+            request_keys._canonical_query("heatmap", [("view", "last-365"), ("year", "2023")]),
+            [("view", "last_365")],
+        )
+
+    def test_invalid_or_other_queries_are_left_alone(self):
+        self.assertEqual(request_keys._canonical_query("heatmap", [("view", "year")]), [("view", "year")])
+        self.assertEqual(request_keys._canonical_query("stats/svg", [("theme", "dark")]), [("theme", "dark")])
+
+
+class CanonicalRequestTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.info_calls = []
+
+        async def user_info(handle):
+            self.info_calls.append(handle)
+            return {"handle": "tourist"} if handle.lower() == "tourist" else None
+
+        self.store = {}
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        self.renders = 0
+
+        app = FastAPI()
+
+        @app.get("/{handle}/stats")
+        async def stats(handle: str):
+            self.renders += 1
+            return {"username": handle}
+
+        @app.get("/{handle}/profile")
+        async def profile(handle: str):
+            self.renders += 1
+            if (await handle_data.load(handle, "info")).info is None:
+                return JSONResponse({"status": "error", "message": "User not found"}, status_code=404)
+            return {"username": handle}
+
+        @app.get("/{handle}/heatmap")
+        async def heatmap(handle: str, view: str = "all"):
+            self.renders += 1
+            return {"username": handle}
+
+        self.key_stats = dict.fromkeys(cache.key_stats, 0)
+        handles = CanonicalHandles(10)
+        for patcher in (
+            mock.patch.object(handle_data, "cache", HandleDataCache(60, 10)),
+            mock.patch.object(handle_data, "handles", handles),
+            mock.patch.object(request_keys, "handles", handles),
+            mock.patch.object(handle_data, "get_redis", return_value=None),
+            mock.patch.object(handle_data.batcher, "get", user_info),
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+            mock.patch.object(middleware, "key_stats", self.key_stats),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        wrapped = middleware.CacheRateLimitMiddleware(
+            app, platform="codeforces", canonicalize=request_keys.canonical_request
+        )
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def test_handle_spellings_share_one_entry_and_body(self):
+        first = await self.client.get("/Tourist/profile")
+        second = await self.client.get("/TOURIST/profile")
+        third = await self.client.get("/tourist/profile")
+
+        self.assertEqual([r.headers["x-cache"] for r in (first, second, third)], ["MISS", "HIT", "HIT"])
+        self.assertEqual({r.json()["username"] for r in (first, second, third)}, {"tourist"})
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(self.info_calls, ["Tourist"])
+        self.assertEqual(self.key_stats["hits"], 2)
+        self.assertEqual(self.key_stats["canonical_hits"], 1)
+
+    async def test_routes_without_user_info_do_not_resolve(self):
+        unseen = await self.client.get("/Tourist/stats")
+        self.assertEqual(unseen.json(), {"username": "Tourist"})
+        self.assertEqual(self.info_calls, [])
+
+        await self.client.get("/tourist/profile")
+        # a spelling some route already resolved is still canonicalized
+        self.assertEqual((await self.client.get("/TOURIST/stats")).json(), {"username": "tourist"})
+        self.assertEqual(self.info_calls, ["tourist"])
+
+    async def test_unknown_handles_cost_one_user_info_call(self):
+        for _ in range(2):
+            response = await self.client.get("/nosuchuser/profile")
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.info_calls, ["nosuchuser"])
+
+    async def test_view_aliases_share_one_entry(self):
+        await self.client.get("/tourist/heatmap?view=last365")
+        response = await self.client.get("/tourist/heatmap?view=last_365")
+        self.assertEqual(response.headers["x-cache"], "HIT")
+        self.assertEqual(self.renders, 1)
+
+    async def test_route_paths_are_neither_resolved_nor_rewritten(self):
+        await request_keys.handles.remember("PlayGround")
+        for resolve in (False, True):
+            path, _, resolved = await request_keys.canonical_request("/playground", [], resolve)
+            self.assertEqual((path, resolved), ("/playground", True))
+        self.assertEqual(self.info_calls, [])
+
+    def test_the_app_registers_its_literal_route_segments(self):
+        from app import app
+
+        served = request_keys.route_segments(app.routes)
+        self.assertTrue({"playground", "metrics", "contests", "docs"} <= served)
+        self.assertFalse(any(segment.startswith("{") for segment in served))
+        self.assertTrue(served <= request_keys.ROUTE_SEGMENTS)
+
+    async def test_unknown_handle_keeps_its_spelling(self):
+        response = await self.client.get("/Nobody/stats")
+        self.assertEqual(response.json(), {"username": "Nobody"})
+
+
+if __name__ == "__main__":
+    unittest.main()
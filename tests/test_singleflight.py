@@ -0,0 +1,115 @@
+"""Concurrent identical upstream fetches collapse into a single request."""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import upstream  # noqa: E402
+from core.singleflight import SingleFlight  # noqa: E402
+from services import submission_store, submissions  # noqa: E402
+from services.submissions import get_submission_snapshot  # noqa: E402
+
+STATUS = {
+    "status": "OK",
+    "result": [
+        {
+            "contestId": 1,
+            "creationTimeSeconds": 1700000000,
+            "verdict": "OK",
+            "problem": {"contestId": 1, "index": "A", "tags": ["math"]},
+        }
+    ],
+}
+
+
+class FakeUpstream:
+    def __init__(self, payload=STATUS, error=None):
+        self.payload = payload
+        self.error = error
+        self.requests = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, method, params):
+        self.requests.append((method, params))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.payload
+
+    async def stream(self, method, params, on_item):
+        payload = await self(method, params)
+        for item in payload.get("result", []):
+            on_item(item)
+        return {"status": payload["status"]}
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.flights = SingleFlight()
+        self.fake = FakeUpstream()
+        patcher_flights = mock.patch.object(upstream, "flights", self.flights)
+        patcher_get = mock.patch.object(upstream, "_get_json", self.fake)
+        patcher_stream = mock.patch.object(submissions, "stream_result", self.fake.stream)
+        patcher_store = mock.patch.object(submission_store, "_store", submission_store.MemorySubmissionStore())
+        for patcher in (patcher_flights, patcher_get, patcher_stream, patcher_store):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _burst(self, coro_factory, n=100):
+        tasks = [asyncio.create_task(coro_factory()) for _ in range(n)]
+        await asyncio.sleep(0)
+        self.fake.release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def test_hundred_concurrent_misses_make_one_upstream_request(self):
+        results = await self._burst(lambda: upstream.fetch_json("user.status", {"handle": "tourist"}))
+
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertTrue(all(result is STATUS for result in results))
+        self.assertEqual(self.flights.stats(), {"calls": 1, "coalesced": 99, "in_flight": 0})
+
+    async def test_snapshot_builders_share_the_flight(self):
+        snapshots = await self._burst(lambda: get_submission_snapshot("tourist"))
+
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertTrue(all(snapshot.solved_count == 1 for snapshot in snapshots))
+
+    async def test_different_params_are_not_coalesced(self):
+        first = asyncio.create_task(upstream.fetch_json("user.status", {"handle": "a"}))
+        second = asyncio.create_task(upstream.fetch_json("user.status", {"handle": "b"}))
+        await asyncio.sleep(0)
+        self.fake.release.set()
+        await asyncio.gather(first, second)
+
+        self.assertEqual(len(self.fake.requests), 2)
+        self.assertEqual(self.flights.coalesced, 0)
+
+    async def test_errors_reach_every_waiter_and_do_not_stick(self):
+        self.fake.error = upstream.aiohttp.ClientError("boom")
+        results = await self._burst(lambda: upstream.fetch_json("user.info", {"handles": "x"}), n=10)
+
+        self.assertTrue(all(isinstance(result, upstream.aiohttp.ClientError) for result in results))
+        self.assertEqual(self.flights.in_flight(), 0)
+
+        self.fake.error = None
+        await upstream.fetch_json("user.info", {"handles": "x"})
+        self.assertEqual(len(self.fake.requests), 2)
+
+    async def test_cancelled_caller_does_not_cancel_shared_fetch(self):
+        leader = asyncio.create_task(upstream.fetch_json("user.rating", {"handle": "a"}))
+        follower = asyncio.create_task(upstream.fetch_json("user.rating", {"handle": "a"}))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        self.fake.release.set()
+
+        self.assertIs(await follower, STATUS)
+        self.assertEqual(len(self.fake.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+"""Stale-while-revalidate and stale-if-error in CacheRateLimitMiddleware."""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+import aiohttp
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware, upstream  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+from core.singleflight import SingleFlight  # noqa: E402
+from routes import profile, rating  # noqa: E402
+from services import handle_data  # noqa: E402
+from services.handle_data import CanonicalHandles, HandleDataCache  # noqa: E402
+from services.user_info_batcher import UserInfoBatcher  # noqa: E402
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+
+    async def __call__(self, handle: str):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise HTTPException(status_code=502, detail="Codeforces unavailable")
+        return {"handle": handle, "version": self.calls}
+
+
+class StaleCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.now = 1_000_000.0
+        self.upstream = Upstream()
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def live(handle: str):
+            self.upstream.calls += 1
+            return JSONResponse({"calls": self.upstream.calls}, headers={"Cache-Control": "max-age=0"})
+
+        app = FastAPI()
+        app.get("/{handle}/profile")(self.upstream)
+        app.get("/{handle}/live")(live)
+        self.middleware = middleware.CacheRateLimitMiddleware(app, platform="codeforces")
+
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+            mock.patch.object(middleware.time, "time", lambda: self.now),
+            mock.patch.object(middleware.settings, "cache_ttl_seconds", 60),
+            mock.patch.object(middleware.settings, "cache_stale_while_revalidate_seconds", 60),
+            mock.patch.object(middleware.settings, "cache_stale_if_error_seconds", 600),
+            mock.patch.object(middleware.settings, "cache_refresh_timeout_seconds", 0.05),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        transport = httpx.ASGITransport(app=self.middleware)
+        self.client = httpx.AsyncClient(transport=transport, base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def get(self):
+        response = await self.client.get("/tourist/profile")
+        return response.headers.get("x-cache"), response.json()
+
+    async def settle(self):
+        while self.middleware._tasks:
+            await asyncio.gather(*self.middleware._tasks, return_exceptions=True)
+
+    async def test_fresh_entry_is_a_hit(self):
+        self.assertEqual(await self.get(), ("MISS", {"handle": "tourist", "version": 1}))
+        self.now += 30
+        self.assertEqual(await self.get(), ("HIT", {"handle": "tourist", "version": 1}))
+        self.assertEqual(self.upstream.calls, 1)
+
+    async def test_stale_entry_is_served_and_refreshed_once(self):
+        await self.get()
+        self.now += 90
+        self.upstream.delay = 0.01
+
+        results = await asyncio.gather(*(self.get() for _ in range(5)))
+        await self.settle()
+
+        self.assertEqual({result for result, _ in results}, {"STALE"})
+        self.assertTrue(all(body["version"] == 1 for _, body in results))
+        self.assertEqual(self.upstream.calls, 2)
+        self.assertEqual(await self.get(), ("HIT", {"handle": "tourist", "version": 2}))
+
+    async def test_failed_background_refresh_keeps_the_stale_entry(self):
+        await self.get()
+        self.now += 90
+        self.upstream.fail = True
+
+        self.assertEqual((await self.get())[0], "STALE")
+        await self.settle()
+        self.assertEqual(await self.get(), ("STALE", {"handle": "tourist", "version": 1}))
+
+    async def test_upstream_error_serves_last_good_body_until_hard_ttl(self):
+        await self.get()
+        self.now += 300
+        self.upstream.fail = True
+
+        self.assertEqual(await self.get(), ("STALE", {"handle": "tourist", "version": 1}))
+
+        self.upstream.fail = False
+        self.assertEqual(await self.get(), ("MISS", {"handle": "tourist", "version": 3}))
+
+    async def test_max_age_zero_responses_are_not_stored(self):
+        first = await self.client.get("/tourist/live")
+        second = await self.client.get("/tourist/live")
+
+        self.assertEqual(self.store, {})
+        self.assertEqual((first.json(), second.json()), ({"calls": 1}, {"calls": 2}))
+        self.assertEqual(second.headers["x-cache"], "MISS")
+
+    async def test_slow_refresh_serves_stale_and_finishes_in_background(self):
+        await self.get()
+        self.now += 300
+        self.upstream.delay = 0.2
+
+        self.assertEqual(await self.get(), ("STALE", {"handle": "tourist", "version": 1}))
+        await self.settle()
+        self.assertEqual(await self.get(), ("HIT", {"handle": "tourist", "version": 2}))
+
+
+
+class Codeforces:
+    """A session answering ``user.info`` and ``user.rating`` the way the API does.
+
+    ``error`` makes requests fail in transport and ``comment`` makes Codeforces
+    answer ``FAILED`` with it.
+    """
+
+    def __init__(self):
+        self.error = None
+        self.comment = None
+
+    def _reply(self, method):
+        if self.comment is not None:
+            return 400 if "not found" in self.comment else 503, {"status": "FAILED", "comment": self.comment}
+        if method == "user.info":
+            return 200, {"status": "OK", "result": [{"handle": "tourist", "rating": 3800, "maxRating": 3900}]}
+        return 200, {
+            "status": "OK",
+            "result": [{"contestName": "Round 1", "newRating": 3800, "ratingUpdateTimeSeconds": 1_700_000_000}],
+        }
+
+    def get(self, url, params=None):
+        codeforces = self
+        method = url.rsplit("/", 1)[-1]
+
+        class Reply:
+            async def __aenter__(self):
+                if codeforces.error is not None:
+                    raise codeforces.error
+                self.status, self.payload = codeforces._reply(method)
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def json(self):
+                return self.payload
+
+        return Reply()
+
+
+class RevalidationOutageTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.json = {}
+        self.now = 1_000_000.0
+        self.codeforces = Codeforces()
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def get_json(key):
+            return self.json.get(key)
+
+        async def set_json(key, value, ttl):
+            self.json[key] = value
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def free():
+            return None
+
+        app = FastAPI()
+        app.include_router(profile.router)
+        app.include_router(rating.router)
+        wrapped = middleware.CacheRateLimitMiddleware(app, platform="codeforces")
+
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", get_json),
+            mock.patch.object(middleware, "set_json", set_json),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+            mock.patch.object(middleware.time, "time", lambda: self.now),
+            mock.patch.object(middleware.settings, "cache_ttl_seconds", 60),
+            mock.patch.object(middleware.settings, "cache_stale_while_revalidate_seconds", 60),
+            mock.patch.object(middleware.settings, "cache_stale_if_error_seconds", 600),
+            mock.patch.object(middleware.settings, "cache_refresh_timeout_seconds", 1.0),
+            # every request loads the handle again, as it would once the entry expired
+            mock.patch.object(handle_data, "cache", HandleDataCache(ttl_seconds=0, max_handles=10)),
+            mock.patch.object(upstream, "get_session", return_value=self.codeforces),
+            mock.patch.object(upstream, "flights", SingleFlight()),
+            mock.patch.object(handle_data, "batcher", UserInfoBatcher(window_seconds=0.001, max_handles=10)),
+            mock.patch.object(upstream.upstream_budget, "acquire", free),
+            mock.patch.object(handle_data, "get_redis", return_value=None),
+            mock.patch.object(handle_data, "handles", CanonicalHandles(10)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def assertServesTheLastGoodBody(self, path, **failure):
+        first = await self.client.get(path)
+        self.assertEqual(first.headers["x-cache"], "MISS")
+        stored = dict(self.store)
+        self.now += 300
+        vars(self.codeforces).update(failure)
+
+        stale = await self.client.get(path)
+
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.headers["x-cache"], "STALE")
+        self.assertEqual(stale.json(), first.json())
+        self.assertEqual(self.store, stored)
+        self.assertEqual(self.json, {})
+
+    async def test_outage_during_revalidation_serves_and_keeps_the_last_good_body(self):
+        for path in ("/tourist/profile", "/tourist/rating"):
+            with self.subTest(path=path):
+                self.codeforces.error = None
+                await self.assertServesTheLastGoodBody(path, error=aiohttp.ClientError("Codeforces is down"))
+
+    async def test_failed_reply_during_revalidation_serves_the_last_good_body(self):
+        for path in ("/tourist/profile", "/tourist/rating"):
+            with self.subTest(path=path):
+                self.codeforces.comment = None
+                await self.assertServesTheLastGoodBody(path, comment="Call limit exceeded")
+
+    async def test_outage_on_a_cold_miss_is_a_502_not_an_unknown_handle(self):
+        self.codeforces.comment = "Call limit exceeded"
+        response = await self.client.get("/tourist/profile")
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(self.store, {})
+        self.assertEqual(self.json, {})
+
+    async def test_handle_gone_during_revalidation_is_marked_invalid(self):
+        await self.client.get("/tourist/profile")
+        self.now += 300
+        self.codeforces.comment = "handles: User with handle tourist not found"
+
+        response = await self.client.get("/tourist/profile")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.json, {"invalid:codeforces:tourist": {"invalid": True}})
+
+
+if __name__ == "__main__":
+    unittest.main()
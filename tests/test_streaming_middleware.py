@@ -0,0 +1,117 @@
+"""Misses stream through CacheRateLimitMiddleware; hits go out in one body message."""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import middleware  # noqa: E402
+from core.rate_limit import RateLimitResult  # noqa: E402
+
+CHUNKS = [b'{"handle":"tourist",', b'"rating":3800', b"}"]
+
+
+def _scope(path="/tourist/rating", method="GET"):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"accept-encoding", b"identity")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+class StreamingMiddlewareTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = {}
+        self.proceed = asyncio.Event()
+        self.calls = 0
+
+        async def get_entry(key, local=True):
+            return self.store.get(key)
+
+        async def set_entry(key, entry, ttl, index=None):
+            self.store[key] = entry
+
+        async def allow(*args, **kwargs):
+            return RateLimitResult(True)
+
+        async def missing(key):
+            return None
+
+        async def app(scope, receive, send):
+            self.calls += 1
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            for index, chunk in enumerate(CHUNKS):
+                await send({"type": "http.response.body", "body": chunk, "more_body": index < len(CHUNKS) - 1})
+                if index == 0:
+                    await self.proceed.wait()
+
+        for patcher in (
+            mock.patch.object(middleware, "get_entry", get_entry),
+            mock.patch.object(middleware, "set_entry", set_entry),
+            mock.patch.object(middleware, "get_json", missing),
+            mock.patch.object(middleware, "cache_enabled", return_value=True),
+            mock.patch.object(middleware, "check_rate_limits", allow),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.middleware = middleware.CacheRateLimitMiddleware(app, platform="codeforces")
+
+    async def call(self, scope):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        task = asyncio.ensure_future(self.middleware(scope, _receive, send))
+        return task, sent
+
+    async def test_miss_streams_before_the_route_finishes_then_hit_is_one_message(self):
+        task, sent = await self.call(_scope())
+        await asyncio.sleep(0.01)
+        # the first chunk reached the client while the route is still producing
+        self.assertEqual([m.get("body") for m in sent if m["type"] == "http.response.body"], [CHUNKS[0]])
+        self.assertIn((b"x-cache", b"MISS"), sent[0]["headers"])
+        # the body was not complete when the headers went out
+        self.assertNotIn(b"etag", dict(sent[0]["headers"]))
+        self.assertEqual(self.store, {})
+
+        self.proceed.set()
+        await task
+        (entry,) = self.store.values()
+        self.assertEqual(entry.body, b"".join(CHUNKS))
+
+        task, sent = await self.call(_scope())
+        await task
+        bodies = [m for m in sent if m["type"] == "http.response.body"]
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(bodies[0]["body"], b"".join(CHUNKS))
+        self.assertIn((b"x-cache", b"HIT"), sent[0]["headers"])
+        self.assertEqual(self.calls, 1)
+
+    async def test_uncached_requests_pass_straight_through(self):
+        self.proceed.set()
+        task, sent = await self.call(_scope(method="POST"))
+        await task
+        self.assertNotIn(b"x-cache", dict(sent[0]["headers"]))
+        self.assertEqual(self.store, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
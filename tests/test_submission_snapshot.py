@@ -0,0 +1,74 @@
+"""Single-pass ``user.status`` aggregation feeding stats, topics, contests and heatmap."""
+
+import os
+import sys
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.heatmap import heatmap_from_snapshot  # noqa: E402
+from services.submissions import SubmissionSnapshot, day_index  # noqa: E402
+
+DAY = 86400
+JAN_1_2024 = day_index(date(2024, 1, 1)) * DAY
+
+
+def _submission(contest_id, index, verdict, created_at, tags=()):
+    return {
+        "contestId": contest_id,
+        "creationTimeSeconds": created_at,
+        "verdict": verdict,
+        "problem": {"contestId": contest_id, "index": index, "tags": list(tags)},
+    }
+
+
+SUBMISSIONS = [
+    _submission(1, "A", "WRONG_ANSWER", JAN_1_2024, ["math"]),
+    _submission(1, "A", "OK", JAN_1_2024 + 60, ["math"]),
+    _submission(1, "A", "OK", JAN_1_2024 + DAY, ["math"]),
+    _submission(2, "B", "OK", JAN_1_2024 + 2 * DAY, ["math", "greedy"]),
+    _submission(3, "C", "TIME_LIMIT_EXCEEDED", JAN_1_2024 + 2 * DAY, ["dp"]),
+]
+
+
+class SubmissionSnapshotTests(unittest.TestCase):
+    def test_one_pass_builds_every_aggregate(self):
+        snapshot = SubmissionSnapshot.from_submissions(SUBMISSIONS)
+
+        self.assertEqual(snapshot.solved_count, 2)
+        self.assertEqual(len(snapshot.table), 5)
+        self.assertEqual(snapshot.contest_ids, {1, 2, 3})
+        self.assertEqual(snapshot.topics(), [{"topic": "math", "count": 2}, {"topic": "greedy", "count": 1}])
+        first = JAN_1_2024 // DAY
+        self.assertEqual(snapshot.daily, {first: [2, 1], first + 1: [1, 1], first + 2: [2, 1]})
+
+    def test_table_round_trips_through_its_serialized_form(self):
+        snapshot = SubmissionSnapshot.from_submissions(SUBMISSIONS)
+
+        loaded = SubmissionSnapshot.from_dict(snapshot.to_dict())
+
+        self.assertEqual(loaded.solved, snapshot.solved)
+        self.assertEqual(loaded.tag_counts, snapshot.tag_counts)
+        self.assertEqual(loaded.daily, snapshot.daily)
+        self.assertIsNone(SubmissionSnapshot.from_dict({"solved": [], "daily": {}}))
+
+    def test_heatmap_projects_daily_buckets(self):
+        snapshot = SubmissionSnapshot.from_submissions(SUBMISSIONS)
+        info = {"registrationTimeSeconds": JAN_1_2024}
+
+        heatmap = heatmap_from_snapshot("u", info, snapshot, year=2024)
+
+        self.assertEqual(heatmap.total_submissions, 5)
+        self.assertEqual(heatmap.total_accepted, 3)
+        self.assertEqual(heatmap.active_days, 3)
+        self.assertEqual(heatmap.longest_streak, 3)
+        self.assertEqual(heatmap.heatmap[0].date, "2024-01-01")
+        self.assertEqual(heatmap.heatmap[0].submissions, 2)
+
+    def test_missing_snapshot_yields_no_heatmap(self):
+        self.assertIsNone(heatmap_from_snapshot("u", {"registrationTimeSeconds": 0}, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
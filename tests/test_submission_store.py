@@ -0,0 +1,165 @@
+"""Incremental ``user.status`` ingestion against a stored high-water mark."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import aiohttp
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import submission_store, submissions  # noqa: E402
+from services.submissions import SubmissionSnapshot, get_submission_snapshot  # noqa: E402
+
+
+def _row(submission_id, index, verdict="OK", tags=("math",)):
+    return {
+        "id": submission_id,
+        "contestId": submission_id // 10,
+        "creationTimeSeconds": 1700000000 + submission_id * 3600,
+        "verdict": verdict,
+        "problem": {"contestId": submission_id // 10, "index": index, "tags": list(tags)},
+    }
+
+
+class FakeStatus:
+    """Serves ``user.status`` newest-first, honouring ``from``/``count``."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def __call__(self, method, params):
+        self.calls.append(dict(params))
+        ordered = sorted(self.rows, key=lambda row: row["id"], reverse=True)
+        if "from" in params:
+            start = params["from"] - 1
+            ordered = ordered[start:start + params["count"]]
+        return {"status": "OK", "result": [dict(row) for row in ordered]}
+
+    async def stream(self, method, params, on_item):
+        for row in (await self(method, params))["result"]:
+            on_item(row)
+        return {"status": "OK"}
+
+
+class IncrementalRefreshTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.upstream = FakeStatus([_row(i, "A" if i % 2 else "B") for i in range(10, 200)])
+        for patcher in (
+            mock.patch.object(submissions, "fetch_json", self.upstream),
+            mock.patch.object(submissions, "stream_result", self.upstream.stream),
+            mock.patch.object(submission_store, "_store", submission_store.MemorySubmissionStore()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertMatchesFullRecompute(self, snapshot):
+        expected = SubmissionSnapshot.from_submissions(
+            row for row in self.upstream.rows if row["verdict"] not in submissions.PENDING_VERDICTS
+        )
+        self.assertEqual(snapshot.solved, expected.solved)
+        self.assertEqual(dict(snapshot.tag_counts), dict(expected.tag_counts))
+        self.assertEqual(snapshot.contest_ids, expected.contest_ids)
+        self.assertEqual(snapshot.daily, expected.daily)
+
+    async def test_refresh_pages_only_new_rows(self):
+        first = await get_submission_snapshot("Tourist")
+        self.assertEqual(first.last_id, 199)
+        self.assertEqual(self.upstream.calls, [{"handle": "Tourist"}])
+
+        self.upstream.rows += [_row(i, "C") for i in range(200, 205)]
+        refreshed = await get_submission_snapshot("tourist")
+
+        self.assertEqual(self.upstream.calls[1:], [{"handle": "tourist", "from": 1, "count": 20}])
+        self.assertEqual(refreshed.last_id, 204)
+        self.assertMatchesFullRecompute(refreshed)
+
+    async def test_refresh_grows_pages_for_long_gaps(self):
+        await get_submission_snapshot("tourist")
+        self.upstream.rows += [_row(i, "D") for i in range(200, 300)]
+
+        refreshed = await get_submission_snapshot("tourist")
+
+        self.assertEqual(
+            [call.get("count") for call in self.upstream.calls[1:]],
+            [20, 80, 320],
+        )
+        self.assertMatchesFullRecompute(refreshed)
+
+    async def test_pending_rows_are_merged_once_judged(self):
+        self.upstream.rows.append(_row(200, "E", verdict="TESTING"))
+        snapshot = await get_submission_snapshot("tourist")
+        self.assertEqual(set(snapshot.pending), {200})
+        self.assertEqual(snapshot.last_id, 200)
+
+        self.upstream.rows[-1]["verdict"] = "OK"
+        self.upstream.rows.append(_row(201, "F"))
+        refreshed = await get_submission_snapshot("tourist")
+
+        self.assertEqual(refreshed.pending, {})
+        self.assertMatchesFullRecompute(refreshed)
+
+    async def test_old_snapshots_are_downloaded_in_full_to_pick_up_rejudges(self):
+        first = await get_submission_snapshot("tourist")
+        # rejudged well below the stored high-water mark, which paging never revisits
+        self.upstream.rows[0]["verdict"] = "SKIPPED"
+        later = first.fetched_at + submissions.store_settings.full_refresh_seconds
+        with mock.patch.object(submissions.time, "time", return_value=later):
+            refreshed = await get_submission_snapshot("tourist")
+
+        self.assertEqual(self.upstream.calls[-1], {"handle": "tourist"})
+        self.assertEqual(refreshed.fetched_at, later)
+        self.assertMatchesFullRecompute(refreshed)
+
+    async def test_an_outage_is_raised_only_when_nothing_is_stored(self):
+        async def down(*args, **kwargs):
+            raise aiohttp.ClientError("Codeforces is down")
+
+        with mock.patch.object(submissions, "stream_result", down):
+            with self.assertRaises(aiohttp.ClientError):
+                await get_submission_snapshot("tourist")
+
+        first = await get_submission_snapshot("tourist")
+        later = first.fetched_at + submissions.store_settings.full_refresh_seconds
+        with mock.patch.object(submissions, "stream_result", down), \
+                mock.patch.object(submissions, "fetch_json", down), \
+                mock.patch.object(submissions.time, "time", return_value=later):
+            self.assertIs(await get_submission_snapshot("tourist"), first)
+
+
+class StoreBackendTests(unittest.IsolatedAsyncioTestCase):
+    def test_a_store_missing_a_method_cannot_be_created(self):
+        class LoadOnly(submission_store.SubmissionStore):
+            async def load(self, handle):
+                return None
+
+        with self.assertRaises(TypeError):
+            LoadOnly()
+
+    async def test_sqlite_round_trip(self):
+        snapshot = SubmissionSnapshot.from_submissions([_row(15, "A"), _row(16, "B", verdict="TESTING")])
+        with tempfile.TemporaryDirectory() as tmp:
+            store = submission_store.SqliteSubmissionStore(os.path.join(tmp, "s.sqlite3"))
+            await store.save("Tourist", snapshot)
+            loaded = await store.load("tourist")
+
+        self.assertEqual(loaded.to_dict(), snapshot.to_dict())
+        self.assertEqual(loaded.pending, {16: 1})
+        self.assertIsNone(await submission_store.MemorySubmissionStore().load("tourist"))
+
+    async def test_memory_store_evicts_least_recent_handle(self):
+        store = submission_store.MemorySubmissionStore(max_handles=2)
+        for handle in ("a", "b"):
+            await store.save(handle, SubmissionSnapshot())
+        await store.load("a")
+        await store.save("c", SubmissionSnapshot())
+
+        self.assertIsNone(await store.load("b"))
+        self.assertIsNotNone(await store.load("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Upstream call budget: burst is free, then callers wait only for the next token."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import upstream_budget  # noqa: E402
+from core.upstream_budget import LocalTokenBucket, UpstreamBudgetExceeded  # noqa: E402
+
+
+class LocalTokenBucketTests(unittest.TestCase):
+    def test_burst_then_reserved_waits(self):
+        with mock.patch("core.upstream_budget.time.monotonic", return_value=100.0):
+            bucket = LocalTokenBucket(rate=5, burst=2)
+            self.assertEqual(bucket.take(10), 0.0)
+            self.assertEqual(bucket.take(10), 0.0)
+            self.assertAlmostEqual(bucket.take(10), 0.2)
+            self.assertAlmostEqual(bucket.take(10), 0.4)
+
+    def test_refills_over_time(self):
+        with mock.patch("core.upstream_budget.time.monotonic", side_effect=[100.0, 100.0, 100.0, 101.0]):
+            bucket = LocalTokenBucket(rate=1, burst=1)
+            self.assertEqual(bucket.take(10), 0.0)
+            self.assertAlmostEqual(bucket.take(10), 1.0)
+            self.assertAlmostEqual(bucket.take(10), 1.0)
+
+    def test_wait_over_limit_takes_nothing(self):
+        with mock.patch("core.upstream_budget.time.monotonic", return_value=100.0):
+            bucket = LocalTokenBucket(rate=1, burst=1)
+            bucket.take(10)
+            self.assertIsNone(bucket.take(0.5))
+            self.assertAlmostEqual(bucket.take(10), 1.0)
+
+
+class AcquireTests(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire_without_redis_uses_local_bucket(self):
+        bucket = LocalTokenBucket(rate=1, burst=1)
+        with mock.patch.object(upstream_budget, "_local", bucket), \
+                mock.patch.object(upstream_budget, "get_redis", return_value=None):
+            await upstream_budget.acquire()
+            with self.assertRaises(UpstreamBudgetExceeded):
+                await upstream_budget.acquire(max_wait=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
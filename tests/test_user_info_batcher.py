@@ -0,0 +1,129 @@
+"""Concurrent single-handle ``user.info`` lookups share one upstream call."""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import aiohttp  # noqa: E402
+
+from services import user_info_batcher  # noqa: E402
+from services.user_info_batcher import UserInfoBatcher  # noqa: E402
+
+
+class FakeUserInfo:
+    def __init__(self, known, error=None):
+        self.known = {handle.lower(): handle for handle in known}
+        self.error = error
+        self.calls = []
+
+    async def __call__(self, method, params):
+        handles = params["handles"].split(";")
+        self.calls.append(handles)
+        if self.error is not None:
+            raise self.error
+        for handle in handles:
+            if handle.lower() not in self.known:
+                return {"status": "FAILED", "comment": f"handles: User with handle {handle} not found"}
+        return {"status": "OK", "result": [{"handle": self.known[h.lower()]} for h in handles]}
+
+
+class UserInfoBatcherTests(unittest.IsolatedAsyncioTestCase):
+    def _patch(self, fake):
+        patcher = mock.patch.object(user_info_batcher, "fetch_json", fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_window_collects_lookups_into_one_call(self):
+        fake = FakeUserInfo([f"user{i}" for i in range(20)])
+        self._patch(fake)
+        batcher = UserInfoBatcher(window_seconds=0.01, max_handles=100)
+
+        results = await asyncio.gather(*(batcher.get(f"USER{i % 20}") for i in range(40)))
+
+        self.assertEqual(len(fake.calls), 1)
+        self.assertEqual(len(fake.calls[0]), 20)
+        self.assertEqual([info["handle"] for info in results], [f"user{i % 20}" for i in range(40)])
+        self.assertEqual(batcher.stats(), {"lookups": 40, "batches": 1})
+
+    async def test_full_batch_is_sent_without_waiting_for_the_window(self):
+        fake = FakeUserInfo(["a", "b", "c"])
+        self._patch(fake)
+        batcher = UserInfoBatcher(window_seconds=60, max_handles=2)
+
+        results = await asyncio.wait_for(asyncio.gather(batcher.get("a"), batcher.get("b")), timeout=1)
+
+        self.assertEqual([info["handle"] for info in results], ["a", "b"])
+
+    async def test_invalid_handle_fails_only_its_own_callers(self):
+        fake = FakeUserInfo(["tourist", "petr"])
+        self._patch(fake)
+        batcher = UserInfoBatcher(window_seconds=0.01, max_handles=100)
+
+        tourist, ghost, petr = await asyncio.gather(batcher.get("tourist"), batcher.get("ghost"), batcher.get("petr"))
+
+        self.assertEqual(tourist, {"handle": "tourist"})
+        self.assertIsNone(ghost)
+        self.assertEqual(petr, {"handle": "petr"})
+        self.assertEqual(fake.calls, [["tourist", "ghost", "petr"], ["tourist", "petr"]])
+
+    async def test_probe_heavy_batches_are_bisected(self):
+        real = [f"user{i}" for i in range(12)]
+        bots = [f"bot{i}" for i in range(6)]
+        fake = FakeUserInfo(real)
+        in_flight, peak = 0, 0
+
+        async def fetch(method, params):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return await fake(method, params)
+
+        self._patch(fetch)
+        batcher = UserInfoBatcher(window_seconds=0.01, max_handles=100)
+        handles = [handle for pair in zip(real, bots) for handle in pair] + real[len(bots):]
+
+        results = await asyncio.gather(*(batcher.get(handle) for handle in handles))
+
+        for handle, info in zip(handles, results):
+            self.assertEqual(info, {"handle": handle} if handle in real else None)
+        # one retry with everything left, then halves of what remains, side by side
+        self.assertEqual(len(fake.calls[1]), len(handles) - 1)
+        self.assertEqual(len(fake.calls[2]), (len(handles) - 2) // 2)
+        self.assertGreater(peak, 1)
+
+    async def test_an_error_in_one_half_fails_only_its_callers(self):
+        fake = FakeUserInfo(["a", "b", "c", "d"])
+
+        async def fetch(method, params):
+            handles = params["handles"].split(";")
+            if "d" in handles and len(handles) < 4:
+                raise aiohttp.ClientError("budget")
+            return await fake(method, params)
+
+        self._patch(fetch)
+        batcher = UserInfoBatcher(window_seconds=0.01, max_handles=100)
+
+        results = await asyncio.gather(
+            *(batcher.get(handle) for handle in ("x", "a", "y", "b", "c", "d")), return_exceptions=True
+        )
+
+        self.assertEqual(results[:4], [None, {"handle": "a"}, None, {"handle": "b"}])
+        self.assertTrue(all(isinstance(result, aiohttp.ClientError) for result in results[4:]))
+
+    async def test_transport_errors_reach_every_caller(self):
+        self._patch(FakeUserInfo(["a"], error=aiohttp.ClientError("down")))
+        batcher = UserInfoBatcher(window_seconds=0.01, max_handles=100)
+
+        results = await asyncio.gather(batcher.get("a"), batcher.get("b"), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, aiohttp.ClientError) for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()